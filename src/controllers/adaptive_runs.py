@@ -0,0 +1,130 @@
+import math
+import os
+from statistics import NormalDist
+import numpy as np
+
+from controllers.main_controller import Configuration
+
+
+# target metric of a run (see run_metric):
+#   -"items_collected": total items collected,
+#   -"rewards": mean reward of the robots,
+#   -"honest_rewards": mean reward of the honest robots (behaviors without lie_angle)
+TARGET_METRICS = ("items_collected", "rewards", "honest_rewards")
+
+
+def t_quantile(p, df):
+    """
+    quantile of the Student's t distribution: exact for 1 and 2 degrees of freedom,
+    Cornish-Fisher expansion (Abramowitz-Stegun 26.7.5) otherwise (error < 1e-2 for df=3)
+    """
+    if df == 1:
+        return math.tan(math.pi * (p - 0.5))
+    if df == 2:
+        return (2 * p - 1) / math.sqrt(2 * p * (1 - p))
+    x = NormalDist().inv_cdf(p)
+    g = [(x**3 + x) / 4,
+         (5 * x**5 + 16 * x**3 + 3 * x) / 96,
+         (3 * x**7 + 19 * x**5 + 17 * x**3 - 15 * x) / 384,
+         (79 * x**9 + 776 * x**7 + 1482 * x**5 - 1920 * x**3 - 945 * x) / 92160]
+    return x + sum(gk / df**(k + 1) for k, gk in enumerate(g))
+
+
+def honest_mask(config: Configuration):
+    """
+    :return: True for the honest robots of the initial population, in robot_id order
+    """
+    return np.array([("lie_angle" not in behavior.get("parameters", {}))
+                     for behavior in config.value_of("behaviors")
+                     for _ in range(behavior["population_size"])], dtype=bool)
+
+
+class AdaptiveRuns:
+    """
+    sequential stopping of the runs of a config: runs are launched in waves, until the confidence
+    interval of the mean of the target metric over the runs is narrower than relative_width
+    (half width, relative to the mean), with at least min_runs and at most max_runs runs.
+
+    enabled by config["adaptive_runs"]:
+        -metric: one of TARGET_METRICS,
+        -relative_width: e.g. 0.05 for mean +- 5%,
+        -confidence (optional, 0.95),
+        -min_runs (optional, 5), max_runs (optional, number_runs),
+        -wave_size (optional, number of cores): runs launched at a time after the first min_runs.
+
+    run i has the same seed as without adaptive runs (simulation_seed+i), hence the first n runs
+    are the ones of a config with number_runs=n.
+    """
+    def __init__(self, config: Configuration):
+        params = config.value_of("adaptive_runs")
+        self.metric = params["metric"]
+        if self.metric not in TARGET_METRICS:
+            raise ValueError(f"adaptive runs metric {self.metric} not recognized, accepted values are {TARGET_METRICS}")
+        self.relative_width = params["relative_width"]
+        self.confidence = params.get("confidence", 0.95)
+        self.max_runs = params.get("max_runs", config.value_of("number_runs"))
+        self.min_runs = min(max(params.get("min_runs", 5), 2), self.max_runs)
+        self.wave_size = max(params.get("wave_size", os.cpu_count() or 1), 1)
+        self.honest = honest_mask(config) if self.metric == "honest_rewards" else None
+        self.values = {}
+        self.launched = 0
+
+
+    @staticmethod
+    def from_config(config: Configuration):
+        return AdaptiveRuns(config) if "adaptive_runs" in config and config.value_of("adaptive_runs") else None
+
+
+    def __len__(self):
+        return len(self.values)
+
+
+    def run_metric(self, result):
+        """
+        :param result: RunResult (or MainController) of a run
+        """
+        if self.metric == "items_collected":
+            return float(np.sum(result.get_items_collected()))
+        rewards = np.asarray(result.get_rewards(), dtype=float)
+        if self.metric == "honest_rewards":
+            rewards = rewards[:len(self.honest)][self.honest[:len(rewards)]]
+        return float(np.mean(rewards))
+
+
+    def add(self, i, result):
+        self.values[i] = self.run_metric(result)
+
+
+    def interval(self):
+        """
+        :return: mean of the target metric and half width of its confidence interval (inf if less than 2 runs)
+        """
+        values = np.array(list(self.values.values()))
+        if len(values) < 2:
+            return (float(values.mean()) if len(values) else math.nan), math.inf
+        half_width = t_quantile(0.5 + self.confidence / 2, len(values) - 1) * values.std(ddof=1) / math.sqrt(len(values))
+        return float(values.mean()), float(half_width)
+
+
+    def converged(self):
+        mean, half_width = self.interval()
+        return half_width <= self.relative_width * abs(mean)
+
+
+    def finished(self):
+        """
+        True when no more runs are needed: max_runs reached, or min_runs reached and interval narrow enough
+        """
+        if self.launched >= self.max_runs:
+            return True
+        return self.launched >= self.min_runs and self.converged()
+
+
+    def next_wave(self):
+        """
+        :return: indexes of the runs to launch (min_runs for the first wave)
+        """
+        size = self.min_runs if self.launched == 0 else self.wave_size
+        wave = list(range(self.launched, min(self.launched + size, self.max_runs)))
+        self.launched += len(wave)
+        return wave
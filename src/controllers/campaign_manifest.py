@@ -0,0 +1,89 @@
+import datetime
+import json
+import os
+import resource
+from pathlib import Path
+
+
+RUN_STATES = ("queued", "running", "done", "failed")
+CONFIG_STATES = ("queued", "recorded", "failed")
+
+
+class CampaignManifest:
+    """
+    append-only JSONL log of the state of a campaign, one record per line:
+        -{"config": f, "run": i, "state": RUN_STATES, "time": ...,
+            ["duration": seconds, "peak_rss": KB of the run, "cached": bool, "error": traceback]}
+        -{"config": f, "state": CONFIG_STATES, "time": ...} when the config is queued,
+            its outputs recorded or its runs failed
+    the state of an entry is the last one written.
+
+    Records are written by the campaign process and by the workers (running, done, failed)
+    with a single append each, hence lines of different processes do not interleave.
+    """
+    def __init__(self, path):
+        self.path = path
+
+
+    def write(self, **record):
+        record["time"] = str(datetime.datetime.now())
+        Path(os.path.dirname(os.path.abspath(self.path))).mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a") as file:
+            file.write(json.dumps(record) + "\n")
+
+
+    def run_state(self, f, i, state, **info):
+        self.write(config=f, run=i, state=state, **info)
+
+
+    def config_state(self, f, state):
+        self.write(config=f, state=state)
+
+
+    @staticmethod
+    def peak_rss():
+        """
+        peak resident set size of the current process (KB on linux).
+        Campaign workers run a single task each, so it is the peak of the run
+        (including the memory shared with the campaign process at the fork)
+        """
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+    def read(self):
+        """
+        :return: list of the records, a truncated last line (killed process) is ignored
+        """
+        if not os.path.isfile(self.path):
+            return []
+        records = []
+        with open(self.path, "r") as file:
+            for line in file:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+        return records
+
+
+    def states(self):
+        """
+        :return: (configs states, runs states): latest state of each config (f: state)
+                    and run ((f, i): state), configs in order of first appearance
+        """
+        configs, runs = {}, {}
+        for record in self.read():
+            configs.setdefault(record["config"], None)
+            if "run" in record:
+                runs[(record["config"], record["run"])] = record["state"]
+            else:
+                configs[record["config"]] = record["state"]
+        return configs, runs
+
+
+    def unfinished_configs(self):
+        """
+        :return: configs whose outputs were not recorded yet (not started, crashed or failed)
+        """
+        configs, _ = self.states()
+        return [f for f, state in configs.items() if state != "recorded"]
@@ -0,0 +1,188 @@
+import datetime
+import json
+import sqlite3
+from contextlib import contextmanager
+from os.path import join, abspath
+from pathlib import Path
+
+from controllers.main_controller import Configuration
+
+
+CATALOG_FILENAME = "catalog.sqlite"
+
+EXPERIMENT_COLUMNS = {
+    "config_file": "TEXT",
+    "output_directory": "TEXT",
+    "filename": "TEXT",
+    "honest_behavior": "TEXT",
+    "dishonest_behavior": "TEXT",
+    "n_honest": "INTEGER",
+    "n_dishonest": "INTEGER",
+    "combine_strategy": "TEXT",
+    "payment_system": "TEXT",
+    "reputation_stake": "INTEGER",
+    "lie_angle": "REAL",
+    "behavior_params": "TEXT",
+    "noise_class": "TEXT",
+    "noise_params": "TEXT",
+    "simulation_seed": "TEXT",
+    "number_runs": "INTEGER",
+    "simulation_steps": "INTEGER",
+    "items_collected_mean": "REAL",
+    "items_collected_std": "REAL",
+    "rewards_mean": "REAL",
+    "rewards_std": "REAL",
+    "recorded_at": "TEXT",
+}
+INDEXED_COLUMNS = ["honest_behavior", "combine_strategy", "payment_system", "reputation_stake", "lie_angle"]
+
+
+def experiment_parameters(config: Configuration):
+    """
+    typed parameters of a config, as stored in the catalog.
+    dishonest behaviors are the ones with a lie_angle parameter.
+    behavior_params and noise_params are JSON objects
+    """
+    behaviors = config.value_of("behaviors")
+    honest = [b for b in behaviors if "lie_angle" not in b.get("parameters", {})]
+    dishonest = [b for b in behaviors if "lie_angle" in b.get("parameters", {})]
+    payment_system = config.value_of("payment_system")
+    noise = config.value_of("agent")["noise"]
+    reputation_stake = payment_system.get("parameters", {}).get("reputation_stake")
+    return {
+        "honest_behavior": honest[0]["class"] if honest else None,
+        "dishonest_behavior": dishonest[0]["class"] if dishonest else None,
+        "n_honest": sum(b["population_size"] for b in honest),
+        "n_dishonest": sum(b["population_size"] for b in dishonest),
+        "combine_strategy": config.value_of("combine_strategy")["class"],
+        "payment_system": payment_system["class"],
+        "reputation_stake": int(reputation_stake) if reputation_stake is not None else None,
+        "lie_angle": dishonest[0]["parameters"]["lie_angle"] if dishonest else None,
+        "behavior_params": json.dumps(honest[0].get("parameters", {}) if honest else {}, sort_keys=True),
+        "noise_class": noise["class"],
+        "noise_params": json.dumps(noise.get("parameters", {}), sort_keys=True),
+        "simulation_seed": str(config.value_of("simulation_seed")),
+        "number_runs": config.value_of("number_runs"),
+        "simulation_steps": config.value_of("simulation_steps"),
+    }
+
+
+class ExperimentCatalog:
+    """
+    SQLite index of the recorded experiments:
+        -experiments: one row for each output (output_directory, filename), with the typed parameters
+            (see experiment_parameters) and summary statistics over the runs of its config;
+            recording the same output again replaces its row;
+        -files: output files (metric folder and path) of each experiment.
+
+    enabled by data_collection["catalog"]: path of the database, or true for
+    <output_directory>/CATALOG_FILENAME.
+
+    e.g. ExperimentCatalog(path).files("items_collected", honest_behavior="ReputationHistoryBehavior", lie_angle=90)
+    """
+    def __init__(self, path):
+        self.path = path
+        Path(abspath(path)).parent.mkdir(parents=True, exist_ok=True)
+        with self.connect() as connection:
+            columns = ", ".join(f"{name} {sql_type}" for name, sql_type in EXPERIMENT_COLUMNS.items())
+            connection.execute(f"CREATE TABLE IF NOT EXISTS experiments (id INTEGER PRIMARY KEY, {columns})")
+            connection.execute("CREATE TABLE IF NOT EXISTS files (experiment_id INTEGER REFERENCES experiments(id), "
+                               "metric TEXT, path TEXT)")
+            for column in INDEXED_COLUMNS:
+                connection.execute(f"CREATE INDEX IF NOT EXISTS experiments_{column} ON experiments ({column})")
+            connection.execute("CREATE INDEX IF NOT EXISTS files_experiment ON files (experiment_id, metric)")
+            # catalogs written before the unique index can hold the same output more than once: latest row is kept
+            self.delete(connection, "SELECT id FROM experiments WHERE id NOT IN "
+                                    "(SELECT MAX(id) FROM experiments GROUP BY output_directory, filename)")
+            connection.execute("CREATE UNIQUE INDEX IF NOT EXISTS experiments_output "
+                               "ON experiments (output_directory, filename)")
+
+
+    @staticmethod
+    def from_config(config: Configuration):
+        data_collection = config.value_of("data_collection")
+        path = data_collection.get("catalog")
+        if not path:
+            return None
+        return ExperimentCatalog(join(data_collection["output_directory"], CATALOG_FILENAME) if path is True else path)
+
+
+    @contextmanager
+    def connect(self):
+        """
+        connection committed (or rolled back) and closed at exit
+        """
+        connection = sqlite3.connect(self.path)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+
+    @staticmethod
+    def delete(connection, ids_query, values=()):
+        """
+        deletes the experiments selected by ids_query, and their files
+        """
+        connection.execute(f"DELETE FROM files WHERE experiment_id IN ({ids_query})", values)
+        connection.execute(f"DELETE FROM experiments WHERE id IN ({ids_query})", values)
+
+
+    def add(self, config: Configuration, files, summary, config_file=None):
+        """
+        records the outputs of config, replacing the previous record of the same output
+        (e.g. a config run again)
+        :param files: list of (metric folder, path) of the outputs
+        :param summary: summary statistics (items_collected_mean, ...), missing ones are NULL
+        :return: id of the experiment
+        """
+        data_collection = config.value_of("data_collection")
+        row = {"config_file": config_file,
+               "output_directory": data_collection["output_directory"],
+               "filename": data_collection["filename"],
+               "recorded_at": str(datetime.datetime.now()),
+               **experiment_parameters(config),
+               **summary}
+        row = {name: row.get(name) for name in EXPERIMENT_COLUMNS}
+        with self.connect() as connection:
+            self.delete(connection, "SELECT id FROM experiments WHERE output_directory IS ? AND filename IS ?",
+                        (row["output_directory"], row["filename"]))
+            cursor = connection.execute(f"INSERT INTO experiments ({', '.join(row)}) "
+                                        f"VALUES ({', '.join('?' for _ in row)})", list(row.values()))
+            experiment_id = cursor.lastrowid
+            connection.executemany("INSERT INTO files VALUES (?, ?, ?)",
+                                   [(experiment_id, metric, path) for metric, path in files])
+        return experiment_id
+
+
+    @staticmethod
+    def where(filters):
+        for name in filters:
+            if name not in EXPERIMENT_COLUMNS:
+                raise ValueError(f"unknown catalog column {name}, accepted values are {list(EXPERIMENT_COLUMNS)}")
+        clause = " AND ".join(f"experiments.{name} IS ?" for name in filters)
+        return (f" WHERE {clause}" if clause else ""), [int(v) if isinstance(v, bool) else v for v in filters.values()]
+
+
+    def experiments(self, **filters):
+        """
+        :param filters: column=value, e.g. payment_system="OutlierPenalisationPaymentSystem"
+        :return: list of experiments (dicts) matching all the filters
+        """
+        clause, values = self.where(filters)
+        with self.connect() as connection:
+            connection.row_factory = sqlite3.Row
+            return [dict(row) for row in connection.execute(f"SELECT * FROM experiments{clause}", values)]
+
+
+    def files(self, metric, **filters):
+        """
+        :return: paths of the metric outputs of the experiments matching the filters
+        """
+        clause, values = self.where(filters)
+        clause = (clause + " AND" if clause else " WHERE") + " files.metric = ?"
+        with self.connect() as connection:
+            return [path for path, in connection.execute(
+                "SELECT files.path FROM files JOIN experiments ON files.experiment_id = experiments.id"
+                f"{clause} ORDER BY experiments.id", values + [metric])]
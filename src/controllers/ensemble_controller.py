@@ -0,0 +1,123 @@
+import random
+from contextlib import contextmanager
+import numpy as np
+
+from controllers.main_controller import MainController, Configuration
+from helpers import random_walk
+from model.swarm_state import SwarmState
+
+
+class EnsembleController:
+    """
+    ensemble engine: replicas of a config (its runs, with different seeds) advanced in lockstep in one process.
+    The robots of all the replicas are rows of a single SwarmState, moved at once every tick,
+    while each replica keeps its own environment (navigation tables, payment database, market)
+    and MainController (recorded metrics, outputs).
+
+    the random module, the numpy global generator and the random walk sampler are shared by the process:
+    the random state of each replica is swapped in when the replica steps, hence every replica gives
+    the same results of its run simulated alone (with the vectorized engine).
+    NOTE the numpy global generator is swapped only when used, i.e. by BenchmarkBehavior (its state is large)
+
+    enabled by config["engine"] = {"mode": "ensemble", "replicas": R}, see InformationMarket.run_ensemble
+    """
+    def __init__(self, configs):
+        """
+        :param configs: Configuration of each replica (same config, with the seed of the run)
+        """
+        self.swarm = SwarmState(configs[0].value_of("width"), configs[0].value_of("height"))
+        self.numpy_random = any(behavior["class"] == "BenchmarkBehavior"
+                                for behavior in configs[0].value_of("behaviors"))
+        self.controllers = []
+        self.random_states = []
+        for config in configs:
+            self.controllers.append(MainController(config, self.swarm))
+            self.random_states.append(self.random_state())
+
+
+    @staticmethod
+    def enabled(config: Configuration):
+        return "engine" in config and config.value_of("engine")["mode"] == "ensemble"
+
+
+    def random_state(self):
+        return (random.getstate(),
+                np.random.get_state() if self.numpy_random else None,
+                random_walk.get_stream())
+
+
+    def set_random_state(self, state):
+        python_state, numpy_state, random_walk_stream = state
+        random.setstate(python_state)
+        if numpy_state is not None:
+            np.random.set_state(numpy_state)
+        random_walk.set_stream(random_walk_stream)
+
+
+    @contextmanager
+    def replica(self, k):
+        """
+        the random state of replica k is the current one inside the block
+        """
+        self.set_random_state(self.random_states[k])
+        yield self.controllers[k]
+        self.random_states[k] = self.random_state()
+
+
+    def step(self):
+        for k in range(len(self.controllers)):
+            with self.replica(k) as controller:
+                controller.recorders.record(controller.tick)
+                controller.tick += 1
+                controller.environment.step_robots()
+        self.controllers[0].environment.move_swarm()
+        for controller in self.controllers:
+            controller.environment.end_step()
+
+
+    def start_simulation(self):
+        """
+        same steps of MainController.start_simulation, for all the replicas
+        """
+        n_steps = self.controllers[0].config.value_of("simulation_steps")
+        self.run_until(n_steps)
+        newcomers = self.controllers[0].newcomers
+        if newcomers:
+            for k in range(len(self.controllers)):
+                with self.replica(k) as controller:
+                    controller.environment.create_newcomers(newcomers["type"], newcomers["amount"])
+            self.run_until(n_steps + newcomers["duration"])
+        for controller in self.controllers:
+            if controller.transaction_log_sink is not None:
+                controller.transaction_log_sink.flush()
+
+
+    def run_until(self, tick):
+        for controller in self.controllers:
+            if controller.recorders is None:
+                controller.init_statistics()
+        while self.controllers[0].tick < tick:
+            self.step()
+
+
+    def rows(self):
+        """
+        :return: (replicas, robots) array of the swarm rows of the robots of each replica, in robot_id order
+        """
+        return np.array([[robot.index for robot in controller.environment.population]
+                         for controller in self.controllers], dtype=int)
+
+
+    def get_positions(self):
+        """
+        :return: (replicas, robots, 2) array
+        """
+        return self.swarm.pos[self.rows()]
+
+
+    def get_orientations(self):
+        return self.swarm.orientation[self.rows()]
+
+
+    def get_rewards(self):
+        return np.array([controller.get_rewards() for controller in self.controllers])
@@ -1,8 +1,13 @@
+import copy
 import json
+import os
+import tempfile
 import numpy as np
 
 from helpers import random_walk
+from helpers.transaction_log import TransactionLogSink
 from model.environment import Environment
+from controllers.recorders import MetricRecorders
 import config as CONFIG_FILE
 
 
@@ -10,6 +15,15 @@ class Configuration:
     def __init__(self, config_file):
         self._parameters = self.read_config(config_file)
 
+    @classmethod
+    def from_dict(cls, parameters):
+        """
+        configuration built in memory (e.g. by controllers.sweep), without a config file
+        """
+        config = cls.__new__(cls)
+        config._parameters = copy.deepcopy(parameters)
+        return config
+
     def __contains__(self, item):
         return item in self._parameters
 
@@ -32,9 +46,14 @@ class Configuration:
 
 class MainController:
 
-    def __init__(self, config: Configuration):
+    def __init__(self, config: Configuration, swarm=None):
+        """
+        :param swarm: SwarmState shared by the replicas of an ensemble (see EnsembleController)
+        """
         self.config = config
-        random_walk.set_parameters(**self.config.value_of('random_walk'),
+        random_walk_params = {"seed": self.config.value_of("simulation_seed"),
+                              **self.config.value_of('random_walk')}
+        random_walk.set_parameters(**random_walk_params,
                                    max_levi_steps=self.config.value_of("simulation_steps")+1
                                    )
         self.environment = Environment(width=self.config.value_of("width"),
@@ -47,35 +66,137 @@ class MainController:
                                        payment_system_params=config.value_of("payment_system"),
                                        market_params=config.value_of("market"),
                                        simulation_seed=config.value_of("simulation_seed"),
+                                       engine_params=config.value_of("engine") if "engine" in config else None,
+                                       swarm=swarm,
+                                       rng_params=config.value_of("rng") if "rng" in config else None,
                                        )
         self.tick = 0
+        self.recorders = None
+        self.newcomers = self.newcomers_phase(config)
+        self.transaction_log_file = None
+        self.transaction_log_sink = None
+        if self.config.value_of("data_collection")["transactions_log"] == "binary":
+            self.open_transaction_log_sink()
+
+
+    @staticmethod
+    def newcomers_phase(config: Configuration):
+        """
+        newcomers phase after simulation_steps, as {"type", "amount", "duration"} (None if disabled):
+        config["newcomers"] if given (e.g. by the newcomers variants, see controllers.newcomer_variants),
+        else the NEWCOMER_* flags of config.py
+        """
+        if "newcomers" in config:
+            return config.value_of("newcomers")
+        if CONFIG_FILE.NEWCOMER_PHASE:
+            return {"type": CONFIG_FILE.NEWCOMER_TYPE,
+                    "amount": CONFIG_FILE.NEWCOMER_AMOUNT,
+                    "duration": CONFIG_FILE.NEWCOMER_PHASE_DURATION}
+        return None
+
+
+    def open_transaction_log_sink(self):
+        """
+        completed transactions are logged in a compressed binary temporary file
+        (data_collection["transactions_log"]=="binary"), see helpers.transaction_log.
+        Sink parameters from data_collection["transactions_log_params"] (chunk_size, id_dtype, extended)
+        """
+        self.transaction_log_file = tempfile.TemporaryFile()
+        self.transaction_log_sink = TransactionLogSink(self.transaction_log_file,
+                                        **self.config.value_of("data_collection").get("transactions_log_params", {}))
+        self.environment.payment_database.set_transaction_log_sink(self.transaction_log_sink)
 
 
     def step(self):
-        if self.tick % self.config.value_of("data_collection")['precise_recording_interval'] == 0:
-            if "rewards_evolution" in self.config.value_of("data_collection")["metrics"]:
-                self.rewards_evolution_list.append([self.tick, self.get_rewards()])
-            if "items_evolution" in self.config.value_of("data_collection")["metrics"]:
-                self.items_evolution_list.append([self.tick, self.get_items_collected()])
-            if hasattr(self.environment.payment_database.database[0]["payment_system"], "pot_amount"):
-                self.stake_pot_evolution_list.append([self.tick, self.get_stake_pots()])
-                self.wealth_evolution_list.append([self.tick,[r+p for r,p in zip(self.rewards_evolution_list[-1][1],self.stake_pot_evolution_list[-1][1])]])
-            # if CONFIG_FILE.LOG_EXCEPTIONS:
-            #     self.IFE_evolution_list.append([self.tick,self.get_IFE()])
+        self.recorders.record(self.tick)
         self.tick += 1
         self.environment.step()
             
 
-    def start_simulation(self):
-        self.init_statistics()
-        for _ in range(self.config.value_of("simulation_steps")):
-            self.step()
+    def start_simulation(self, checkpoint_path=None, checkpoint_interval=None):
+        """
+        runs the simulation from the current tick (0, or the tick of a restored snapshot)
+        :param checkpoint_path: if given, a snapshot is saved there every checkpoint_interval ticks
+        """
+        n_steps = self.config.value_of("simulation_steps")
+        self.run_until(n_steps, checkpoint_path, checkpoint_interval)
         #[ ]NEWCOMERS
-        if CONFIG_FILE.NEWCOMER_PHASE:
+        if self.newcomers:
             # self.init_statistics(newcomers_phase=True)
-            self.environment.create_newcomers(CONFIG_FILE.NEWCOMER_TYPE, CONFIG_FILE.NEWCOMER_AMOUNT)
-            for _ in range(CONFIG_FILE.NEWCOMER_PHASE_DURATION):
-                self.step()
+            if len(self.environment.population) == self.environment.ROBOTS_AMOUNT:
+                self.environment.create_newcomers(self.newcomers["type"], self.newcomers["amount"])
+            self.run_until(n_steps + self.newcomers["duration"], checkpoint_path, checkpoint_interval)
+        if self.transaction_log_sink is not None:
+            self.transaction_log_sink.flush()
+
+
+    def run_until(self, tick, checkpoint_path=None, checkpoint_interval=None):
+        """
+        steps the simulation up to tick, e.g. up to simulation_steps for the
+        prefix shared by the newcomers variants (see start_simulation for checkpoints)
+        """
+        if self.recorders is None:
+            self.init_statistics()
+        while self.tick < tick:
+            self.step()
+            self.checkpoint(checkpoint_path, checkpoint_interval)
+
+
+    def checkpoint(self, checkpoint_path, checkpoint_interval):
+        if checkpoint_path is not None and checkpoint_interval and self.tick % checkpoint_interval == 0:
+            self.save_snapshot(checkpoint_path)
+
+
+    def snapshot(self):
+        """
+        state of the run (environment, recorded metrics, transactions log, tick) as a dict of arrays,
+        see model.snapshot. The config is saved as JSON, for reference
+        """
+        state = {"tick": np.array(self.tick),
+                 "config": np.array(json.dumps(self.config._parameters)),
+                 **self.environment.snapshot()}
+        if self.recorders is not None:
+            state.update(self.recorders.snapshot())
+        if self.transaction_log_sink is not None:
+            sink = self.transaction_log_sink
+            state.update(transaction_log=np.frombuffer(self.get_transaction_log_data(), dtype=np.uint8),
+                         transaction_log_position=np.array([sink.last_tick, sink.length]))
+        return state
+
+
+    def restore(self, state):
+        """
+        restores a snapshot on a controller built from the same config (before start_simulation),
+        newcomers are created if the snapshot was taken during the newcomers phase
+        """
+        n_newcomers = len(state["agent_pos"]) - len(self.environment.population)
+        if n_newcomers > 0:
+            self.environment.create_newcomers(self.newcomers["type"], n_newcomers)
+        self.environment.restore(state)
+        self.tick = int(state["tick"])
+        self.init_statistics()
+        self.recorders.restore(state)
+        if self.transaction_log_sink is not None:
+            self.transaction_log_file.seek(0)
+            self.transaction_log_file.truncate()
+            self.transaction_log_file.write(state["transaction_log"].tobytes())
+            self.transaction_log_sink.last_tick, self.transaction_log_sink.length = \
+                state["transaction_log_position"].tolist()
+
+
+    def save_snapshot(self, path):
+        """
+        compressed .npz snapshot, written aside and renamed (a crash never leaves a partial file)
+        """
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as file:
+            np.savez_compressed(file, **self.snapshot())
+        os.replace(tmp_path, path)
+
+
+    def restore_snapshot(self, path):
+        with np.load(path, allow_pickle=False) as snapshot:
+            self.restore({key: snapshot[key] for key in snapshot.files})
 
 
     def init_statistics(self):#,newcomers_phase=False):
@@ -84,10 +205,13 @@ class MainController:
         #     CONFIG_FILE.IFE_COUNT+=[0]*CONFIG_FILE.NEWCOMER_AMOUNT
         #     CONFIG_FILE.NIS_COUNT+=[0]*CONFIG_FILE.NEWCOMER_AMOUNT
         #     return
-        self.rewards_evolution_list = []
-        self.items_evolution_list = []
-        self.stake_pot_evolution_list=[]
-        self.wealth_evolution_list=[]
+        n_steps=self.config.value_of("simulation_steps")
+        n_newcomers=0
+        if self.newcomers:
+            n_steps+=self.newcomers["duration"]
+            n_newcomers=self.newcomers["amount"]
+        self.recorders = MetricRecorders(self.environment, self.config.value_of("data_collection"),
+                                         n_steps, n_newcomers)
         # if CONFIG_FILE.LOG_EXCEPTIONS:
         #     self.IFE_evolution_list=[]
         #   self.NIS_COUNT=[0]*self.environment.ROBOTS_AMOUNT
@@ -142,6 +266,10 @@ class MainController:
         return res
     
 
+    def has_stake_pots(self):
+        return hasattr(self.environment.payment_database.database[0]["payment_system"], "pot_amount")
+
+
     def get_stake_pots(self):
         return [self.environment.payment_database.get_stake_pot(bot.id) for bot in self.environment.population]
 
@@ -163,24 +291,35 @@ class MainController:
 
 
     def get_rewards_evolution_list(self):
-        return self.rewards_evolution_list
+        return self.recorders.evolution_list(self.recorders.rewards)
 
 
     def get_items_evolution_list(self):
-        return self.items_evolution_list
+        return self.recorders.evolution_list(self.recorders.items)
     
 
     def get_stake_pot_evolution_list(self):
-        return self.stake_pot_evolution_list
+        return self.recorders.evolution_list(self.recorders.stake_pots)
 
 
     def get_wealth_evolution_list(self):
-        return self.wealth_evolution_list
+        return self.recorders.evolution_list(self.recorders.wealth)
 
     def get_transaction_log(self):
         return self.environment.payment_database.completed_transactions_log
 
 
+    def get_transaction_log_data(self):
+        """
+        :return: content (bytes) of the binary transaction log
+        """
+        self.transaction_log_sink.flush()
+        self.transaction_log_file.seek(0)
+        data = self.transaction_log_file.read()
+        self.transaction_log_file.seek(0, 2)
+        return data
+
+
     def get_transactions_list(self,type:str,role="buyer"):
         '''
         :param type of transaction desidered. Accepted values are:
@@ -0,0 +1,43 @@
+from os.path import join
+
+import config as CONFIG_FILE
+from controllers.main_controller import Configuration
+from model.environment import NEWCOMER_TYPES
+
+
+def variant_name(variant):
+    return variant.get("name", f"newcomers_{variant['amount']}{variant['type']}")
+
+
+def newcomer_variants(config: Configuration):
+    """
+    newcomers phases compared by config["newcomer_variants"], a list of:
+        -type: one of model.environment.NEWCOMER_TYPES,
+        -amount: number of newcomers,
+        -duration (optional, NEWCOMER_PHASE_DURATION of config.py): ticks of the newcomers phase,
+        -name (optional, "newcomers_{amount}{type}"): subfolder of output_directory of the variant outputs.
+
+    all the variants of a run share the same simulation_steps ticks (the prefix): the prefix is simulated
+    once per run and the variants continue from its snapshot (see InformationMarket.run_newcomer_variants),
+    with the same results of a config with the same newcomers phase.
+
+    :return: (name, Configuration) of each variant: the config with "newcomers" set to the variant
+        and the outputs in the subfolder of the variant
+    """
+    variants = []
+    for variant in config.value_of("newcomer_variants"):
+        if variant["type"] not in NEWCOMER_TYPES:
+            raise ValueError(f"Newcomers type {variant['type']} not recognized, "
+                             f"accepted values are {list(NEWCOMER_TYPES)}")
+        name = variant_name(variant)
+        variant_config = Configuration.from_dict({k: v for k, v in config._parameters.items()
+                                                  if k != "newcomer_variants"})
+        variant_config.set("newcomers", {"type": variant["type"],
+                                         "amount": variant["amount"],
+                                         "duration": variant.get("duration", CONFIG_FILE.NEWCOMER_PHASE_DURATION)})
+        data_collection = variant_config.value_of("data_collection")
+        data_collection["output_directory"] = join(data_collection["output_directory"], name)
+        variants.append((name, variant_config))
+    if len({name for name, _ in variants}) < len(variants):
+        raise ValueError("newcomer variants must have different names")
+    return variants
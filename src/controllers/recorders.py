@@ -0,0 +1,119 @@
+from math import ceil
+import numpy as np
+
+
+class EvolutionRecorder:
+    """
+    samples of a per robot metric, preallocated as a (n_samples, n_robots) array.
+    each sample stores its tick and its number of robots (population grows with newcomers).
+    Arrays are doubled if more samples or robots than expected are recorded.
+    """
+    def __init__(self, n_samples, n_robots, dtype=float):
+        self.ticks = np.zeros(n_samples, dtype=int)
+        self.sizes = np.zeros(n_samples, dtype=int)
+        self.values = np.zeros((n_samples, n_robots), dtype=dtype)
+        self.count = 0
+
+
+    def record(self, tick, values):
+        n_robots = len(values)
+        if self.count == len(self.ticks):
+            extra = max(self.count, 1)
+            self.ticks = np.append(self.ticks, np.zeros(extra, dtype=int))
+            self.sizes = np.append(self.sizes, np.zeros(extra, dtype=int))
+            self.values = np.vstack((self.values, np.zeros((extra, self.values.shape[1]), dtype=self.values.dtype)))
+        if n_robots > self.values.shape[1]:
+            self.values = np.pad(self.values, ((0, 0), (0, max(n_robots, 2 * self.values.shape[1]) - self.values.shape[1])))
+        self.ticks[self.count] = tick
+        self.sizes[self.count] = n_robots
+        self.values[self.count, :n_robots] = values
+        self.count += 1
+
+
+    def last(self):
+        return self.values[self.count - 1, :self.sizes[self.count - 1]]
+
+
+    def to_list(self):
+        """
+        :return: [[tick, values_list], ...], as the evolution lists of MainController
+        """
+        return [[tick, values[:size].tolist()] for tick, values, size in
+                zip(self.ticks[:self.count].tolist(), self.values[:self.count], self.sizes[:self.count].tolist())]
+
+
+class MetricRecorders:
+    """
+    evolution metrics of a simulation (Precise recording), recorded every recording_interval ticks.
+    Enabled metrics (data_collection["metrics"]) and stake pots are resolved once, recorders are
+    preallocated for the whole simulation (newcomers phase included).
+
+    Values are read from the payment database once per sample for the whole population:
+        -rewards_evolution: rewards,
+        -items_evolution: items collected,
+        -stake pots and wealth (rewards+stake pot): if the payment system has a stake pot.
+    """
+    def __init__(self, environment, data_collection, n_steps, n_newcomers=0):
+        """
+        :param n_steps: total number of steps of the simulation
+        :param n_newcomers: robots added during the simulation
+        """
+        metrics = data_collection["metrics"]
+        self.environment = environment
+        self.recording_interval = data_collection["precise_recording_interval"]
+        self.has_stake_pots = hasattr(environment.payment_database.database[0]["payment_system"], "pot_amount")
+        n_samples = ceil(n_steps / self.recording_interval)
+        n_robots = len(environment.population) + n_newcomers
+        self.rewards = EvolutionRecorder(n_samples, n_robots) if "rewards_evolution" in metrics else None
+        self.items = EvolutionRecorder(n_samples, n_robots, dtype=int) if "items_evolution" in metrics else None
+        self.stake_pots = EvolutionRecorder(n_samples, n_robots) if self.has_stake_pots else None
+        self.wealth = EvolutionRecorder(n_samples, n_robots) if self.has_stake_pots else None
+
+
+    def record(self, tick):
+        if tick % self.recording_interval != 0:
+            return
+        population = self.environment.population
+        payment_database = self.environment.payment_database
+        robot_ids = [bot.id for bot in population]
+        rewards = payment_database.get_rewards(robot_ids) \
+                    if self.rewards is not None or self.has_stake_pots else None
+        if self.rewards is not None:
+            self.rewards.record(tick, rewards)
+        if self.items is not None:
+            self.items.record(tick, [bot.items_collected for bot in population])
+        if self.has_stake_pots:
+            stake_pots = payment_database.get_stake_pots(robot_ids)
+            self.stake_pots.record(tick, stake_pots)
+            self.wealth.record(tick, rewards + stake_pots)
+
+
+    def recorders(self):
+        return {"rewards": self.rewards, "items": self.items, "stake_pots": self.stake_pots, "wealth": self.wealth}
+
+
+    def snapshot(self):
+        """
+        recorded samples as arrays, see MainController.snapshot
+        """
+        state = {}
+        for name, recorder in self.recorders().items():
+            if recorder is not None:
+                state.update({f"recorder_{name}_ticks": recorder.ticks[:recorder.count],
+                              f"recorder_{name}_sizes": recorder.sizes[:recorder.count],
+                              f"recorder_{name}_values": recorder.values[:recorder.count]})
+        return state
+
+
+    def restore(self, state):
+        for name, recorder in self.recorders().items():
+            if recorder is None:
+                continue
+            for tick, size, values in zip(state[f"recorder_{name}_ticks"].tolist(), state[f"recorder_{name}_sizes"].tolist(),
+                                          state[f"recorder_{name}_values"]):
+                recorder.record(tick, values[:size])
+
+
+    @staticmethod
+    def evolution_list(recorder):
+        return recorder.to_list() if recorder is not None else []
@@ -0,0 +1,107 @@
+import hashlib
+import json
+import os
+import pickle
+from pathlib import Path
+
+from controllers.main_controller import Configuration
+
+
+# parameters which do not change the result of a run
+UNCACHED_PARAMETERS = ["number_runs", "simulation_seed", "visualization", "adaptive_runs"]
+UNCACHED_DATA_COLLECTION_PARAMETERS = ["output_directory", "filename", "cache_directory",
+                                       "checkpoint_directory", "checkpoint_interval"]
+# sources whose changes invalidate the cache (config.py for the newcomers phase flags)
+CODE_DIRECTORIES = ["model", "helpers", "controllers"]
+CODE_FILES = ["config.py"]
+
+__code_version = None
+
+
+def code_version():
+    """
+    hash of the simulation sources, computed once per process
+    """
+    global __code_version
+    if __code_version is None:
+        src_dir = Path(__file__).resolve().parent.parent
+        files = sorted(f for d in CODE_DIRECTORIES for f in (src_dir / d).glob("*.py")) + \
+                [src_dir / f for f in CODE_FILES if (src_dir / f).exists()]
+        digest = hashlib.sha256()
+        for f in files:
+            digest.update(f.relative_to(src_dir).as_posix().encode())
+            digest.update(f.read_bytes())
+        __code_version = digest.hexdigest()
+    return __code_version
+
+
+class ResultCache:
+    """
+    on disk cache of the results (RunResult) of the single runs, content-addressed by:
+        -the config parameters (but those in UNCACHED_PARAMETERS),
+        -the effective seed of the run (simulation_seed+i),
+        -the code version (hash of the sources).
+    runs with random seed are never cached.
+
+    enabled by data_collection["cache_directory"]
+    """
+    def __init__(self, directory):
+        self.directory = directory
+
+
+    @staticmethod
+    def from_config(config: Configuration):
+        directory = config.value_of("data_collection").get("cache_directory")
+        return ResultCache(directory) if directory else None
+
+
+    @staticmethod
+    def key(config: Configuration, i):
+        """
+        :param i: run index, the seed of config is the one of the whole sweep
+        :return: key of the run, None if the run is not reproducible (random seed)
+        """
+        simulation_seed = config.value_of("simulation_seed")
+        if simulation_seed == '' or simulation_seed == 'random':
+            return None
+        parameters = {k: v for k, v in config._parameters.items() if k not in UNCACHED_PARAMETERS}
+        parameters["data_collection"] = {k: v for k, v in parameters["data_collection"].items()
+                                         if k not in UNCACHED_DATA_COLLECTION_PARAMETERS}
+        parameters["run_seed"] = simulation_seed + i
+        parameters["code_version"] = code_version()
+        return hashlib.sha256(json.dumps(parameters, sort_keys=True).encode()).hexdigest()
+
+
+    def load_runs(self, config: Configuration):
+        """
+        :return: list of the cached results of the runs of config, None for the missing ones
+        """
+        return [self.load(self.key(config, i)) for i in range(config.value_of("number_runs"))]
+
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.pkl")
+
+
+    def load(self, key):
+        """
+        :return: cached result, None if missing
+        """
+        if key is None or not os.path.isfile(self.path(key)):
+            return None
+        try:
+            with open(self.path(key), "rb") as file:
+                return pickle.load(file)
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            return None
+
+
+    def store(self, key, result):
+        if key is None:
+            return
+        Path(os.path.dirname(self.path(key))).mkdir(parents=True, exist_ok=True)
+        # written aside and renamed, concurrent readers never see a partial file
+        tmp_path = f"{self.path(key)}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as file:
+            pickle.dump(result, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path(key))
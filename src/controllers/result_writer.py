@@ -0,0 +1,280 @@
+import os
+from os.path import join
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+from controllers.main_controller import Configuration
+
+
+TRANSACTION_TYPES = ["attempted", "validated", "completed", "combined"]
+TRANSACTION_ROLES = ["buyer", "seller"]
+# formats of the evolution metrics (rewards, items, pots, wealth):
+#   -"csv": one row per recorded tick, robots values as a list (string)
+#   -"npy": float64 array (runs, ticks, robots) in <filename>.npy, NaN for the robots not yet
+#       present (newcomers), ticks in <filename>_ticks.npy. See data_analysis.load_evolution_array
+EVOLUTION_FORMATS = ("csv", "npy")
+# outputs are written to <filename>.partial, renamed to <filename> when the config is closed
+PARTIAL_SUFFIX = ".partial"
+
+
+class ResultWriter:
+    """
+    streaming writer of the output files of a config: the metrics of each run are appended
+    to their files as soon as the run is written, hence no run is kept in memory.
+
+    runs may arrive in any order (e.g. imap_unordered), each written tagged with its simulation_id:
+        -evolution metrics and transactions log: simulation_id column (npy: row of the run),
+        -one row per run metrics (rewards, items_collected, drifts, transactions counts): simulation_id
+            prefixed to the row until close(), which sorts the rows and removes it, as for the files written all at once.
+    Files are flushed after every run, the runs completed before a crash stay on disk.
+
+    Output files are the ones of InformationMarket.record_data: they are created (and their name
+    chosen with filename_resolver) when the first run is written, in the same order.
+    Until close() they are written with PARTIAL_SUFFIX: the output of a killed or failed config is never
+    under its final name, hence it does not push the one of a rerun (e.g. --resume) to a new name.
+    Final names of the writers still open are reserved, two configs with the same filename get different ones.
+    Evolution metrics are written in data_collection["evolution_format"] (see EVOLUTION_FORMATS)
+    """
+    # final paths of the outputs of the writers still open
+    reserved = set()
+
+
+    def __init__(self, config: Configuration, filename, filename_resolver):
+        data_collection = config.value_of("data_collection")
+        self.output_directory = data_collection["output_directory"]
+        self.metrics = data_collection["metrics"]
+        self.transactions_log = data_collection["transactions_log"]
+        self.evolution_format = data_collection.get("evolution_format", "csv")
+        if self.evolution_format not in EVOLUTION_FORMATS:
+            raise ValueError(f"evolution format {self.evolution_format} not recognized, "
+                             f"accepted values are {EVOLUTION_FORMATS}")
+        self.number_runs = config.value_of("number_runs")
+        self.filename = filename
+        self.resolve_filename = filename_resolver
+        # NOTE the files which are not metrics are named checking the folder of the last metric
+        self.last_metric = self.metrics[-1] if self.metrics else ""
+        self.files = {}
+        self.arrays = {}
+        self.paths = []
+        self.partials = []
+        self.row_files = set()
+        self.run_items = {}
+        self.run_rewards = {}
+        self.items_filename = None
+
+
+    def write(self, i, result):
+        """
+        :param i: simulation_id of the run
+        :param result: RunResult (or MainController) of the run
+        """
+        self.write_run(i, result)
+
+
+    def close(self):
+        """
+        sorts the rows of the one row per run files and moves the outputs to their final names
+        :return: filename of the rewards files, None if rewards are not recorded
+        """
+        row_paths = [self.files[key].name for key in self.row_files]
+        self.release()
+        try:
+            for path in row_paths:
+                self.sort_rows(path)
+        except ValueError:
+            self.discard()
+            raise
+        self.row_files = set()
+        for partial_path, path in self.partials:
+            os.replace(partial_path, path)
+        self.partials = []
+        return self.items_filename
+
+
+    def discard(self):
+        """
+        closes the writer removing its outputs (e.g. a run of the config failed)
+        """
+        self.release()
+        for partial_path, _ in self.partials:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+        self.partials = []
+        self.paths = []
+
+
+    def sort_rows(self, path):
+        """
+        rows of a one row per run file in simulation_id order, without it
+        NOTE rows are aligned to the runs only if runs 0..k-1 are all written
+        """
+        with open(path, "r") as file:
+            rows = [row.split(",", 1) for row in file]
+        rows.sort(key=lambda row: int(row[0]))
+        simulation_ids = [int(i) for i, _ in rows]
+        if simulation_ids != list(range(len(rows))):
+            missing = sorted(set(range(max(simulation_ids) + 1)) - set(simulation_ids))
+            raise ValueError(f"runs {missing} of {self.filename} are not written, rows of {path} would not be aligned to the runs")
+        with open(path, "w") as file:
+            file.writelines(row for _, row in rows)
+
+
+    def release(self):
+        for file in self.files.values():
+            file.close()
+        for array in self.arrays.values():
+            array.flush()
+        self.files = {}
+        self.arrays = {}
+        for _, path in self.partials:
+            ResultWriter.reserved.discard(path)
+
+
+    def summary(self):
+        """
+        :return: mean and std over the runs written of the total items collected and of the mean reward
+        """
+        summary = {}
+        run_items = [self.run_items[i] for i in sorted(self.run_items)]
+        run_rewards = [self.run_rewards[i] for i in sorted(self.run_rewards)]
+        if run_items:
+            summary.update(items_collected_mean=float(np.mean(run_items)),
+                           items_collected_std=float(np.std(run_items)))
+        if run_rewards:
+            summary.update(rewards_mean=float(np.mean(run_rewards)),
+                           rewards_std=float(np.std(run_rewards)))
+        return summary
+
+
+    def output_path(self, directory, metric, filename):
+        """
+        final name of an output (resolved with filename_resolver, not reserved by another writer)
+        :return: filename, path written until close()
+        """
+        Path(join(self.output_directory, directory)).mkdir(parents=True, exist_ok=True)
+        current_filename = self.resolve_filename(self.output_directory, metric, filename)
+        stem, extension = os.path.splitext(current_filename)
+        exist_count = 0
+        while join(self.output_directory, directory, current_filename) in ResultWriter.reserved:
+            exist_count += 1
+            current_filename = f"{stem}_{exist_count}{extension}"
+        path = join(self.output_directory, directory, current_filename)
+        ResultWriter.reserved.add(path)
+        self.paths.append((directory, path))
+        self.partials.append((path + PARTIAL_SUFFIX, path))
+        return current_filename, path + PARTIAL_SUFFIX
+
+
+    def file(self, directory, metric, filename):
+        """
+        output file, created the first time
+        :return: file, True if just created
+        """
+        if (directory, filename) in self.files:
+            return self.files[(directory, filename)], False
+        current_filename, partial_path = self.output_path(directory, metric, filename)
+        if directory == "rewards":
+            self.items_filename = current_filename
+        file = open(partial_path, "w")
+        self.files[(directory, filename)] = file
+        return file, True
+
+
+    def write_row(self, directory, metric, filename, i, values):
+        """
+        row of run i, prefixed with i until close()
+        """
+        file, _ = self.file(directory, metric, filename)
+        self.row_files.add((directory, filename))
+        file.write(f"{i},")
+        pd.DataFrame([values]).to_csv(file, index=False, header=False)
+
+
+    def write_binary(self, directory, filename, data):
+        _, partial_path = self.output_path(directory, directory, filename)
+        with open(partial_path, "wb") as file:
+            file.write(data)
+
+
+    def evolution_array(self, directory, metric, filename, ticks, robots):
+        """
+        memory mapped .npy output of an evolution metric, created the first time
+        """
+        if (directory, filename) in self.arrays:
+            return self.arrays[(directory, filename)]
+        current_filename, partial_path = self.output_path(directory, directory, filename.replace(".csv", ".npy"))
+        array = np.lib.format.open_memmap(partial_path, mode="w+",
+                                          dtype="float64", shape=(self.number_runs, len(ticks), robots))
+        array[:] = np.nan
+        ticks_path = join(self.output_directory, directory, current_filename.replace(".npy", "_ticks.npy"))
+        with open(ticks_path + PARTIAL_SUFFIX, "wb") as file:
+            np.save(file, np.asarray(ticks, dtype=int))
+        self.partials.append((ticks_path + PARTIAL_SUFFIX, ticks_path))
+        self.arrays[(directory, filename)] = array
+        return array
+
+
+    def write_evolution(self, directory, metric, filename, i, evolution_list, columns):
+        if self.evolution_format == "csv":
+            self.write_records(directory, metric, filename, i, evolution_list, columns)
+            return
+        ticks = [tick for tick, _ in evolution_list]
+        robots = max([len(values) for _, values in evolution_list], default=0)
+        array = self.evolution_array(directory, metric, filename, ticks, robots)
+        for t, (_, values) in enumerate(evolution_list[:array.shape[1]]):
+            array[i, t, :len(values)] = values[:array.shape[2]]
+
+
+    def write_records(self, directory, metric, filename, i, records, columns):
+        file, new_file = self.file(directory, metric, filename)
+        df = pd.DataFrame(records, columns=columns)
+        df["simulation_id"] = i
+        df = df.set_index("simulation_id")
+        df.to_csv(file, header=new_file)
+
+
+    def write_run(self, i, result):
+        for metric in self.metrics:
+            if metric == "rewards":
+                rewards = result.get_rewards()
+                self.write_row("rewards", metric, self.filename, i, rewards)
+                self.run_rewards[i] = np.mean(rewards)
+            elif metric == "items_collected":
+                items_collected = result.get_items_collected()
+                self.write_row("items_collected", metric, self.filename, i, items_collected)
+                self.run_items[i] = np.sum(items_collected)
+            elif metric == "drifts":
+                self.write_row("drifts", metric, self.filename, i, result.get_drifts())
+            elif metric == "rewards_evolution":
+                self.write_evolution("rewards_evolution", metric, self.filename, i,
+                                     result.get_rewards_evolution_list(), ["tick", "rewards_list"])
+            elif metric == "items_evolution":
+                self.write_evolution("items_evolution", metric, self.filename, i,
+                                     result.get_items_evolution_list(), ["tick", "items_list"])
+            elif "transactions" in metric:
+                for transaction_type in TRANSACTION_TYPES:
+                    for transaction_role in TRANSACTION_ROLES:
+                        complete_filename = self.filename.split(".csv")[0] + f"_{transaction_type}_{transaction_role}.csv"
+                        self.write_row("transactions", metric, complete_filename, i,
+                                       result.get_transactions_list(transaction_type, transaction_role))
+            elif i == 0:
+                print(f"[WARNING] Could not record metric: '{metric}'. Metric name is not valid.")
+
+        if self.transactions_log == "binary":
+            self.write_binary("transactions", self.filename.split(".csv")[0] + f"_run{i}.tlog",
+                              result.get_transaction_log_data())
+        elif self.transactions_log:
+        #NOTE --- ATTENTION: this files can easily reach 200MB each
+            self.write_records("transactions", self.last_metric, self.filename, i,
+                               result.get_transaction_log(), ["tick", "buyer", "seller"])
+
+        if result.has_stake_pots():
+            self.write_evolution("pots_evolution", self.last_metric, self.filename, i,
+                                 result.get_stake_pot_evolution_list(), ["tick", "pot_list"])
+            self.write_evolution("wealth_evolution", self.last_metric, self.filename, i,
+                                 result.get_wealth_evolution_list(), ["tick", "wealth_list"])
+        for file in self.files.values():
+            file.flush()
+        for array in self.arrays.values():
+            array.flush()
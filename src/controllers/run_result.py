@@ -0,0 +1,105 @@
+import numpy as np
+
+from controllers.main_controller import MainController
+
+
+TRANSACTION_TYPES = ["attempted", "validated", "completed", "combined"]
+TRANSACTION_ROLES = ["buyer", "seller"]
+
+
+class EvolutionRecord:
+    """
+    evolution metric ([[tick, values_list], ...]) stored as arrays:
+    ticks, values padded to the maximum population size (newcomers) and the size of each record
+    """
+    def __init__(self, evolution_list):
+        self.ticks = np.array([tick for tick, _ in evolution_list], dtype=int)
+        self.sizes = np.array([len(values) for _, values in evolution_list], dtype=int)
+        integer_values = all(isinstance(value, (int, np.integer)) for _, values in evolution_list for value in values)
+        self.values = np.zeros((len(evolution_list), self.sizes.max() if len(evolution_list) else 0),
+                               dtype=int if integer_values else float)
+        for i, (_, values) in enumerate(evolution_list):
+            self.values[i, :len(values)] = values
+
+
+    def to_list(self):
+        return [[tick, values[:size].tolist()]
+                for tick, values, size in zip(self.ticks.tolist(), self.values, self.sizes.tolist())]
+
+
+class RunResult:
+    """
+    compact results of a run, returned by the worker processes in place of the whole MainController:
+    only the metrics enabled in data_collection["metrics"] are kept, as numpy arrays,
+    together with the transactions log (if data_collection["transactions_log"], compressed bytes if "binary") and
+    the stake pots and wealth evolutions (if the payment system has a stake pot).
+
+    Exposes the same getters of MainController used by InformationMarket.record_data.
+    """
+    def __init__(self, controller: MainController):
+        data_collection = controller.config.value_of("data_collection")
+        metrics = data_collection["metrics"]
+        self.stake_pots = controller.has_stake_pots()
+        self.rewards = np.array(controller.get_rewards()) if "rewards" in metrics else None
+        self.items_collected = np.array(controller.get_items_collected()) if "items_collected" in metrics else None
+        self.drifts = np.array(controller.get_drifts()) if "drifts" in metrics else None
+        self.rewards_evolution = EvolutionRecord(controller.get_rewards_evolution_list()) \
+                                    if "rewards_evolution" in metrics else None
+        self.items_evolution = EvolutionRecord(controller.get_items_evolution_list()) \
+                                    if "items_evolution" in metrics else None
+        self.transactions = {(transaction_type, role): np.array(controller.get_transactions_list(transaction_type, role))
+                                for transaction_type in TRANSACTION_TYPES for role in TRANSACTION_ROLES} \
+                            if any("transactions" in metric for metric in metrics) else None
+        self.transaction_log = np.array(controller.get_transaction_log(), dtype=int).reshape(-1, 3) \
+                                if data_collection["transactions_log"] and data_collection["transactions_log"] != "binary" \
+                                else None
+        self.transaction_log_data = controller.get_transaction_log_data() \
+                                        if data_collection["transactions_log"] == "binary" else None
+        self.stake_pot_evolution = EvolutionRecord(controller.get_stake_pot_evolution_list()) \
+                                    if self.stake_pots else None
+        self.wealth_evolution = EvolutionRecord(controller.get_wealth_evolution_list()) \
+                                    if self.stake_pots else None
+
+
+    def has_stake_pots(self):
+        return self.stake_pots
+
+
+    def get_rewards(self):
+        return self.rewards.tolist()
+
+
+    def get_items_collected(self):
+        return self.items_collected.tolist()
+
+
+    def get_drifts(self):
+        return self.drifts.tolist()
+
+
+    def get_rewards_evolution_list(self):
+        return self.rewards_evolution.to_list()
+
+
+    def get_items_evolution_list(self):
+        return self.items_evolution.to_list()
+
+
+    def get_stake_pot_evolution_list(self):
+        return self.stake_pot_evolution.to_list()
+
+
+    def get_wealth_evolution_list(self):
+        return self.wealth_evolution.to_list()
+
+
+    def get_transaction_log(self):
+        return self.transaction_log.tolist()
+
+
+    def get_transaction_log_data(self):
+        return self.transaction_log_data
+
+
+    def get_transactions_list(self, type: str, role="buyer"):
+        return self.transactions[(type, role)]
@@ -0,0 +1,393 @@
+import copy
+import json
+from itertools import product
+from os.path import join
+from pathlib import Path
+
+from controllers.main_controller import Configuration
+from model.behavior import BAD_PARAM_COMBINATIONS_DICT, BEST_PARAM_COMBINATIONS_DICT, COMBINE_STRATEGY_DICT, \
+    SUB_FOLDERS_DICT
+
+
+# python version of src/generate_config.sh: same parameters lists, configs and filenames
+
+HONEST_CLASS_DICT = {
+                    "b": "BenchmarkBehavior",
+                    "n": "NaiveBehavior",
+                    "Nn": "NewNaiveBehavior",
+                    "s": "ScepticalBehavior",
+                    "Ns": "NewScepticalBehavior",
+                    "r": "ReputationRankingBehavior",
+                    "v": "VariableScepticalBehavior",
+                    "Nv": "NewVariableScepticalBehavior",
+                    "t": "WealthThresholdBehavior",
+                    "w": "WealthWeightedBehavior",
+                    "h": "ReputationHistoryBehavior",
+                    "hs": "ReputationHistoryScepticalBehavior",
+                    "c": "CapitalistBehavior",
+                    }
+DISHONEST_CLASS_DICT = {
+                    "b": "SaboteurBenchmarkBehavior",
+                    "n": "SaboteurBehavior",
+                    "Nn": "NewSaboteurBehavior",
+                    "s": "ScaboteurBehavior",
+                    "Ns": "NewScaboteurBehavior",
+                    "r": "SaboteurReputationRankingBehavior",
+                    "v": "SaboteurVariableScepticalBehavior",
+                    "Nv": "NewSaboteurVariableScepticalBehavior",
+                    "t": "SaboteurWealthThresholdBehavior",
+                    "w": "SaboteurWealthWeightedBehavior",
+                    "h": "SaboteurReputationHistoryBehavior",
+                    "hs": "SaboteurReputationHistoryScepticalBehavior",
+                    "c": "SaboteurCapitalistBehavior",
+                    }
+# swept parameters of each behavior (config name, filename label), in filename order
+BEHAVIOR_SWEEP_PARAMS_DICT = {
+                    "b": [("good_acceptance_rate", "GAR"), ("bad_acceptance_rate", "BAR"),
+                          ("saboteur_acceptance_rate", "SAR")],
+                    "n": [("reputation_method", "RM")],
+                    "Nn": [],
+                    "s": [("threshold", "ST"), ("reputation_method", "RM")],
+                    "Ns": [("scepticism_threshold", "ST")],
+                    "r": [("ranking_threshold", "RT"), ("reputation_method", "RM")],
+                    "v": [("comparison_method", "CM"), ("scaling", "SC"), ("scepticism_threshold", "ST"),
+                          ("weight_method", "WM")],
+                    "Nv": [("comparison_method", "CM"), ("scaling", "SC"), ("scepticism_threshold", "ST"),
+                           ("weight_method", "WM")],
+                    "t": [("comparison_method", "CM"), ("scaling", "SC"), ("reputation_method", "RM")],
+                    "w": [],
+                    "h": [("verification_method", "VM"), ("threshold_method", "TM"), ("scaling", "SC"),
+                          ("kd", "KD"), ("reputation_method", "RM")],
+                    "hs": [("verification_method", "VM"), ("threshold_method", "TM"), ("scaling", "SC"),
+                           ("kd", "KD"), ("scepticism_threshold", "ST")],
+                    "c": [("reputation_method", "RM")],
+                    }
+PAYMENT_SYSTEM_NAME_DICT = {
+                    "OutlierPenalisationPaymentSystem": "P",
+                    "DelayedPaymentPaymentSystem": "NP",
+                    }
+# noise assignation: (noise class, swept parameters (config name, filename label))
+NOISE_SWEEP_PARAMS_DICT = {
+                    "average": ("UniformNoise", [("noise_mu", "NMU"), ("noise_range", "NRANG")]),
+                    "perfect": ("UniformNoise", [("noise_mu", "NMU"), ("noise_range", "NRANG")]),
+                    "bimodal": ("BimodalNoise", [("noise_sampling_mu", "SMU"), ("noise_sampling_sigma", "SSD"),
+                                                 ("noise_sd", "NSD")]),
+                    }
+SABOTEUR_PERFORMANCE_NAME_DICT = {"average": "avg", "perfect": "perf"}
+# combinations never generated (conditions of generate_config.sh)
+INCOMPATIBLE_COMBINATIONS = [
+                    {"payment_system": "DelayedPaymentPaymentSystem", "reputation_stake": True},
+                    {"behavior": "b", "reputation_stake": True},
+                    {"behavior": "b", "payment_system": "OutlierPenalisationPaymentSystem"},
+                    {"behavior": "r", "payment_system": "DelayedPaymentPaymentSystem"},
+                    {"behavior": "t", "payment_system": "DelayedPaymentPaymentSystem"},
+                    {"behavior": "c", "payment_system": "DelayedPaymentPaymentSystem"},
+                    {"behavior": "h", "payment_system": "DelayedPaymentPaymentSystem"},
+                    ]
+PRUNE_MODES = (None, "bad", "best")
+
+# fixed parameters (fixed_params_generate_config.sh and scalars of params_experiment_generate_config.sh)
+BASE_PARAMETERS = {
+    "width": 1200,
+    "height": 600,
+    "food": {"x": 200, "y": 300, "radius": 50},
+    "nest": {"x": 1000, "y": 300, "radius": 50},
+    "simulation_steps": 50000,
+    "simulation_seed": 5684436,
+    "number_runs": 20,
+    "visualization": {"activate": False, "fps": 60},
+    "random_walk": {"random_walk_factor": 0.9, "levi_factor": 1.4},
+    "agent": {
+        "radius": 8,
+        "speed": 2.5,
+        "communication_radius": 50,
+        "communication_stop_time": 0,
+        "communication_cooldown": 0,
+        "noise": {},
+        "fuel_cost": 0
+    },
+    "behaviors": [],
+    "combine_strategy": {"class": "", "parameters": {}},
+    "payment_system": {
+        "class": "",
+        "initial_reward": 7,
+        "parameters": {"information_share": 1}
+    },
+    "market": {"class": "FixedPriceMarket", "parameters": {"reward": 1}},
+    "data_collection": {
+        "output_directory": "",
+        "filename": "",
+        "metrics": ["items_evolution", "rewards_evolution", "items_collected", "rewards", "transactions"],
+        "precise_recording_interval": 100,
+        "transactions_log": False
+    }
+}
+# swept parameters (lists of params_experiment_generate_config.sh)
+SWEEP_DEFAULTS = {
+    "noise": ["average", "perfect"],
+    "noise_mu": [0.051],
+    "noise_range": [0.1],
+    "noise_sampling_mu": [0.05],
+    "noise_sampling_sigma": [0.05],
+    "noise_sd": [0.05],
+    "payment_system": ["OutlierPenalisationPaymentSystem"],
+    "reputation_stake": [True],
+    "number_of_robots": 25,
+    "honest_population": [20, 17, 22, 23, 25, 24],
+    "lie_angle": [0, 25, 90],
+    "combine_strategy": ["waa"],
+    "behavior": ["n", "s"],
+    "behavior_params": {
+        "b": {"good_acceptance_rate": [0.75, 0.85, 0.95],
+              "bad_acceptance_rate": [0.55, 0.4, 0.25],
+              "saboteur_acceptance_rate": [0.15, 0.075, 0]},
+        "n": {"reputation_method": ["r", "t"]},
+        "s": {"threshold": [0.25], "reputation_method": ["r", "t"]},
+        "Ns": {"scepticism_threshold": [0.25]},
+        "c": {"reputation_method": ["r", "t"]},
+        "r": {"ranking_threshold": [0.3, 0.5], "reputation_method": ["r", "t"]},
+        "t": {"comparison_method": ["allavg"], "scaling": [0.8, 0.5], "reputation_method": ["r", "t"]},
+        "h": {"verification_method": ["discrete"], "threshold_method": ["mean"], "scaling": [1], "kd": [1],
+              "reputation_method": ["h"]},
+        "hs": {"verification_method": ["discrete"], "threshold_method": ["mean"], "scaling": [1], "kd": [1],
+               "scepticism_threshold": [0.25]},
+        "v": {"comparison_method": ["allavg"], "scaling": [0.3], "scepticism_threshold": [0.25],
+              "weight_method": ["ratio"]},
+        "Nv": {"comparison_method": ["allavg"], "scaling": [0.3], "scepticism_threshold": [0.25],
+               "weight_method": ["ratio"]},
+    },
+    # payment_system reputation_metric of the behaviors without reputation_method
+    "reputation_metric": "h",
+    "prune": "bad",
+    "data_subdirectory": "",
+    "parameters": {},
+}
+
+
+def merge_parameters(parameters, overrides):
+    """
+    :return: copy of parameters with the (nested) values of overrides
+    """
+    merged = copy.deepcopy(parameters)
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_parameters(merged[key], value)
+        else:
+            merged[key] = copy.deepcopy(value)
+    return merged
+
+
+def filename_value(value):
+    return str(value).lower() if isinstance(value, bool) else str(value)
+
+
+class ParameterSweep:
+    """
+    lazy cartesian product of the experiment parameters (noise, behavior and its parameters,
+    honest population, payment system, reputation stake, lie angle, combine strategy):
+    configs are built one at a time while iterating, no file is written (see export).
+
+    incompatible (INCOMPATIBLE_COMBINATIONS) and pruned combinations are discarded from their
+    names, before building the config:
+        -"bad": combinations in BAD_PARAM_COMBINATIONS_DICT ([payment, first behavior params]);
+        -"best": only the combinations in BEST_PARAM_COMBINATIONS_DICT ([payment, stake, behavior params]);
+        -None: no pruning.
+
+    spec: dict (or JSON file, see from_file) overriding SWEEP_DEFAULTS; "parameters" overrides BASE_PARAMETERS.
+    Config (and data) files are named and placed as by generate_config.sh:
+        <config_directory>/<behavior folder>/<name>.json
+
+    e.g. for config_file, config in ParameterSweep({"behavior": ["r"], "lie_angle": [90]}, CONFIG_DIR, DATA_DIR):
+    """
+    def __init__(self, spec, config_directory, data_directory):
+        self.spec = merge_parameters(SWEEP_DEFAULTS, spec)
+        if self.spec["prune"] not in PRUNE_MODES:
+            raise ValueError(f"prune mode {self.spec['prune']} not recognized, accepted values are {PRUNE_MODES}")
+        for behavior in self.spec["behavior"]:
+            if behavior not in BEHAVIOR_SWEEP_PARAMS_DICT:
+                raise ValueError(f"behavior {behavior} not recognized, "
+                                 f"accepted values are {list(BEHAVIOR_SWEEP_PARAMS_DICT)}")
+        self.config_directory = config_directory
+        self.data_directory = join(data_directory, self.spec["data_subdirectory"]) \
+                                if self.spec["data_subdirectory"] else data_directory
+        self.base_parameters = merge_parameters(BASE_PARAMETERS, self.spec["parameters"])
+
+
+    @staticmethod
+    def from_file(sweep_file, config_directory, data_directory):
+        with open(sweep_file, "r") as file:
+            return ParameterSweep(json.load(file), config_directory, data_directory)
+
+
+    def __iter__(self):
+        return self.configurations()
+
+
+    def __len__(self):
+        return sum(1 for _ in self.combinations())
+
+
+    def config_files(self):
+        """
+        :return: config file of every combination, configs are not built
+        """
+        for combination in self.combinations():
+            yield self.config_file(combination)
+
+
+    def noise_settings(self):
+        """
+        :return: (noise assignation, noise parameters values (name: value)) of every noise combination
+        """
+        for noise in self.spec["noise"]:
+            names = [name for name, _ in NOISE_SWEEP_PARAMS_DICT[noise][1]]
+            for values in product(*[self.spec[name] for name in names]):
+                yield noise, dict(zip(names, values))
+
+
+    def behavior_settings(self, behavior):
+        """
+        :return: behavior parameters values (name: value) of every combination of the behavior
+        """
+        names = [name for name, _ in BEHAVIOR_SWEEP_PARAMS_DICT[behavior]]
+        behavior_params = self.spec["behavior_params"].get(behavior, {})
+        for name in names:
+            if name not in behavior_params:
+                raise ValueError(f"missing values of {name} for behavior {behavior}")
+        for values in product(*[behavior_params[name] for name in names]):
+            yield dict(zip(names, values))
+
+
+    @staticmethod
+    def is_incompatible(combination):
+        return any(all(combination[key] == value for key, value in rule.items())
+                   for rule in INCOMPATIBLE_COMBINATIONS) or \
+                (combination["lie_angle"] == 0) != (combination["dishonest_population"] == 0)
+
+
+    def is_pruned(self, combination, behavior_params_values):
+        """
+        :param behavior_params_values: compact values of the behavior params, as in the filename
+        """
+        payment = PAYMENT_SYSTEM_NAME_DICT[combination["payment_system"]]
+        if self.spec["prune"] == "bad":
+            return any(payment == bad_payment and behavior_params_values[:len(bad_params)] == bad_params
+                       for bad_payment, bad_params in BAD_PARAM_COMBINATIONS_DICT.get(combination["behavior"], []))
+        if self.spec["prune"] == "best":
+            reputation_stake = "RS" if combination["reputation_stake"] else "NRS"
+            return [payment, reputation_stake, behavior_params_values] \
+                    not in BEST_PARAM_COMBINATIONS_DICT.get(combination["behavior"], [])
+        return False
+
+
+    @staticmethod
+    def data_filename(combination):
+        """
+        filename of the outputs, as generate_config.sh: parameters values keep their dots
+        (removed from the name of the config file)
+        """
+        behavior = combination["behavior"]
+        filename = f"{combination['honest_population']}{behavior}_{combination['combine_strategy']}CS_" \
+                   f"{PAYMENT_SYSTEM_NAME_DICT[combination['payment_system']]}_" \
+                   f"{'' if combination['reputation_stake'] else 'N'}RS_{combination['lie_angle']}LIA"
+        for name, label in BEHAVIOR_SWEEP_PARAMS_DICT[behavior]:
+            filename += f"_{filename_value(combination['behavior_params'][name])}{label}"
+        for name, label in NOISE_SWEEP_PARAMS_DICT[combination["noise"]][1]:
+            filename += f"_{filename_value(combination['noise_params'][name])}{label}"
+        if combination["noise"] in SABOTEUR_PERFORMANCE_NAME_DICT:
+            filename += f"_{SABOTEUR_PERFORMANCE_NAME_DICT[combination['noise']]}SAB"
+        return filename
+
+
+    def combinations(self):
+        """
+        :return: every combination (dict of the swept values) which is neither incompatible nor pruned,
+            in the order of generate_config.sh. Configs are not built
+        """
+        number_of_robots = self.spec["number_of_robots"]
+        for noise, noise_params in self.noise_settings():
+            for behavior in self.spec["behavior"]:
+                for honest_population, payment_system, reputation_stake, lie_angle, combine_strategy in \
+                        product(self.spec["honest_population"], self.spec["payment_system"],
+                                self.spec["reputation_stake"], self.spec["lie_angle"], self.spec["combine_strategy"]):
+                    combination = {"noise": noise,
+                                   "noise_params": noise_params,
+                                   "behavior": behavior,
+                                   "honest_population": honest_population,
+                                   "dishonest_population": number_of_robots - honest_population,
+                                   "payment_system": payment_system,
+                                   "reputation_stake": reputation_stake,
+                                   "lie_angle": lie_angle,
+                                   "combine_strategy": combine_strategy}
+                    if self.is_incompatible(combination):
+                        continue
+                    for behavior_params in self.behavior_settings(behavior):
+                        behavior_params_values = [filename_value(value).replace(".", "")
+                                                  for value in behavior_params.values()]
+                        if self.is_pruned(combination, behavior_params_values):
+                            continue
+                        yield dict(combination, behavior_params=behavior_params)
+
+
+    def config_file(self, combination):
+        """
+        :return: path of the config file of combination (written only by export)
+        """
+        name = self.data_filename(combination).replace(".", "")
+        return join(self.config_directory, SUB_FOLDERS_DICT[combination["behavior"]], f"{name}.json")
+
+
+    def configuration(self, combination):
+        behavior = combination["behavior"]
+        honest_population = combination["honest_population"]
+        dishonest_population = combination["dishonest_population"]
+        behavior_params = dict(combination["behavior_params"])
+        if behavior == "b":
+            behavior_params = {"number_of_robots": honest_population,
+                               "number_of_byzantines": dishonest_population,
+                               "byzantine_performance": combination["noise"],
+                               **behavior_params}
+        parameters = copy.deepcopy(self.base_parameters)
+        noise_class, _ = NOISE_SWEEP_PARAMS_DICT[combination["noise"]]
+        noise_params = dict(combination["noise_params"])
+        if noise_class == "UniformNoise":
+            noise_params = {"dishonest_noise_performance": combination["noise"], **noise_params}
+        parameters["agent"]["noise"] = {"class": noise_class, "parameters": noise_params}
+        parameters["behaviors"] = [
+            {"class": HONEST_CLASS_DICT[behavior],
+             "population_size": honest_population,
+             "parameters": behavior_params},
+            {"class": DISHONEST_CLASS_DICT[behavior],
+             "population_size": dishonest_population,
+             "parameters": {"lie_angle": combination["lie_angle"], **behavior_params}},
+        ]
+        parameters["combine_strategy"]["class"] = COMBINE_STRATEGY_DICT[combination["combine_strategy"]]
+        parameters["payment_system"]["class"] = combination["payment_system"]
+        reputation_metric = "" if behavior == "b" else \
+                            behavior_params.get("reputation_method", self.spec["reputation_metric"])
+        parameters["payment_system"]["parameters"].update(reputation_stake=combination["reputation_stake"],
+                                                          reputation_metric=reputation_metric)
+        parameters["data_collection"]["output_directory"] = join(self.data_directory, SUB_FOLDERS_DICT[behavior])
+        parameters["data_collection"]["filename"] = f"{self.data_filename(combination)}.csv"
+        return Configuration.from_dict(parameters)
+
+
+    def configurations(self):
+        """
+        :return: (config file, Configuration) of every combination, built while iterating
+        """
+        for combination in self.combinations():
+            yield self.config_file(combination), self.configuration(combination)
+
+
+    def export(self):
+        """
+        writes the config files of the sweep (as generate_config.sh)
+        :return: paths of the written files
+        """
+        config_files = []
+        for config_file, config in self.configurations():
+            Path(config_file).parent.mkdir(parents=True, exist_ok=True)
+            config.save(config_file)
+            config_files.append(config_file)
+        return config_files
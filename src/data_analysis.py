@@ -390,6 +390,20 @@ def parse_args():
     return metric, mode
 
 
+def load_evolution_array(filename, mmap_mode="r"):
+    '''
+    loads an evolution metric written with data_collection["evolution_format"]=="npy"
+
+    :param filename: the .npy file, ticks are loaded from the _ticks.npy one next to it
+    :param mmap_mode: passed to numpy.load, by default the file is memory mapped (read only)
+
+    :return: ticks (n_ticks,), values (n_runs, n_ticks, n_robots), NaN for robots not present yet (newcomers)
+    '''
+    values=np.load(filename, mmap_mode=mmap_mode)
+    ticks=np.load(filename.replace(".npy","_ticks.npy"))
+    return ticks, values
+
+
 def dataframe_from_csv(
                         filename,
                         data_folder_and_subfolder="",
@@ -415,6 +429,8 @@ def dataframe_from_csv(
             - "C": completed transactions;
             - "X": combined transactions.
 
+    NOTE evolution metrics saved as .npy (see load_evolution_array) are accepted as well
+
     :param experiment_part: the part of the experiment to load. Accepted values are:
          "whole": in this case the data from the end of the experiment is loaded;
             selected metric folders will be "items_collected" or "rewards"
@@ -433,11 +449,35 @@ def dataframe_from_csv(
 
     :return: the DataFrame containing the desidered data
     '''
-    if not filename.endswith(".csv"): filename+=".csv"
+    if not filename.endswith(".csv") and not filename.endswith(".npy"): filename+=".csv"
 
     # if data_folder_and_subfolder!="" and metric!="":filename=join(data_folder_and_subfolder,metric,filename)
     #NOTE "lastN": ONLY items allowed (always monotonic non decreasing)
-    if experiment_part=="whole" or "transaction" in metric \
+    if filename.endswith(".npy"):
+        if "item" in metric: metric_folder="items_evolution"
+        elif "reward" in metric: metric_folder="rewards_evolution"
+        elif "wealth" in metric: metric_folder="wealth_evolution"
+        elif "pot" in metric: metric_folder="pots_evolution"
+        else: metric_folder=metric
+
+        if data_folder_and_subfolder!="" and metric!="":filename=join(data_folder_and_subfolder,metric_folder,filename)
+        ticks, values=load_evolution_array(filename)
+        if "last" in experiment_part:
+            n_last_part=float(re.findall(r"[-+]?(?:\d*\.*\d+)", experiment_part)[0])
+            if n_last_part>=1: n_last_part/=100
+            n_last_part=1-n_last_part
+            df=pd.DataFrame(values[:,-1,:]-values[:,int(n_last_part*len(ticks)),:])
+        elif "steps" in experiment_part or "df" in experiment_part:
+            n_runs, n_ticks, n_robots=values.shape
+            df=pd.DataFrame(values.reshape(n_runs*n_ticks,n_robots),
+                            columns=[f"{metric}_{robot_id}" for robot_id in range(n_robots)])
+            if "df" in experiment_part:
+                df.insert(0,"tick",np.tile(ticks,n_runs))
+                df.insert(0,"simulation_id",np.repeat(np.arange(n_runs),n_ticks))
+        else:
+            df=pd.DataFrame(values[:,-1,:])
+
+    elif experiment_part=="whole" or "transaction" in metric \
             or (('reward' in filename.split('/')[-2] or  'wealth' in filename.split('/')[-2]) \
             and 'df' not in experiment_part \
             and 'steps' not in experiment_part):#NOTE BYPASS NEGATIVE REWARD ISSUE
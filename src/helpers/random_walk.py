@@ -1,10 +1,33 @@
+import json
 from math import cos, radians, pi
+from bisect import bisect
+from itertools import accumulate
+from random import random
 import numpy as np
 
 __crw_weights = []
 __levi_weights = []
 __max_levi_steps = 15000
 
+# samplers, built once in set_parameters:
+#   -"compatible": cumulative tables + bisect, driven by the random module.
+#       Same draws (and same random sequence) of random.choices(population, weights)
+#   -"alias": Walker/Vose alias tables, driven by a numpy generator. O(1) draws,
+#       buffered in batches of ALIAS_BATCH_SIZE
+# with rng streams (see helpers.rng) draws of a robot use the cumulative tables, driven by its stream
+SAMPLERS = ("compatible", "alias")
+ALIAS_BATCH_SIZE = 4096
+
+__sampler = "compatible"
+__rng = None
+__crw_angles = np.arange(0, 360)
+__crw_cum_weights = []
+__levi_cum_weights = []
+__crw_alias = None
+__levi_alias = None
+__crw_buffer = []
+__levi_buffer = []
+
 
 def crw_pdf(thetas, rdwalk_factor):
     res = []
@@ -23,13 +46,55 @@ def levi_pdf(max_steps, alpha):
     return pdf
 
 
-def set_parameters(random_walk_factor, levi_factor, max_levi_steps=15000):
+def alias_table(weights):
+    """
+    Vose's alias method: returns (probabilities, aliases) s.t. a draw is
+        i uniform in [0, n), i if u < probabilities[i] else aliases[i]
+    """
+    n = len(weights)
+    probabilities = np.asarray(weights, dtype='float64') * n / np.sum(weights)
+    aliases = np.arange(n)
+    small = [i for i in range(n) if probabilities[i] < 1]
+    large = [i for i in range(n) if probabilities[i] >= 1]
+    while small and large:
+        s, l = small.pop(), large.pop()
+        aliases[s] = l
+        probabilities[l] -= 1 - probabilities[s]
+        (small if probabilities[l] < 1 else large).append(l)
+    # leftovers are 1 up to rounding errors
+    probabilities[small + large] = 1
+    return probabilities, aliases
+
+
+def alias_draws(table, size, rng):
+    probabilities, aliases = table
+    indexes = rng.integers(len(probabilities), size=size)
+    return np.where(rng.random(size) < probabilities[indexes], indexes, aliases[indexes])
+
+
+def set_parameters(random_walk_factor, levi_factor, max_levi_steps=15000, sampler="compatible", seed=None):
+    """
+    :param sampler: "compatible" or "alias", see SAMPLERS
+    :param seed: seed of the numpy generator used by the alias sampler
+    """
     global __crw_weights, __levi_weights, __max_levi_steps
+    global __sampler, __rng, __crw_cum_weights, __levi_cum_weights, __crw_alias, __levi_alias, \
+        __crw_buffer, __levi_buffer
+    if sampler not in SAMPLERS:
+        raise ValueError(f"unknown random walk sampler {sampler}, accepted values are {SAMPLERS}")
     thetas = np.arange(0, 360)
     __max_levi_steps = max_levi_steps
     __crw_weights = crw_pdf(thetas, random_walk_factor)
     __levi_weights = levi_pdf(max_levi_steps, levi_factor)
     # print(sum(levi_pdf(10000000, levi_factor)[max_levi_steps:10000000]), (max_levi_steps**(-levi_factor))/levi_factor)
+    __sampler = sampler
+    __crw_buffer, __levi_buffer = [], []
+    __crw_cum_weights = list(accumulate(__crw_weights))
+    __levi_cum_weights = list(accumulate(__levi_weights))
+    if sampler == "alias":
+        __rng = np.random.default_rng(seed if seed not in ("", "random") else None)
+        __crw_alias = alias_table(__crw_weights)
+        __levi_alias = alias_table(__levi_weights)
 
 
 def get_crw_weights():
@@ -42,3 +107,98 @@ def get_levi_weights():
 
 def get_max_levi_steps():
     return __max_levi_steps
+
+
+def get_sampler():
+    return __sampler
+
+
+def get_state():
+    """
+    state of the alias sampler (numpy generator and buffered draws) as arrays, see model.snapshot.
+    The compatible sampler is driven by the random module, hence it has no state of its own
+    """
+    if __sampler != "alias":
+        return {}
+    return {"random_walk_rng": np.array(json.dumps(__rng.bit_generator.state)),
+            "random_walk_crw_buffer": np.array(__crw_buffer, dtype=int),
+            "random_walk_levi_buffer": np.array(__levi_buffer, dtype=int)}
+
+
+def set_state(state):
+    """
+    restores a state of get_state, after set_parameters with the same parameters
+    """
+    global __crw_buffer, __levi_buffer
+    if __sampler != "alias":
+        return
+    __rng.bit_generator.state = json.loads(str(state["random_walk_rng"]))
+    __crw_buffer = state["random_walk_crw_buffer"].tolist()
+    __levi_buffer = state["random_walk_levi_buffer"].tolist()
+
+
+def get_stream():
+    """
+    generator and buffered draws of the alias sampler (the objects, not copies):
+    the replicas of an ensemble swap them in turn, see EnsembleController
+    """
+    return __rng, __crw_buffer, __levi_buffer
+
+
+def set_stream(stream):
+    global __rng, __crw_buffer, __levi_buffer
+    __rng, __crw_buffer, __levi_buffer = stream
+
+
+def __compatible_draw(cum_weights, uniform=random):
+    """
+    NOTE: same steps of random.choices, hence same result and same random() calls
+    """
+    return bisect(cum_weights, uniform() * (cum_weights[-1] + 0.0), 0, len(cum_weights) - 1)
+
+
+def draw_levi_steps(uniform=None):
+    """
+    single draw of a Levy walk length, in [1, max_levi_steps]
+    :param uniform: uniform draws in [0, 1) of the stream of the robot (rng streams), see helpers.rng
+    """
+    global __levi_buffer
+    if uniform is not None:
+        return __compatible_draw(__levi_cum_weights, uniform) + 1
+    if __sampler == "compatible":
+        return __compatible_draw(__levi_cum_weights) + 1
+    if not __levi_buffer:
+        __levi_buffer = sample_levi_steps(ALIAS_BATCH_SIZE).tolist()[::-1]
+    return __levi_buffer.pop()
+
+
+def draw_crw_angle(uniform=None):
+    """
+    single draw of a correlated random walk turn angle, in [0, 360)
+    """
+    global __crw_buffer
+    if uniform is not None:
+        return __crw_angles[__compatible_draw(__crw_cum_weights, uniform)]
+    if __sampler == "compatible":
+        return __crw_angles[__compatible_draw(__crw_cum_weights)]
+    if not __crw_buffer:
+        __crw_buffer = sample_crw_angles(ALIAS_BATCH_SIZE).tolist()[::-1]
+    return __crw_buffer.pop()
+
+
+def sample_levi_steps(size):
+    """
+    batched draws of Levy walk lengths, returns an array
+    """
+    if __sampler == "compatible":
+        return np.array([__compatible_draw(__levi_cum_weights) + 1 for _ in range(size)])
+    return alias_draws(__levi_alias, size, __rng) + 1
+
+
+def sample_crw_angles(size):
+    """
+    batched draws of correlated random walk turn angles, returns an array
+    """
+    if __sampler == "compatible":
+        return __crw_angles[[__compatible_draw(__crw_cum_weights) for _ in range(size)]]
+    return __crw_angles[alias_draws(__crw_alias, size, __rng)]
@@ -0,0 +1,112 @@
+import json
+from hashlib import sha512
+import numpy as np
+
+
+# random number generation of a run, config["rng"]["mode"]:
+#   -"legacy": process-wide random module (default, results of the previous versions),
+#   -"streams": every robot and the environment draw from their own RandomStream
+RNG_MODES = ("legacy", "streams")
+BLOCK_SIZE = 256
+
+
+def seed_entropy(seed):
+    """
+    entropy of the seed sequence of simulation_seed: None for random seeds,
+    strings are hashed as random.seed does
+    """
+    if seed in ("", "random", None):
+        return None
+    if isinstance(seed, str):
+        return int.from_bytes(sha512(seed.encode()).digest(), "big")
+    return int(seed)
+
+
+class RandomStream:
+    """
+    stream of random numbers of a counter-based generator (Philox), drawn in blocks of block_size:
+    a stream only depends on its seed sequence and on its own draws, not on the draws of the others.
+    Same interface of the random module functions used by the simulation
+    """
+    def __init__(self, seed_sequence, block_size=BLOCK_SIZE):
+        self.generator = np.random.Generator(np.random.Philox(seed_sequence))
+        self.block_size = block_size
+        self._uniform = []
+        self._normal = []
+
+
+    def random(self):
+        """
+        uniform draw in [0, 1)
+        """
+        if not self._uniform:
+            self._uniform = self.generator.random(self.block_size).tolist()[::-1]
+        return self._uniform.pop()
+
+
+    def gauss(self, mu, sigma):
+        if not self._normal:
+            self._normal = self.generator.standard_normal(self.block_size).tolist()[::-1]
+        return mu + sigma * self._normal.pop()
+
+
+    def randint(self, a, b):
+        """
+        integer in [a, b], as random.randint
+        """
+        return int(self.generator.integers(a, b, endpoint=True))
+
+
+    def get_state(self):
+        """
+        :return: state of the generator (JSON) and prefetched draws, see model.snapshot
+        """
+        state = self.generator.bit_generator.state
+        state["state"] = {key: value.tolist() for key, value in state["state"].items()}
+        state["buffer"] = state["buffer"].tolist()
+        return json.dumps(state), self._uniform, self._normal
+
+
+    def set_state(self, generator_state, uniform, normal):
+        state = json.loads(generator_state)
+        state["state"] = {key: np.array(value, dtype=np.uint64) for key, value in state["state"].items()}
+        state["buffer"] = np.array(state["buffer"], dtype=np.uint64)
+        self.generator.bit_generator.state = state
+        self._uniform = list(uniform)
+        self._normal = list(normal)
+
+
+class RandomStreams:
+    """
+    streams of a run ("streams" mode): the seed sequence of simulation_seed is spawned into the stream
+    of the environment (food and nest spawns, initial positions) and one stream per robot
+    (initial orientation and noise, motion noise, random walk, behavior), spawned in robot_id order.
+    Hence the draws of a robot do not depend on the order robots are stepped in,
+    nor on the draws of the other robots.
+
+    config["rng"] = {"mode": "streams", "block_size": prefetched draws (optional, BLOCK_SIZE)}
+    """
+    def __init__(self, seed, block_size=BLOCK_SIZE):
+        self.block_size = block_size
+        environment_sequence, self._robots_sequence = np.random.SeedSequence(seed_entropy(seed)).spawn(2)
+        self.environment = RandomStream(environment_sequence, block_size)
+
+
+    @staticmethod
+    def from_params(seed, rng_params):
+        """
+        :return: RandomStreams of rng_params (config["rng"]), None in legacy mode
+        """
+        mode = rng_params["mode"] if rng_params else "legacy"
+        if mode not in RNG_MODES:
+            raise ValueError(f"rng mode {mode} not recognized, accepted values are {RNG_MODES}")
+        if mode == "legacy":
+            return None
+        return RandomStreams(seed, rng_params.get("block_size", BLOCK_SIZE))
+
+
+    def robot_stream(self):
+        """
+        stream of the next robot (robots are created in robot_id order, newcomers included)
+        """
+        return RandomStream(self._robots_sequence.spawn(1)[0], self.block_size)
@@ -0,0 +1,123 @@
+from bisect import bisect_left, insort
+from heapq import heappush, heappop, heapify
+from math import fsum, ceil
+
+
+class RunningStatistics:
+    """
+    sum, mean, min and max of a set of values indexed by key (e.g. robot_id),
+    kept updated one value at a time, so that queries do not scan all the values.
+
+    sum is compensated (Neumaier) and recomputed exactly at each compaction.
+    min and max are heaps with lazy deletion: an entry is outdated if the value of its key
+    changed, outdated entries are discarded when they reach the top.
+    Heaps are rebuilt when they grow over COMPACTION_FACTOR times the number of values.
+    """
+    COMPACTION_FACTOR = 4
+
+    def __init__(self):
+        self.values = {}
+        self._sum = 0.
+        self._compensation = 0.
+        self._min_heap = []
+        self._max_heap = []
+
+
+    def __len__(self):
+        return len(self.values)
+
+
+    def _add(self, value):
+        total = self._sum + value
+        if abs(self._sum) >= abs(value):
+            self._compensation += (self._sum - total) + value
+        else:
+            self._compensation += (value - total) + self._sum
+        self._sum = total
+
+
+    def update(self, key, value):
+        if key in self.values:
+            self._add(-self.values[key])
+        self.values[key] = value
+        self._add(value)
+        heappush(self._min_heap, (value, key))
+        heappush(self._max_heap, (-value, key))
+        if len(self._min_heap) > self.COMPACTION_FACTOR * len(self.values) + 16:
+            self.compact()
+
+
+    def compact(self):
+        self._min_heap = [(value, key) for key, value in self.values.items()]
+        self._max_heap = [(-value, key) for key, value in self.values.items()]
+        heapify(self._min_heap)
+        heapify(self._max_heap)
+        self._sum = fsum(self.values.values())
+        self._compensation = 0.
+
+
+    def sum(self):
+        return self._sum + self._compensation
+
+
+    def mean(self):
+        return self.sum() / len(self.values)
+
+
+    def min(self):
+        while self.values[self._min_heap[0][1]] != self._min_heap[0][0]:
+            heappop(self._min_heap)
+        return self._min_heap[0][0]
+
+
+    def max(self):
+        while self.values[self._max_heap[0][1]] != -self._max_heap[0][0]:
+            heappop(self._max_heap)
+        return -self._max_heap[0][0]
+
+
+class RankIndex:
+    """
+    ranking of a set of values indexed by key, highest value first.
+    entries are kept sorted by (-value, key): equal values are ordered by key,
+    as a stable sort of the values in key order.
+    rank queries are binary searches, an update moves a single entry of the sorted list.
+
+    ties (rank of equal values):
+        -"ordinal": equal values are ranked by key (default)
+        -"min": equal values share the best rank among them (e.g. 0,1,1,3)
+    """
+    TIES = ("ordinal", "min")
+
+    def __init__(self):
+        self.values = {}
+        self._sorted = []
+
+
+    def __len__(self):
+        return len(self.values)
+
+
+    def update(self, key, value):
+        if key in self.values:
+            del self._sorted[bisect_left(self._sorted, (-self.values[key], key))]
+        self.values[key] = value
+        insort(self._sorted, (-value, key))
+
+
+    def rank(self, key, ties="ordinal"):
+        """
+        0-based rank of key
+        """
+        if ties == "ordinal":
+            return bisect_left(self._sorted, (-self.values[key], key))
+        elif ties == "min":
+            return bisect_left(self._sorted, (-self.values[key],))
+        raise ValueError(f"Ties method {ties} not recognized, accepted values are {self.TIES}")
+
+
+    def top(self, fraction):
+        """
+        keys with (ordinal) rank lower than fraction*len, best first
+        """
+        return [key for _, key in self._sorted[:ceil(fraction * len(self._sorted))]]
@@ -0,0 +1,69 @@
+from helpers.utils import distance_between
+
+
+class NeighborGrid:
+    """
+    uniform grid (cell list) indexing the robots by position, used to find the
+    robots inside the communication range without testing every pair.
+
+    cells are squares with side equal to the communication radius: the neighbors
+    of a robot can only be in its own cell or in the 8 surrounding ones.
+    The grid is kept updated incrementally: a robot changes cell only when its
+    position crosses a cell border (see Agent.move).
+    """
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.robot_cells = {}
+
+
+    def get_cell(self, pos):
+        return int(pos[0] // self.cell_size), int(pos[1] // self.cell_size)
+
+
+    def add(self, robot):
+        cell = self.get_cell(robot.pos)
+        self.cells.setdefault(cell, []).append(robot)
+        self.robot_cells[robot.id] = cell
+
+
+    def remove(self, robot):
+        cell = self.robot_cells.pop(robot.id)
+        self.cells[cell].remove(robot)
+        if not self.cells[cell]:
+            del self.cells[cell]
+
+
+    def update(self, robot):
+        if self.get_cell(robot.pos) != self.robot_cells[robot.id]:
+            self.remove(robot)
+            self.add(robot)
+
+
+    def rebuild(self, population):
+        self.cells.clear()
+        self.robot_cells.clear()
+        for robot in population:
+            self.add(robot)
+
+
+    def get_neighbors_table(self, population):
+        """
+        returns, for each robot (indexed by id), the list of robots closer than
+        the communication radius.
+
+        NOTE: lists are identical to the ones of the pairwise search
+            for id1 < id2: distance(id1, id2) < population[id1].communication_radius
+            i.e. neighbors are sorted by id, and the radius of the lowest id is used
+        """
+        neighbors_ids = [[] for _ in range(len(population))]
+        for (cell_x, cell_y), robots in self.cells.items():
+            candidates = [other for dx in (-1, 0, 1) for dy in (-1, 0, 1)
+                            for other in self.cells.get((cell_x + dx, cell_y + dy), ())]
+            for robot in robots:
+                for other in candidates:
+                    if other.id > robot.id and \
+                            distance_between(robot, other) < robot.communication_radius:
+                        neighbors_ids[robot.id].append(other.id)
+                        neighbors_ids[other.id].append(robot.id)
+        return [[population[neighbor_id] for neighbor_id in sorted(ids)] for ids in neighbors_ids]
@@ -0,0 +1,103 @@
+import json
+import struct
+import zlib
+import numpy as np
+
+
+MAGIC = b"TLOG"
+VERSION = 1
+CHUNK_HEADER = struct.Struct("<II")
+
+
+def log_dtype(id_dtype="int32", extended=False):
+    """
+    :param id_dtype: "int16" or "int32"
+    :param extended: if True, also location (Location.value) and relative angle of the information
+    """
+    id_type = np.dtype(id_dtype).newbyteorder("<")
+    fields = [("dtick", "<u4"), ("buyer", id_type), ("seller", id_type)]
+    if extended:
+        fields += [("location", "u1"), ("angle", "<f4")]
+    return np.dtype(fields)
+
+
+class TransactionLogSink:
+    """
+    log of the completed transactions, written to a binary file in zlib compressed chunks:
+    transactions are buffered in a fixed size structured array, compressed and written
+    when the buffer is full, hence memory does not grow with the length of the run.
+
+    ticks are delta encoded (dtick: ticks since the previous transaction).
+
+    file format: MAGIC, version (u1), dtype description length (u4) and JSON,
+        then chunks of (rows, compressed bytes) (CHUNK_HEADER) followed by the compressed rows.
+    see read_transaction_log
+    """
+    def __init__(self, file, chunk_size=65536, id_dtype="int32", extended=False):
+        """
+        :param file: binary file object the log is written to (not closed by the sink)
+        """
+        self.extended = extended
+        self.dtype = log_dtype(id_dtype, extended)
+        self.buffer = np.zeros(chunk_size, dtype=self.dtype)
+        self.size = 0
+        self.last_tick = 0
+        self.length = 0
+        self.file = file
+        description = json.dumps(self.dtype.descr).encode()
+        self.file.write(MAGIC + struct.pack("<BI", VERSION, len(description)) + description)
+
+
+    def __len__(self):
+        return self.length
+
+
+    def append(self, transaction):
+        row = self.buffer[self.size]
+        row["dtick"] = transaction.timestep - self.last_tick
+        row["buyer"] = transaction.buyer_id
+        row["seller"] = transaction.seller_id
+        if self.extended:
+            row["location"] = transaction.location.value
+            row["angle"] = transaction.relative_angle
+        self.last_tick = transaction.timestep
+        self.size += 1
+        self.length += 1
+        if self.size == len(self.buffer):
+            self.flush()
+
+
+    def flush(self):
+        if self.size == 0:
+            return
+        compressed = zlib.compress(self.buffer[:self.size].tobytes())
+        self.file.write(CHUNK_HEADER.pack(self.size, len(compressed)))
+        self.file.write(compressed)
+        self.file.flush()
+        self.size = 0
+
+
+def read_transaction_log(path):
+    """
+    :return: structured array of the transactions in the file, with absolute "tick"
+        in place of "dtick" (fields: tick, buyer, seller[, location, angle])
+    """
+    with open(path, "rb") as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a transaction log")
+        _, description_length = struct.unpack("<BI", file.read(5))
+        dtype = np.dtype([tuple(field) for field in json.loads(file.read(description_length))])
+        chunks = []
+        header = file.read(CHUNK_HEADER.size)
+        while len(header) == CHUNK_HEADER.size:
+            rows, compressed_length = CHUNK_HEADER.unpack(header)
+            chunks.append(np.frombuffer(zlib.decompress(file.read(compressed_length)), dtype=dtype, count=rows))
+            header = file.read(CHUNK_HEADER.size)
+    log = np.concatenate(chunks) if chunks else np.zeros(0, dtype=dtype)
+    names = ["tick" if name == "dtick" else name for name in dtype.names]
+    result = np.zeros(len(log), dtype=[(name, "<i8" if name == "tick" else dtype.fields[field][0])
+                                       for name, field in zip(names, dtype.names)])
+    result["tick"] = np.cumsum(log["dtick"], dtype="<i8")
+    for field in dtype.names[1:]:
+        result[field] = log[field]
+    return result
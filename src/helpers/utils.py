@@ -19,6 +19,17 @@ def rotation_matrix(angle):
                      (np.sin(theta), np.cos(theta))))
 
 
+def rotation_matrices(angles):
+    """
+    stack of rotation matrices, one for each angle (in degrees).
+    NOTE: np.matmul with this stack gives the same results of rotate() for each vector
+    """
+    thetas = np.radians(angles)
+    cos, sin = np.cos(thetas), np.sin(thetas)
+    return np.stack((np.stack((cos, -sin), axis=-1),
+                     np.stack((sin, cos), axis=-1)), axis=-2)
+
+
 def rotate(vector, angle):
     rot_mat = rotation_matrix(angle)
     rotated_vector = rot_mat.dot(vector)
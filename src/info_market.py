@@ -1,22 +1,39 @@
 import time
 import re
 import datetime
-import pandas as pd
 from multiprocessing import Pool
 from pathlib import Path
 from os.path import join, exists, isfile, isdir
 from os import listdir, system
 from sys import argv
 import logging
+import traceback
+import os
+import math
 # import argparse
 # from json.decoder import JSONDecodeError
 
 import config as CONFIG_FILE
 from controllers.main_controller import MainController, Configuration
+from controllers.run_result import RunResult
+from controllers.result_cache import ResultCache
+from controllers.campaign_manifest import CampaignManifest
+from controllers.result_writer import ResultWriter, PARTIAL_SUFFIX
+from controllers.catalog import ExperimentCatalog
+from controllers.sweep import ParameterSweep
+from controllers.adaptive_runs import AdaptiveRuns
+from controllers.newcomer_variants import newcomer_variants
+from controllers.ensemble_controller import EnsembleController
 from model.behavior import BAD_PARAM_COMBINATIONS_DICT, BEHAVIORS_NAME_DICT, BEHAVIOR_PARAMS_DICT, \
     PARAMS_NAME_DICT, NOISE_PARAMS_DICT, BEST_PARAM_COMBINATIONS_DICT,COMBINE_STRATEGY_NAME_DICT, \
     SUB_FOLDERS_DICT
 
+CAMPAIGN_FLAG="--campaign"
+RESUME_FLAG="--resume"
+MANIFEST_FLAG="--manifest="
+SWEEP_FLAG="--sweep="
+EXPORT_SWEEP_FLAG="--export-sweep"
+DEFAULT_MANIFEST_FILE=join(CONFIG_FILE.PROJECT_DIR,"src","campaign_manifest.jsonl")
 
 ############################################################################################################
 ############################################################################################################
@@ -93,8 +110,8 @@ def params_from_filename(filename:str, compact_format:bool=False):
             else: n_honest, honest_behavior, combine_strategy, payment, lie_angle, behaviour_params, noise_params, message
     """
     if "/" in filename: filename=filename.split("/")[-1]
-    if filename.endswith(".json"): filename=filename.split(".json")[0]
-    elif filename.endswith(".csv"): filename=filename.split(".csv")[0]
+    #NOTE only the extensions of configs and outputs: parameters values can keep their dots
+    if os.path.splitext(filename)[1] in (".json", ".csv", ".npy"): filename=os.path.splitext(filename)[0]
     params=filename.split("_")
 
     #TODO look for specific keywords instead of using position
@@ -212,9 +229,10 @@ class InformationMarket():
     def check_filename_existence(output_directory,metric,filename:str):
         new_filename = filename.split('/')[-1]
         if exists(join(output_directory, metric, filename)):
+            stem, extension = os.path.splitext(new_filename)
             exist_count = len([f for f in Path(join(output_directory, metric)).iterdir() \
-                if f.name.startswith(new_filename.split(".csv")[0])])
-            new_filename = new_filename.replace(".csv", f"_{exist_count}.csv")
+                if f.name.startswith(stem) and not f.name.endswith(PARTIAL_SUFFIX)])
+            new_filename = f"{stem}_{exist_count}{extension}"
         return new_filename
 
 
@@ -234,6 +252,8 @@ class InformationMarket():
         try:
             filenames=[]
             for p in argv[1:]:
+                if p.startswith("--"):
+                    continue
                 if isfile(p):
                     config = Configuration(config_file=p)
                     if config.value_of("visualization")['activate']:
@@ -250,12 +270,32 @@ class InformationMarket():
                 else:
                     print(f"WARNING: {p} is not a valid config file or directory. Skipping it...\n")
 
+            sweeps=[ParameterSweep.from_file(p[len(SWEEP_FLAG):],CONFIG_FILE.CONFIG_DIR,CONFIG_FILE.DATA_DIR)
+                    for p in argv[1:] if p.startswith(SWEEP_FLAG)]
+            if EXPORT_SWEEP_FLAG in argv[1:]:
+                for sweep in sweeps:
+                    print(f"CREATED {len(sweep.export())} CONFIGURATIONS")
+                return
+
+            manifest=self.campaign_manifest()
+            unfinished=None
+            if RESUME_FLAG in argv[1:]:
+                unfinished=manifest.unfinished_configs()
+                filenames=[f for f in filenames if f in unfinished] if filenames or sweeps else unfinished
+                print(f"Resuming campaign from {manifest.path}")
+
             if CONFIG_FILE.PRUNE_FILENAMES:
                 filenames=prune_params_combinations(filenames,best_mode=CONFIG_FILE.PRUNE_NOT_BEST)
 
-            print(f"Running {len(filenames)} config"
-                    f"{'s' if len(filenames)>1 else ''}: ",end="\n")
-            print(*filenames, sep="\n");print("\n\n")
+            sweeps_configs=[sum(1 for f in sweep.config_files() if unfinished is None or f in unfinished)
+                            for sweep in sweeps]
+            n_configs=len(filenames)+sum(sweeps_configs)
+            print(f"Running {n_configs} config"
+                    f"{'s' if n_configs>1 else ''}: ",end="\n")
+            print(*filenames, sep="\n")
+            for sweep_configs in sweeps_configs:
+                print(f"{sweep_configs} configs of parameters sweep")
+            print("\n\n")
             if not CONFIG_FILE.RECORD_DATA:
                 print("##\t"*10+"\nWARNING: data recording is disabled."
                     " Set src/config(.py).RECORD_DATA to True to enable it.\n"+"##\t"*10+"\n")
@@ -264,159 +304,483 @@ class InformationMarket():
             print("ERROR: no config file specified. Exiting...")
             exit(1)
             
-        for i,f in enumerate(filenames):
-            c = Configuration(config_file=f)
-            print(f"Running config {i+1}/{len(filenames)}: {f}")
+        configs=self.config_sources(filenames,sweeps,unfinished)
+        if manifest is not None:
+            self.run_campaign(configs,manifest)
+            return
+        for i,(f,c) in enumerate(configs):
+            if c is None: c = Configuration(config_file=f)
+            print(f"Running config {i+1}/{n_configs}: {f}")
             if CONFIG_FILE.CONFIG_RUN_LOG: self.log_config(c,f)
             try:
-                self.run_processes(c)
-                if exists(join(CONFIG_FILE.CONFIG_ERRORS_DIR,f.split('/')[-1])):
-                    system(f"rm {join(CONFIG_FILE.CONFIG_ERRORS_DIR,f.split('/')[-1])}")
-                    print(f"#-#-#- [[successfully removed {join(CONFIG_FILE.CONFIG_ERRORS_DIR,f.split('/')[-1])}]]\n")
-                else: print()
+                self.run_processes(c,f)
+                self.clear_config_error(f)
 
             except Exception as e:
             #BUG cannot catch JSONDecodeError
                 self.logger.exception(F"{datetime.datetime.now()}, file {f} : \n")
-                with open(CONFIG_FILE.ERRORS_LOG_FILE, "a+") as fe:
-                    fe.write("\n"+"#"*100+"\n\n")
-
-                Path(CONFIG_FILE.CONFIG_ERRORS_DIR).mkdir(parents=True, exist_ok=True)
-                system(f"cp {f} {join(CONFIG_FILE.CONFIG_ERRORS_DIR,f.split('/')[-1])}")
-
+                self.log_config_error(f,c)
                 print(f"LOGGED ERROR: {e}\n")
                 continue
 
-            
-    def run_processes(self,config: Configuration):
+
+    @staticmethod
+    def config_sources(filenames:list,sweeps:list,unfinished=None):
+        """
+        :return: (config file, Configuration) of the configs to run: config files are read when
+            the config is run (Configuration is None), sweeps configs are generated while iterating
+        :param unfinished: if given, only the sweeps configs among them are run (see --resume)
+        """
+        for f in filenames:
+            yield f, None
+        for sweep in sweeps:
+            for f, c in sweep.configurations():
+                if unfinished is None or f in unfinished:
+                    yield f, c
+
+
+    def log_config_error(self,f,c:Configuration=None):
+        """
+        marks the end of the logged exception and copies the config file in the errors folder
+        (configs without file, e.g. of a sweep, are saved there)
+        """
+        with open(CONFIG_FILE.ERRORS_LOG_FILE, "a+") as fe:
+            fe.write("\n"+"#"*100+"\n\n")
+
+        Path(CONFIG_FILE.CONFIG_ERRORS_DIR).mkdir(parents=True, exist_ok=True)
+        if not isfile(f) and c is not None:
+            c.save(join(CONFIG_FILE.CONFIG_ERRORS_DIR,f.split('/')[-1]))
+            return
+        system(f"cp {f} {join(CONFIG_FILE.CONFIG_ERRORS_DIR,f.split('/')[-1])}")
+
+
+    @staticmethod
+    def clear_config_error(f):
+        """
+        removes the config file from the errors folder, if it previously failed
+        """
+        if exists(join(CONFIG_FILE.CONFIG_ERRORS_DIR,f.split('/')[-1])):
+            system(f"rm {join(CONFIG_FILE.CONFIG_ERRORS_DIR,f.split('/')[-1])}")
+            print(f"#-#-#- [[successfully removed {join(CONFIG_FILE.CONFIG_ERRORS_DIR,f.split('/')[-1])}]]\n")
+        else: print()
+
+
+    def run_processes(self,config: Configuration, config_file=None):
+        if "newcomer_variants" in config and config.value_of("newcomer_variants"):
+            self.run_newcomer_variants(config, config_file)
+            return
+        adaptive_runs = AdaptiveRuns.from_config(config)
+        if adaptive_runs is not None:
+            self.run_adaptive_processes(config, adaptive_runs, config_file)
+            return
         nb_runs = config.value_of("number_runs")
         simulation_seed = config.value_of("simulation_seed")
         print(f"### {datetime.datetime.now()} # running {nb_runs} runs with {'programmed'if simulation_seed!='' and simulation_seed!='random' else 'random'} simulation seed ")
         start = time.time()
-        with Pool() as pool:
-            controllers = pool.starmap(self.run, [(config, i) for i in range(nb_runs)])
-            
-            if CONFIG_FILE.RECORD_DATA: 
-                items_filename=self.record_data(config, controllers)
-                if CONFIG_FILE.CONFIG_RUN_LOG:
-                    #TODO use as output name in log the one with similar filenames counter 
-                    # if items_filename is None:
-                    self.log_config(config,self.generate_filename(config),output_log=True)
-                    # else:
-                    #     self.log_config(None,items_filename,output_log=True)
-        print(f'###### {datetime.datetime.now()}\tFinished {nb_runs} runs in {time.time()-start: .02f} seconds')
+        writer = self.result_writer(config) if CONFIG_FILE.RECORD_DATA else None
+        missing = []
+        for i, result in enumerate(self.load_cached_results(config)):
+            if result is None:
+                missing.append(i)
+            elif writer is not None:
+                writer.write(i, result)
+        try:
+            if missing:
+                with Pool() as pool:
+                    #NOTE results are written as soon as they arrive, tagged with their simulation_id
+                    for i, result in self.run_missing(pool, config, missing):
+                        if writer is not None:
+                            writer.write(i, result)
+        except Exception:
+            # outputs of the failed config are removed, as in finish_campaign_config
+            if writer is not None: writer.discard()
+            raise
+        self.close_writer(config, writer, config_file)
+        print(f'###### {datetime.datetime.now()}\tFinished {len(missing)} runs in {time.time()-start: .02f} seconds')
+
+
+    def run_adaptive_processes(self,config: Configuration, adaptive_runs: AdaptiveRuns, config_file=None):
+        """
+        runs config in waves, until the confidence interval of the target metric is narrow enough
+        (see AdaptiveRuns). number_runs of config is set to the number of runs performed
+        NOTE: npy evolution outputs have max_runs rows, the ones of the runs not performed are NaN
+        """
+        print(f"### {datetime.datetime.now()} # running {adaptive_runs.min_runs} to {adaptive_runs.max_runs} runs, "
+              f"until the {adaptive_runs.confidence:.0%} interval of {adaptive_runs.metric} is within "
+              f"{adaptive_runs.relative_width:.1%} of the mean")
+        start = time.time()
+        config.set("number_runs", adaptive_runs.max_runs)
+        writer = self.result_writer(config) if CONFIG_FILE.RECORD_DATA else None
+        cache = ResultCache.from_config(config)
+        n_launched = 0
+        try:
+            with Pool() as pool:
+                while not adaptive_runs.finished():
+                    missing = []
+                    for i in adaptive_runs.next_wave():
+                        result = cache.load(cache.key(config, i)) if cache is not None else None
+                        if result is None:
+                            missing.append(i)
+                            continue
+                        adaptive_runs.add(i, result)
+                        if writer is not None:
+                            writer.write(i, result)
+                    for i, result in self.run_missing(pool, config, missing):
+                        adaptive_runs.add(i, result)
+                        if writer is not None:
+                            writer.write(i, result)
+                    n_launched += len(missing)
+                    mean, half_width = adaptive_runs.interval()
+                    print(f"{len(adaptive_runs)} runs: {adaptive_runs.metric} {mean:.4g} +- {half_width:.4g}")
+        except Exception:
+            if writer is not None: writer.discard()
+            raise
+        config.set("number_runs", len(adaptive_runs))
+        self.close_writer(config, writer, config_file)
+        print(f'###### {datetime.datetime.now()}\tFinished {n_launched} runs in {time.time()-start: .02f} seconds')
+
+
+    def run_newcomer_variants(self,config: Configuration, config_file=None):
+        """
+        runs the newcomer variants of config (see controllers.newcomer_variants): the prefix of each run
+        (simulation_steps ticks, shared by all the variants) is simulated once, then every variant
+        continues from a snapshot of its state. Prefixes and variants are tasks of the same pool,
+        variants are queued as soon as the prefix of their run is done.
+        Outputs (and cache entries) of each variant are the ones of a config with its newcomers phase.
+        """
+        variants = newcomer_variants(config)
+        nb_runs = config.value_of("number_runs")
+        print(f"### {datetime.datetime.now()} # running {nb_runs} runs of {len(variants)} newcomer variants: "
+              f"{', '.join(name for name, _ in variants)}")
+        start = time.time()
+        writers = [self.result_writer(c) if CONFIG_FILE.RECORD_DATA else None for _, c in variants]
+        missing = {}
+        for k, (_, variant_config) in enumerate(variants):
+            for i, result in enumerate(self.load_cached_results(variant_config)):
+                if result is None:
+                    missing.setdefault(i, []).append(k)
+                elif writers[k] is not None:
+                    writers[k].write(i, result)
+        n_variants = 0
+        try:
+            with Pool() as pool:
+                prefixes = pool.imap_unordered(self.run_prefix, [(config, i) for i in sorted(missing)])
+                variant_runs = []
+                for i, snapshot in prefixes:
+                    variant_runs.extend(pool.apply_async(self.run_variant, ((k, *variants[k], i, snapshot),))
+                                        for k in missing[i])
+                for variant_run in variant_runs:
+                    k, i, result = variant_run.get()
+                    n_variants += 1
+                    if writers[k] is not None:
+                        writers[k].write(i, result)
+        except Exception:
+            for writer in writers:
+                if writer is not None: writer.discard()
+            raise
+        for (name, variant_config), writer in zip(variants, writers):
+            self.close_writer(variant_config, writer, config_file)
+        print(f'###### {datetime.datetime.now()}\tFinished {len(missing)} prefixes and {n_variants} '
+              f'variant runs in {time.time()-start: .02f} seconds')
+
+
+    @staticmethod
+    def run_prefix(task):
+        """
+        :return: run index and snapshot of the run at the end of the prefix (simulation_steps ticks)
+        """
+        config, i = task
+        InformationMarket.set_run_seed(config, i, "prefix of run")
+        controller = MainController(config)
+        controller.run_until(config.value_of("simulation_steps"))
+        return i, controller.snapshot()
+
+
+    @staticmethod
+    def run_variant(task):
+        """
+        newcomers phase of variant k, from the snapshot of the prefix of run i
+        """
+        k, name, config, i, snapshot = task
+        cache = ResultCache.from_config(config)
+        cache_key = cache.key(config, i) if cache is not None else None
+        InformationMarket.set_run_seed(config, i, f"{name} run")
+        controller = MainController(config)
+        controller.restore(snapshot)
+        controller.start_simulation()
+        result = RunResult(controller)
+        if cache is not None:
+            cache.store(cache_key, result)
+        return k, i, result
+
+
+    @staticmethod
+    def load_cached_results(config: Configuration):
+        """
+        :return: results of the runs of config found in the result cache (None for the missing ones)
+        """
+        cache = ResultCache.from_config(config)
+        if cache is None:
+            return [None]*config.value_of("number_runs")
+        results = cache.load_runs(config)
+        cached_runs = sum(result is not None for result in results)
+        if cached_runs:
+            print(f"found {cached_runs}/{len(results)} runs in the result cache")
+        return results
+
+
+    def close_writer(self,config: Configuration, writer, config_file=None):
+        """
+        closes the outputs of config and indexes them in the catalog (if data_collection["catalog"])
+        """
+        if writer is not None: 
+            items_filename=writer.close()
+            catalog=ExperimentCatalog.from_config(config)
+            if catalog is not None:
+                catalog.add(config, writer.paths, writer.summary(), config_file)
+            if CONFIG_FILE.CONFIG_RUN_LOG:
+                #TODO use as output name in log the one with similar filenames counter 
+                # if items_filename is None:
+                self.log_config(config,self.generate_filename(config),output_log=True)
+                # else:
+                #     self.log_config(None,items_filename,output_log=True)
+
+
+    @staticmethod
+    def campaign_manifest():
+        """
+        :return: manifest of the campaign if --campaign or --resume are given, else None.
+            the manifest file is given by --manifest=PATH, DEFAULT_MANIFEST_FILE otherwise
+        """
+        if CAMPAIGN_FLAG not in argv[1:] and RESUME_FLAG not in argv[1:]:
+            return None
+        manifest_files=[p[len(MANIFEST_FLAG):] for p in argv[1:] if p.startswith(MANIFEST_FLAG)]
+        return CampaignManifest(manifest_files[-1] if manifest_files else DEFAULT_MANIFEST_FILE)
+
+
+    def run_campaign(self,config_sources,manifest:CampaignManifest):
+        """
+        runs all the configs with a single pool of workers:
+        every (config, run index) pair is a task, tasks are consumed as soon as a worker is free,
+        hence configs with number_runs lower than the number of cores do not leave them idle.
+        The outputs of every run are written as soon as it finishes (see ResultWriter),
+        the outputs of a config are complete when its last run finishes.
+
+        the state of every run (and config) is logged in the manifest, --resume restarts the
+        configs not recorded yet. Completed runs are kept in the result cache
+        (next to the manifest if data_collection["cache_directory"] is not set), hence they
+        are not run again, but for the ones with random seed.
+
+        :param config_sources: (config file, Configuration or None to read the file), see config_sources
+
+        NOTE: enabled by the --campaign (or --resume) command line flag.
+            configs with newcomer_variants or adaptive_runs are not run: they are logged as errors and failed in the manifest
+        """
+        configs=[]
+        tasks=[]
+        for f, c in config_sources:
+            try:
+                if c is None: c = Configuration(config_file=f)
+                if "newcomer_variants" in c and c.value_of("newcomer_variants"):
+                    raise ValueError("newcomer variants are not available in campaigns, run the config without --campaign")
+                if AdaptiveRuns.from_config(c) is not None:
+                    raise ValueError("adaptive runs are not available in campaigns, run the config without --campaign")
+            except Exception as e:
+                self.logger.exception(F"{datetime.datetime.now()}, file {f} : \n")
+                self.log_config_error(f,c)
+                manifest.config_state(f, "failed")
+                print(f"LOGGED ERROR: {e}\n")
+                continue
+            if not c.value_of("data_collection").get("cache_directory"):
+                c.value_of("data_collection")["cache_directory"]=join(
+                    os.path.dirname(os.path.abspath(manifest.path)),"campaign_cache")
+            if CONFIG_FILE.CONFIG_RUN_LOG: self.log_config(c,f)
+            configs.append((f, c))
+        writers=[self.result_writer(c) if CONFIG_FILE.RECORD_DATA else None for _, c in configs]
+        pending=[0]*len(configs)
+        for k, (f, c) in enumerate(configs):
+            manifest.config_state(f, "queued")
+            for i, result in enumerate(self.load_cached_results(c)):
+                if result is None:
+                    tasks.append((k, f, c, i, manifest))
+                    manifest.run_state(f, i, "queued")
+                    pending[k] += 1
+                else:
+                    manifest.run_state(f, i, "done", cached=True)
+                    if writers[k] is not None:
+                        writers[k].write(i, result)
+        errors=[None]*len(configs)
+        for k in [k for k, count in enumerate(pending) if count==0]:
+            self.finish_campaign_config(configs, k, writers[k], None, manifest)
+            writers[k] = None
+        print(f"### {datetime.datetime.now()} # running {len(tasks)} runs of {len(configs)} configs")
+        start = time.time()
+        #NOTE one run per worker process: the peak RSS of the worker is the one of its run
+        with Pool(maxtasksperchild=1) as pool:
+            for k, i, result, error in pool.imap_unordered(self.run_task, tasks):
+                if error is not None and errors[k] is None:
+                    errors[k] = error
+                if result is not None and writers[k] is not None:
+                    writers[k].write(i, result)
+                pending[k] -= 1
+                if pending[k] > 0:
+                    continue
+                self.finish_campaign_config(configs, k, writers[k], errors[k], manifest)
+                writers[k] = None
+        print(f'###### {datetime.datetime.now()}\tFinished {len(tasks)} runs in {time.time()-start: .02f} seconds')
+
+
+    def finish_campaign_config(self,configs:list,k,writer,error,manifest:CampaignManifest):
+        """
+        closes the outputs of config k, or logs the error of its failed run
+        """
+        f, c = configs[k]
+        try:
+            if error is not None:
+                if writer is not None: writer.discard()
+                raise RuntimeError(error)
+            self.close_writer(c, writer, f)
+            manifest.config_state(f, "recorded")
+            print(f"Finished config {k+1}/{len(configs)}: {f}")
+            self.clear_config_error(f)
+        except Exception as e:
+            self.logger.exception(F"{datetime.datetime.now()}, file {f} : \n")
+            self.log_config_error(f,c)
+            manifest.config_state(f, "failed")
+            print(f"LOGGED ERROR: {e}\n")
+
+
+    @staticmethod
+    def run_task(task):
+        """
+        run of a campaign task (config index, config file, config, run index, manifest):
+        errors are returned (as traceback text), so that the other runs of the campaign keep going
+        """
+        k, f, config, i, manifest = task
+        manifest.run_state(f, i, "running", pid=os.getpid())
+        start = time.time()
+        try:
+            result = InformationMarket.run(config, i)
+        except Exception:
+            error = traceback.format_exc()
+            manifest.run_state(f, i, "failed", duration=time.time()-start,
+                               peak_rss=manifest.peak_rss(), error=error)
+            return k, i, None, error
+        manifest.run_state(f, i, "done", duration=time.time()-start, peak_rss=manifest.peak_rss())
+        return k, i, result, None
+
+
+    def run_missing(self,pool,config: Configuration, missing):
+        """
+        runs missing of config in pool, one run per task or, with the ensemble engine,
+        ensembles of runs per task (see EnsembleController)
+        :return: iterator of (run index, RunResult), in order of completion
+        """
+        if not EnsembleController.enabled(config):
+            return pool.imap_unordered(self.run_indexed, [(config, i) for i in missing])
+        return (run for runs in pool.imap_unordered(self.run_ensemble, self.ensemble_tasks(config, missing))
+                for run in runs)
+
+
+    @staticmethod
+    def ensemble_tasks(config: Configuration, runs):
+        """
+        runs split in ensembles of engine["replicas"] runs (default: evenly among the cores)
+        """
+        replicas = config.value_of("engine").get("replicas") or math.ceil(len(runs) / (os.cpu_count() or 1))
+        return [(config, runs[j:j+replicas]) for j in range(0, len(runs), replicas)]
+
+
+    @staticmethod
+    def run_ensemble(task):
+        """
+        runs of an ensemble task, simulated in lockstep in this process (see EnsembleController)
+        :return: (run index, RunResult) of each run, the same results of run
+        """
+        config, runs = task
+        cache = ResultCache.from_config(config)
+        configs = []
+        for i in runs:
+            replica_config = Configuration.from_dict(config._parameters)
+            InformationMarket.set_run_seed(replica_config, i, "replica of run")
+            configs.append(replica_config)
+        ensemble = EnsembleController(configs)
+        ensemble.start_simulation()
+        results = []
+        for i, controller in zip(runs, ensemble.controllers):
+            result = RunResult(controller)
+            if cache is not None:
+                cache.store(cache.key(config, i), result)
+            results.append((i, result))
+        return results
+
+
+    @staticmethod
+    def run_indexed(task):
+        config, i = task
+        return i, InformationMarket.run(config, i)
 
 
     @staticmethod
     def run(config:Configuration, i):
-        print(f"launched process {i+1}",end="")
+        cache = ResultCache.from_config(config)
+        cache_key = cache.key(config, i) if cache is not None else None
+        InformationMarket.set_run_seed(config, i)
+        checkpoint_path = InformationMarket.checkpoint_path(config)
+        controller = MainController(config)
+        if checkpoint_path is not None and os.path.isfile(checkpoint_path):
+            controller.restore_snapshot(checkpoint_path)
+            print(f"process {i+1} resumed from tick {controller.tick}")
+        controller.start_simulation(checkpoint_path,
+                                    config.value_of("data_collection").get("checkpoint_interval"))
+        result = RunResult(controller)
+        if cache is not None:
+            cache.store(cache_key, result)
+        if checkpoint_path is not None and os.path.isfile(checkpoint_path):
+            os.remove(checkpoint_path)
+        return result
+
+
+    @staticmethod
+    def set_run_seed(config:Configuration, i, process="process"):
+        print(f"launched {process} {i+1}",end="")
         simulation_seed = config.value_of("simulation_seed")
         if simulation_seed!='' and simulation_seed!='random':
             config.set("simulation_seed", simulation_seed+i)
             print(f", setting run seed to {simulation_seed+i}")
         else: print("")
-        controller = MainController(config)
-        controller.start_simulation()
-        return controller
+
+
+    @staticmethod
+    def checkpoint_path(config:Configuration):
+        """
+        snapshot of the run, saved every data_collection["checkpoint_interval"] ticks in
+        data_collection["checkpoint_directory"] and named as the cache key of the run.
+        None if checkpoints are disabled or the run is not reproducible (random seed)
+        NOTE: the seed of config is already the one of the run
+        """
+        directory = config.value_of("data_collection").get("checkpoint_directory")
+        if not directory or not config.value_of("data_collection").get("checkpoint_interval"):
+            return None
+        key = ResultCache.key(config, 0)
+        if key is None:
+            return None
+        Path(directory).mkdir(parents=True, exist_ok=True)
+        return join(directory, f"{key}.npz")
 
 
     def record_data(self,config:Configuration, controllers):
-        output_directory = config.value_of("data_collection")["output_directory"]
-        filename=self.generate_filename(config)
-        CAN_RETURN=False
-        for metric in config.value_of("data_collection")["metrics"]:
-        #TODO reintroduce append option, increment SEED by data already present
-            if metric=="rewards":
-                #TODO substitute "metric" w metric
-                rewards_df = pd.DataFrame([controller.get_rewards() for controller in controllers])
-                Path(join(output_directory, "rewards")).mkdir(parents=True, exist_ok=True)
-                current_filename=self.check_filename_existence(output_directory,metric,filename)
-                items_filename=current_filename
-                CAN_RETURN=True
-                rewards_df.to_csv(join(output_directory, "rewards", current_filename), index=False, header=False)
-            elif metric=="items_collected":
-                items_collected_df = pd.DataFrame([controller.get_items_collected() for controller in controllers])
-                Path(join(output_directory, "items_collected")).mkdir(parents=True, exist_ok=True)
-                current_filename=self.check_filename_existence(output_directory,metric,filename)
-                items_collected_df.to_csv(join(output_directory, "items_collected", current_filename), index=False, header=False)
-            elif metric=="drifts":
-                drifts_df = pd.DataFrame([controller.get_drifts() for controller in controllers])
-                Path(join(output_directory, "drifts")).mkdir(parents=True, exist_ok=True)
-                current_filename=self.check_filename_existence(output_directory,metric,filename)
-                drifts_df.to_csv(join(output_directory, "drifts", current_filename), index=False, header=False)
-            elif metric=="rewards_evolution":
-                dataframes = []
-                for i, controller in enumerate(controllers):
-                    df = pd.DataFrame(controller.get_rewards_evolution_list(), columns=["tick", "rewards_list"])
-                    df["simulation_id"] = i
-                    df = df.set_index("simulation_id")
-                    dataframes.append(df)
-                Path(join(output_directory, "rewards_evolution")).mkdir(parents=True, exist_ok=True)
-                current_filename=self.check_filename_existence(output_directory,metric,filename)
-                pd.concat(dataframes).to_csv(join(output_directory, "rewards_evolution", current_filename))
-            elif metric=="items_evolution":
-                dataframes = []
-                for i, controller in enumerate(controllers):
-                    df = pd.DataFrame(controller.get_items_evolution_list(), columns=["tick", "items_list"])
-                    df["simulation_id"] = i
-                    df = df.set_index("simulation_id")
-                    dataframes.append(df)
-                Path(join(output_directory, "items_evolution")).mkdir(parents=True, exist_ok=True)
-                current_filename=self.check_filename_existence(output_directory,metric,filename)
-                pd.concat(dataframes).to_csv(join(output_directory, "items_evolution", current_filename))
-            elif "transactions" in metric:
-                Path(join(output_directory, "transactions")).mkdir(parents=True, exist_ok=True)
-                transaction_types=["attempted","validated","completed","combined"]
-                roles_transaction=["buyer","seller"]
-                for transaction_type in transaction_types:
-                    for transaction_role in roles_transaction:
-                        transactions_df = pd.DataFrame([controller.get_transactions_list(transaction_type,transaction_role) \
-                                                            for controller in controllers])
-                        Path(join(output_directory, "transactions")).mkdir(parents=True, exist_ok=True)
-                
-                        complete_filename=join(filename.split(".csv")[0]+f"_{transaction_type}_{transaction_role}.csv")
-                        current_filename=self.check_filename_existence(output_directory,metric,complete_filename)
-                        transactions_df.to_csv(join(output_directory, "transactions", current_filename), index=False, header=False)
-            else:
-                print(f"[WARNING] Could not record metric: '{metric}'. Metric name is not valid.")
-        
-        if config.value_of("data_collection")["transactions_log"]:
-        #NOTE --- ATTENTION: this files can easily reach 200MB each
-            transaction_logs=[]
-            for i, controller in enumerate(controllers):
-                df = pd.DataFrame(controller.get_transaction_log(), columns=["tick", "buyer", "seller"])
-                df["simulation_id"] = i
-                df = df.set_index("simulation_id")
-                transaction_logs.append(df)
-            Path(join(output_directory, "transactions")).mkdir(parents=True, exist_ok=True)
-            current_filename=self.check_filename_existence(output_directory,metric,filename)
-            pd.concat(transaction_logs).to_csv(join(output_directory, "transactions", current_filename))
-            
-        if hasattr(controllers[0].environment.payment_database.database[0]["payment_system"], "pot_amount"):
-            dataframes = []
-            for i, controller in enumerate(controllers):
-                df = pd.DataFrame(controller.get_stake_pot_evolution_list(), columns=["tick", "pot_list"])
-                df["simulation_id"] = i
-                df = df.set_index("simulation_id")
-                dataframes.append(df)
-            Path(join(output_directory, "pots_evolution")).mkdir(parents=True, exist_ok=True)
-            current_filename=self.check_filename_existence(output_directory,metric,filename)
-            pd.concat(dataframes).to_csv(join(output_directory, "pots_evolution", current_filename))
-            dataframes = []
-            for i, controller in enumerate(controllers):
-                df = pd.DataFrame(controller.get_wealth_evolution_list(), columns=["tick", "wealth_list"])
-                df["simulation_id"] = i
-                df = df.set_index("simulation_id")
-                dataframes.append(df)
-            Path(join(output_directory, "wealth_evolution")).mkdir(parents=True, exist_ok=True)
-            current_filename=self.check_filename_existence(output_directory,metric,filename)
-            pd.concat(dataframes).to_csv(join(output_directory, "wealth_evolution", current_filename))
-
-        # if CONFIG_FILE.LOG_EXCEPTIONS:
-        #     Path(join(output_directory, "exceptions")).mkdir(parents=True, exist_ok=True)
-        #     current_filename=self.check_filename_existence(output_directory,metric,filename)
-
-        return items_filename if CAN_RETURN else None
+        """
+        writes the outputs of all the runs at once
+        """
+        writer=self.result_writer(config)
+        for i, controller in enumerate(controllers):
+            writer.write(i, controller)
+        return writer.close()
+
+
+    def result_writer(self,config:Configuration):
+        return ResultWriter(config, self.generate_filename(config), self.check_filename_existence)
 
 
     @staticmethod
@@ -1,7 +1,6 @@
-import copy
 import numpy as np
 
-from random import random, choices, gauss
+from random import random, gauss
 from math import sin, cos, radians
 from collections import deque
 
@@ -28,7 +27,8 @@ class AgentAPI:
 class Agent:
     '''
     NOTE: random numbers are discarded in case of non bimodal noise drawing to preserve the same sequence
-    of the bimodal case, for spawn and following requests
+    of the bimodal case, for spawn and following requests (legacy rng only: with rng streams
+    each robot draws from its own stream, see helpers.rng)
     '''
     colors = {State.EXPLORING: "gray35", State.SEEKING_FOOD: "orange", State.SEEKING_NEST: "green"}
 
@@ -62,19 +62,26 @@ class Agent:
         self.comm_state = CommunicationState.OPEN
 
         self.environment = environment
+        self.random_stream = environment.random_streams.robot_stream() \
+            if environment.random_streams is not None else None
+        self.random, self.gauss = (self.random_stream.random, self.random_stream.gauss) \
+            if self.random_stream is not None else (random, gauss)
+        # uniform draws of the random walk (None: global sampler, see helpers.random_walk)
+        self.walk_uniform = self.random_stream.random if self.random_stream is not None else None
         #TODO move this in env, CHECK if correct rand sequence for same spawn
-        self.orientation = random() * 360
+        self.orientation = self.random() * 360
 
         if noise["class"] == "BimodalNoise":
             self.bimodal_noise = True
             noise_sampling_mu = noise["parameters"]["noise_sampling_mu"]
             noise_sampling_sigma = noise["parameters"]["noise_sampling_sigma"]
-            self.noise_mu = gauss(noise_sampling_mu, noise_sampling_sigma)
-            if random() >= 0.5:
+            self.noise_mu = self.gauss(noise_sampling_mu, noise_sampling_sigma)
+            if self.random() >= 0.5:
                 self.noise_mu = -self.noise_mu
             self.noise_sd = noise["parameters"]["noise_sd"]
         else:
-            gauss(0,0);random()#discard r.n. from the sequence
+            if self.random_stream is None:
+                gauss(0,0);random()#discard r.n. from the sequence
             self.bimodal_noise=False
             self.noise_mu = noise["parameters"]["noise_mu"]
 
@@ -86,6 +93,8 @@ class Agent:
         self.dr = np.array([0, 0])
         self.sensors = {}
         self.behavior:TemplateBehaviour = behavior_factory(behavior_params)
+        if self.random_stream is not None:
+            self.behavior.random = self.random_stream.random
         self.api = AgentAPI(self)
 
 
@@ -124,19 +133,22 @@ class Agent:
 
 
     def communicate(self, neighbors):
-        self.previous_nav = copy.deepcopy(self.behavior.navigation_table)
+        """
+        NOTE: sellers must see start-of-tick information, hence the navigation table
+            exposes its start-of-tick entries until step() (see NavigationTable)
+        """
+        self.behavior.navigation_table.begin_trading()
         if self.comm_state == CommunicationState.OPEN:
             session = CommunicationSession(self, neighbors)
             if self.behavior.required_information==RequiredInformation.LOCAL:
                 self.behavior.buy_info(None,session)
             elif self.behavior.required_information==RequiredInformation.GLOBAL:    
                 self.behavior.buy_info(self.environment.payment_database,session)
-        self.new_nav = self.behavior.navigation_table
-        self.behavior.navigation_table = self.previous_nav
+        self.behavior.navigation_table.end_trading()
 
 
     def step(self):
-        self.behavior.navigation_table = self.new_nav
+        self.behavior.navigation_table.commit_trades()
         self.sensors = self.environment.get_sensors(self)
         
         if not self.comm_state == CommunicationState.PROCESSING:
@@ -176,13 +188,17 @@ class Agent:
         """
         wanted_movement = rotate(self.dr, self.orientation)
         if self.bimodal_noise:
-            noise_angle = gauss(self.noise_mu, self.noise_sd)
+            noise_angle = self.gauss(self.noise_mu, self.noise_sd)
         else:
-            gauss(0,0)  # discard this r.n.
+            if self.random_stream is None:
+                gauss(0,0)  # discard this r.n.
             noise_angle = self.noise_mu
         noisy_movement = rotate(wanted_movement, noise_angle)
         self.orientation = get_orientation_from_vector(noisy_movement)
         self.pos = self.clamp_to_map(self.pos + noisy_movement)
+        self.environment.neighbor_grid.update(self)
+        # sensors of the tick are outdated (see Environment.sense)
+        self.environment.sensed.pop(self.id, None)
 
 
     def clamp_to_map(self, new_position):
@@ -200,13 +216,13 @@ class Agent:
     def update_levi_counter(self):
         self.levi_counter -= 1
         if self.levi_counter <= 0:
-            self.levi_counter = choices(range(1, rw.get_max_levi_steps() + 1), rw.get_levi_weights())[0]
+            self.levi_counter = rw.draw_levi_steps(self.walk_uniform)
 
 
     def get_levi_turn_angle(self):
         angle = 0
         if self.levi_counter <= 1:
-            angle = choices(np.arange(0, 360), rw.get_crw_weights())[0]
+            angle = rw.draw_crw_angle(self.walk_uniform)
         self.update_levi_counter()
         return angle
 
@@ -350,4 +366,88 @@ class Agent:
 
     
     # def get_expiration_timer(self):
-    #     return self._expiration_timer
\ No newline at end of file
+    #     return self._expiration_timer
+
+
+class VectorizedAgent(Agent):
+    '''
+    agent whose physical state (position, orientation, noise, carried food) lives in
+    a row of the environment's SwarmState, used by the vectorized engine.
+
+    move() only samples the noise angle (same random sequence of Agent.move) and schedules
+    the movement: the whole swarm is moved by the environment after all robots stepped,
+    then traces are updated (see Environment.move_swarm)
+    '''
+    def __init__(self, robot_id, x, y, environment, behavior_params, **agent_params):
+        self.swarm = environment.swarm
+        self.index = self.swarm.add_robot(agent_params["radius"], self)
+        super().__init__(robot_id, x, y, environment, behavior_params, **agent_params)
+
+
+    @property
+    def pos(self):
+        return self.swarm.pos[self.index]
+
+
+    @pos.setter
+    def pos(self, value):
+        self.swarm.pos[self.index] = value
+
+
+    @property
+    def orientation(self):
+        return float(self.swarm.orientation[self.index])
+
+
+    @orientation.setter
+    def orientation(self, value):
+        self.swarm.orientation[self.index] = value
+
+
+    @property
+    def noise_mu(self):
+        return float(self.swarm.noise_mu[self.index])
+
+
+    @noise_mu.setter
+    def noise_mu(self, value):
+        self.swarm.noise_mu[self.index] = value
+
+
+    @property
+    def noise_sd(self):
+        return float(self.swarm.noise_sd[self.index])
+
+
+    @noise_sd.setter
+    def noise_sd(self, value):
+        self.swarm.noise_sd[self.index] = value
+
+
+    @property
+    def _carries_food(self):
+        return bool(self.swarm.carries_food[self.index])
+
+
+    @_carries_food.setter
+    def _carries_food(self, value):
+        self.swarm.carries_food[self.index] = value
+
+
+    def move(self):
+        if self.bimodal_noise:
+            noise_angle = self.gauss(self.noise_mu, self.noise_sd)
+        else:
+            if self.random_stream is None:
+                gauss(0,0)  # discard this r.n.
+            noise_angle = self.noise_mu
+        self.swarm.request_move(self.index, self.dr, noise_angle)
+
+
+    def update_trace(self):
+        # NOTE position is not updated yet, see commit_trace
+        pass
+
+
+    def commit_trace(self):
+        super().update_trace()
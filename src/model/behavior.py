@@ -383,6 +383,8 @@ class Behavior(ABC):
     def __init__(self):
         self.color = "blue"
         self.navigation_table = NavigationTable()
+        # uniform draws of the behavior, from the stream of the robot with rng streams (see helpers.rng)
+        self.random = np.random.random
 
     @abstractmethod
     def buy_info(self, neighbors):
@@ -708,11 +710,11 @@ class BenchmarkBehavior(TemplateBehaviour):
             - byzantine robots are accepted with lowest probability
         '''
         if seller_id in self.good_ids:
-            return np.random.random() <= self.good_acceptance_rate
+            return self.random() <= self.good_acceptance_rate
         elif seller_id in self.bad_ids:
-            return np.random.random() <= self.bad_acceptance_rate
+            return self.random() <= self.bad_acceptance_rate
         elif seller_id in self.saboteur_ids:
-            return np.random.random() <= self.saboteur_acceptance_rate
+            return self.random() <= self.saboteur_acceptance_rate
 
 
 class SaboteurBenchmarkBehavior(BenchmarkBehavior):
@@ -1180,12 +1182,17 @@ class SaboteurCapitalistBehavior(CapitalistBehavior):
 class ReputationRankingBehavior(TemplateBehaviour):
     def __init__(self,ranking_threshold=.5,
                  reputation_method="r",
-                 combine_strategy="WeightedAverageAgeStrategy"):
+                 combine_strategy="WeightedAverageAgeStrategy",
+                 ranking_ties="ordinal"):
+        """
+        :param ranking_ties: rank of sellers with same reputation, see PaymentDB.get_reward_ranking
+        """
         super().__init__(combine_strategy=combine_strategy)
         self.required_information=RequiredInformation.GLOBAL
         self.information_ordering_metric="age"
         self.ranking_threshold=ranking_threshold
         self.reputation_method=reputation_method
+        self.ranking_ties=ranking_ties
 
 
     def test_data_validity(self, location: Location, data,_,__):
@@ -1200,7 +1207,7 @@ class ReputationRankingBehavior(TemplateBehaviour):
 
 
     def verify_reputation(self,payment_database:PaymentDB,seller_id):
-        rank=payment_database.get_reputation_ranking(seller_id,self.reputation_method)
+        rank=payment_database.get_reputation_ranking(seller_id,self.reputation_method,self.ranking_ties)
         if rank is None:
             return True
         percentile=1-rank/payment_database.get_number_of_wallets()
@@ -1214,10 +1221,12 @@ class ReputationRankingBehavior(TemplateBehaviour):
 class SaboteurReputationRankingBehavior(ReputationRankingBehavior):
     def __init__(self,lie_angle=90,ranking_threshold=.5,
                  reputation_method="r",
-                 combine_strategy="WeightedAverageAgeStrategy"):
+                 combine_strategy="WeightedAverageAgeStrategy",
+                 ranking_ties="ordinal"):
         super().__init__(ranking_threshold=ranking_threshold,
                         reputation_method=reputation_method,
-                        combine_strategy=combine_strategy)
+                        combine_strategy=combine_strategy,
+                        ranking_ties=ranking_ties)
         self.color = "red"
         self.lie_angle = lie_angle
 
@@ -2,11 +2,19 @@ from math import cos, sin, radians
 from random import randint, random, seed as random_seed
 import numpy as np
 
-from model.agent import Agent
+from model.agent import Agent, VectorizedAgent
 from model.market import market_factory
 from model.navigation import Location
-from helpers.utils import norm, distance_between
-from model.payment import PaymentDB
+from helpers.utils import norm
+from helpers.spatial_grid import NeighborGrid
+from helpers.rng import RandomStreams
+from model.payment import payment_db_factory
+from model.swarm_state import SwarmState
+from model.snapshot import environment_state, restore_environment, SENSORS
+
+
+# newcomers types: index of their behavior in the config behaviors ("byzantine" is an alias of "dishonest")
+NEWCOMER_TYPES = {"honest": 0, "dishonest": 1, "byzantine": 1}
 
 
 def random_seeder(seed,n=None):
@@ -97,9 +105,29 @@ class Environment:
                  nest, 
                  payment_system_params, 
                  market_params,
-                 simulation_seed=None
+                 simulation_seed=None,
+                 engine_params=None,
+                 swarm=None,
+                 rng_params=None
                  ):
+        """
+        :param engine_params: {"mode": "scalar"|"vectorized"|"ensemble"}, default scalar.
+            vectorized: robots state is stored in a SwarmState and the swarm is moved
+            with batched operations, results are the same of the scalar engine.
+            ensemble: vectorized, the SwarmState is shared by the replicas of an EnsembleController
+        :param swarm: SwarmState shared with other environments (ensemble), a new one if None
+        :param rng_params: {"mode": "legacy"|"streams"}, default legacy (random module).
+            streams: the environment and each robot draw from their own stream, see helpers.rng
+        """
         self.population = list()
+        self.random_streams = RandomStreams.from_params(simulation_seed, rng_params)
+        self.random, self.randint = (self.random_streams.environment.random, self.random_streams.environment.randint) \
+            if self.random_streams is not None else (random, randint)
+        self.engine_mode = engine_params["mode"] if engine_params else "scalar"
+        if swarm is None and self.engine_mode in ("vectorized", "ensemble"):
+            swarm = SwarmState(width, height)
+        self.swarm = swarm
+        self.agent_class = VectorizedAgent if self.swarm is not None else Agent
         self.ROBOTS_AMOUNT=0
         self.width = width
         self.height = height
@@ -109,40 +137,71 @@ class Environment:
         self.foraging_spawns = self.create_spawn_dicts()
         self.SIMULATION_SEED=simulation_seed
         self.create_robots(agent_params, behavior_params,combine_strategy_params)
+        self.neighbor_grid = NeighborGrid(agent_params["communication_radius"])
+        self.neighbor_grid.rebuild(self.population)
         self.best_bot_id = self.get_best_bot_id()
-        self.payment_database = PaymentDB([bot.id for bot in self.population], payment_system_params)
+        self.payment_database = payment_db_factory([bot.id for bot in self.population], payment_system_params)
         self.payment_system_params = payment_system_params
         self.market = market_factory(market_params)
         self.img = None
         self.timestep = 0
+        # sensors of the robots in the current tick, by robot id, see sense()
+        self.sensed = {}
         # self.food_expiration_time=1000#[x]IEFM
 
 
     def step(self):
+        self.step_robots()
+        if self.swarm is not None:
+            self.move_swarm()
+        self.end_step()
+
+
+    def step_robots(self):
+        """
+        negotiation and movement (requested only, with the vectorized engine) of the robots
+        """
         self.timestep += 1
         for robot in self.population:
             self.payment_database.increment_wallet_age(robot.id)
         # compute neighbors
-        pop_size = len(self.population)
-        neighbors_table = [[] for i in range(pop_size)]
-        for id1 in range(pop_size):
-            for id2 in range(id1 + 1, pop_size):
-                if distance_between(self.population[id1],
-                        self.population[id2]) < self.population[id1].communication_radius:
-                    neighbors_table[id1].append(self.population[id2])
-                    neighbors_table[id2].append(self.population[id1])
+        neighbors_table = self.neighbor_grid.get_neighbors_table(self.population)
         # 1. Negotiation/communication
         for robot in self.population:
             robot.communicate(neighbors_table[robot.id])
             #[x]buy_info is here
         # 2. Movement
+        self.sense()
         for robot in self.population:
             self.check_locations(robot)
             robot.step()
+
+
+    def end_step(self):
+        self.sensed = {}
+        if self.swarm is not None:
+            for robot in self.population:
+                robot.commit_trace()
         # 3. Market
         self.market.step()
 
 
+    def snapshot(self):
+        """
+        state of the simulation (robots, navigation tables, payment database, market, RNGs)
+        as a dict of arrays, see model.snapshot
+        """
+        return environment_state(self)
+
+
+    def restore(self, state):
+        """
+        restores a snapshot on an environment built from the same config: the simulation
+        continues exactly as the one the snapshot was taken from
+        """
+        restore_environment(self, state)
+
+
     def load_images(self):
         pass
         #NOTE OVERLOADED IN gui.py: self.img = ImageTk.PhotoImage(file="../assets/strawberry.png")
@@ -150,9 +209,13 @@ class Environment:
 
     #[ ]NEWCOMERS
     def create_newcomers(self, newcomers_type, newcomers_amount):
-        if newcomers_type=='honest':selected=0
-        elif newcomers_type=='dishonest':selected=1
-        behavior_params=self.behavior_params[selected]
+        """
+        :param newcomers_type: see NEWCOMER_TYPES, newcomers have the behavior
+            of the first (honest) or second (dishonest) behavior of the config
+        """
+        if newcomers_type not in NEWCOMER_TYPES:
+            raise ValueError(f"Newcomers type {newcomers_type} not recognized, accepted values are {list(NEWCOMER_TYPES)}")
+        behavior_params=self.behavior_params[NEWCOMER_TYPES[newcomers_type]]
         behavior_params["parameters"]["combine_strategy"]=self.combine_strategy_params["class"]
         robot_id=len(self.population)
         for i in range(newcomers_amount):
@@ -177,14 +240,15 @@ class Environment:
                 #spawn at nest
                 robot_x=self.nest[0]
                 robot_y=self.nest[1]
-                robot = Agent(robot_id=robot_id,
-                              x=robot_x,
-                              y=robot_y,
-                              environment=self,
-                              behavior_params=behavior_params,
-                              **self.agent_params)
+                robot = self.agent_class(robot_id=robot_id,
+                                         x=robot_x,
+                                         y=robot_y,
+                                         environment=self,
+                                         behavior_params=behavior_params,
+                                         **self.agent_params)
                 robot_id += 1
                 self.population.append(robot)
+                self.neighbor_grid.add(robot)
         self.payment_database.add_newcomers([bot.id for bot in self.population[-newcomers_amount:]],self.payment_system_params)
 
 
@@ -214,19 +278,67 @@ class Environment:
                 if agent_params["noise"]["class"]=="UniformNoise":
                     agent_params["noise"]["parameters"]["noise_mu"] = generated_fixed_noise[robot_id]
 
-                robot_x=randint(agent_params['radius'], self.width - 1 - agent_params['radius'])
-                robot_y=randint(agent_params['radius'], self.height - 1 - agent_params['radius'])
-                robot = Agent(robot_id=robot_id,
-                              x=robot_x,
-                              y=robot_y,
-                              environment=self,
-                              behavior_params=behavior_params,
-                              **agent_params)
+                robot_x=self.randint(agent_params['radius'], self.width - 1 - agent_params['radius'])
+                robot_y=self.randint(agent_params['radius'], self.height - 1 - agent_params['radius'])
+                robot = self.agent_class(robot_id=robot_id,
+                                         x=robot_x,
+                                         y=robot_y,
+                                         environment=self,
+                                         behavior_params=behavior_params,
+                                         **agent_params)
                 robot_id += 1
                 self.population.append(robot)
 
 
+    def move_swarm(self):
+        """
+        vectorized engine: applies the movements requested by the robots during their step
+        (of all the environments sharing the swarm)
+        """
+        for index in self.swarm.move():
+            robot = self.swarm.robots[index]
+            robot.environment.neighbor_grid.update(robot)
+
+
+    def sense(self):
+        """
+        batched sensors (food, nest and border probes) of all the robots, with array operations:
+        values are the ones of compute_sensors, cached by get_sensors until the robot moves
+        (positions do not change during the movement phase before the robot steps).
+        NOTE np.cos/np.sin are the libm ones here: builds of numpy using other implementations
+            could differ in the last bit, hence in the border probes exactly on the border
+        """
+        if not self.population:
+            return
+        if self.swarm is not None:
+            rows = [robot.index for robot in self.population]
+            pos, orientation, radius = self.swarm.pos[rows], self.swarm.orientation[rows], self.swarm.radius[rows]
+        else:
+            pos = np.array([robot.pos for robot in self.population], dtype=float)
+            orientation = np.array([robot.orientation for robot in self.population], dtype=float)
+            radius = np.array([robot._radius for robot in self.population], dtype=float)
+        speed = np.array([robot._speed for robot in self.population], dtype=float)
+        columns = []
+        for location in (Location.FOOD, Location.NEST):
+            dist_vector = pos - np.array([self.locations[location][0], self.locations[location][1]])
+            dist_from_center = np.sqrt(dist_vector[:, 0] * dist_vector[:, 0] + dist_vector[:, 1] * dist_vector[:, 1])
+            columns.append((dist_from_center < self.locations[location][2]).tolist())
+        # FRONT, RIGHT, BACK, LEFT
+        for angles in (orientation, (orientation - 90) % 360, (orientation + 180) % 360, (orientation + 90) % 360):
+            thetas = np.radians(angles)
+            new_x = pos[:, 0] + speed * np.cos(thetas)
+            new_y = pos[:, 1] + speed * np.sin(thetas)
+            columns.append(((new_x + radius >= self.width) | (new_x - radius < 0) |
+                            (new_y + radius >= self.height) | (new_y - radius < 0)).tolist())
+        self.sensed = {robot.id: dict(zip(SENSORS, values)) for robot, values in zip(self.population, zip(*columns))}
+
+
     def get_sensors(self, robot):
+        sensors = self.sensed.get(robot.id)
+        return sensors if sensors is not None else self.compute_sensors(robot)
+
+
+    def compute_sensors(self, robot):
         orientation = robot.orientation
         speed = robot.speed()
         sensors = {Location.FOOD: self.senses(robot, Location.FOOD),
@@ -361,8 +473,9 @@ class Environment:
 
 
     def check_locations(self, robot:Agent):
+        sensors = self.get_sensors(robot)
         if robot.carries_food():
-            if self.senses(robot, Location.NEST):
+            if sensors[Location.NEST]:
                 # Spawn deposit location if needed
                 if robot.id not in self.foraging_spawns[Location.NEST]:
                     self.add_spawn(Location.NEST, robot)
@@ -372,7 +485,7 @@ class Environment:
                     # self.reset_food_counter(robot)#[x]IEFM
             # else: self.increment_food_expiration_counter(robot)#[x]IEFM
         else:
-            if self.senses(robot, Location.FOOD):
+            if sensors[Location.FOOD]:
                 # Spawn food if needed
                 if robot.id not in self.foraging_spawns[Location.FOOD]:
                     self.add_spawn(Location.FOOD, robot)
@@ -382,8 +495,8 @@ class Environment:
 
 
     def add_spawn(self, location:Location, robot:Agent):
-        rand_angle = random() * 360
-        rand_rad = np.sqrt(random()) * self.locations[location][2]
+        rand_angle = self.random() * 360
+        rand_rad = np.sqrt(self.random()) * self.locations[location][2]
         pos_in_circle = rand_rad * np.array([cos(radians(rand_angle)), sin(radians(rand_angle))])
         self.foraging_spawns[location][robot.id] = np.array([self.locations[location][0],
                                                              self.locations[location][1]]) + pos_in_circle
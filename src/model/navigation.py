@@ -46,10 +46,36 @@ class Target:
 
 
 class NavigationTable:
+    """
+    NOTE: during trading (negotiation phase) the entries are copy-on-write:
+        the start-of-tick entries are kept aside only when the first one is replaced.
+        After end_trading() the table exposes the start-of-tick entries to the sellers,
+        until commit_trades() restores the updated ones.
+        Entries are only replaced (never modified in place) while trading.
+    """
     def __init__(self):
         self.entries = dict()
         for location in Location:
             self.entries[location] = Target(location)
+        self._trading = False
+        self._start_entries = None
+        self._traded_entries = None
+
+    def begin_trading(self):
+        self._trading = True
+        self._start_entries = None
+
+    def end_trading(self):
+        self._trading = False
+        if self._start_entries is not None:
+            self._traded_entries = self.entries
+            self.entries = self._start_entries
+            self._start_entries = None
+
+    def commit_trades(self):
+        if self._traded_entries is not None:
+            self.entries = self._traded_entries
+            self._traded_entries = None
 
     def is_information_valid_for_location(self, location):
         return self.entries[location].is_valid()
@@ -81,4 +107,6 @@ class NavigationTable:
         return self.entries[location]
 
     def replace_information_entry(self, location, new_target):
+        if self._trading and self._start_entries is None:
+            self._start_entries = dict(self.entries)
         self.entries[location] = new_target
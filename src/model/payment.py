@@ -5,12 +5,27 @@ import pandas as pd
 
 import config as CONFIG_FILE
 from helpers.utils import InsufficientFundsException
+from helpers.running_statistics import RunningStatistics, RankIndex
 from model.navigation import Location
 
 #turns off warning when working with on slices of DataFrames
 pd.options.mode.chained_assignment = None
 
 
+def payment_db_factory(population_ids, payment_system_params):
+    """
+    :param payment_system_params: "ledger" (optional) selects the backend:
+        -"dict" (default): PaymentDB
+        -"array": ArrayPaymentDB
+    """
+    ledger = payment_system_params.get("ledger", "dict")
+    if ledger == "dict":
+        return PaymentDB(population_ids, payment_system_params)
+    elif ledger == "array":
+        return ArrayPaymentDB(population_ids, payment_system_params)
+    raise ValueError(f"Ledger {ledger} not recognized")
+
+
 class Transaction:
     def __init__(self, buyer_id, seller_id, location, info_relative_angle, timestep):
         self.buyer_id = buyer_id
@@ -71,12 +86,14 @@ class PaymentDB:
                                         #                 }
                                     }
         self.completed_transactions_log=[]
+        self.transaction_log_sink=None
+        self.init_aggregates(population_ids, payment_system_params)
 
     #[ ] NEWCOMERS
     def add_newcomers(self, newcomers_ids,payment_system_params):
         NEW_DB_LEN=len(self.database)+len(newcomers_ids)
         for robot_id in self.database.keys():
-            #TODO stake dictionary entries for new robots
+            self.database[robot_id]["stake"].update({_: 0 for _ in newcomers_ids})
             self.database[robot_id]["n_attempted_transactions"].extend([0]*len(newcomers_ids))
             self.database[robot_id]["n_validated_transactions"].extend([0]*len(newcomers_ids))
             self.database[robot_id]["n_completed_transactions"].extend([0]*len(newcomers_ids))
@@ -94,6 +111,61 @@ class PaymentDB:
                                         "n_combined_transactions" : [0]*NEW_DB_LEN,
                                         "history": [None]*self.history_span,
                                     }
+            self.update_aggregates(robot_id)
+
+
+    def init_aggregates(self, population_ids, payment_system_params):
+        """
+        "running_aggregates" (optional, default false) in payment_system_params:
+            keeps running sum, min and max of rewards and total wealths (see RunningStatistics),
+            updated at each reward or stake change, instead of scanning the database at each query.
+            NOTE the running mean can differ from np.average in the last digits
+        """
+        self.reward_statistics = None
+        self.wealth_statistics = None
+        self.rank_indexes = {}
+        self.stake_totals = {}
+        if payment_system_params.get("running_aggregates", False):
+            self.reward_statistics = RunningStatistics()
+            self.wealth_statistics = RunningStatistics()
+            for robot_id in population_ids:
+                self.update_aggregates(robot_id)
+
+
+    def update_aggregates(self, robot_id, stake_changed=False):
+        if self.reward_statistics is None and not self.rank_indexes:
+            return
+        reward = self.get_reward(robot_id)
+        if self.reward_statistics is not None:
+            self.reward_statistics.update(robot_id, reward)
+        if "reward" in self.rank_indexes:
+            self.rank_indexes["reward"].update(robot_id, reward)
+        if self.wealth_statistics is not None or "total" in self.rank_indexes:
+            if stake_changed or robot_id not in self.stake_totals:
+                self.stake_totals[robot_id] = self.get_stake(robot_id)
+            wealth = reward + self.stake_totals[robot_id]
+            if self.wealth_statistics is not None:
+                self.wealth_statistics.update(robot_id, wealth)
+            if "total" in self.rank_indexes:
+                self.rank_indexes["total"].update(robot_id, wealth)
+
+
+    def get_rank_index(self, method="reward"):
+        """
+        RankIndex of rewards (or total wealths), built at the first ranking query
+        and then kept updated by update_aggregates
+        """
+        index_name = "total" if method=="total" or method=="t" or method=="T" else "reward"
+        if index_name not in self.rank_indexes:
+            index = RankIndex()
+            for robot_id in self.database:
+                if index_name == "total":
+                    self.stake_totals[robot_id] = self.get_stake(robot_id)
+                    index.update(robot_id, self.get_reward(robot_id) + self.stake_totals[robot_id])
+                else:
+                    index.update(robot_id, self.get_reward(robot_id))
+            self.rank_indexes[index_name] = index
+        return self.rank_indexes[index_name]
 
 
     def update_history(self,robot_id,redistribution):
@@ -134,10 +206,12 @@ class PaymentDB:
 
     def increment_stake(self,staker_id,buyer_id,amount):
         self.database[staker_id]["stake"][buyer_id]+=amount
+        self.update_aggregates(staker_id, stake_changed=True)
 
 
     def reset_stake(self,staker_id,buyer_id):
         self.database[staker_id]["stake"][buyer_id]=0
+        self.update_aggregates(staker_id, stake_changed=True)
         
 
     def get_history(self,robot_id):
@@ -146,9 +220,14 @@ class PaymentDB:
     def increment_wallet_age(self, robot_id):
         self.database[robot_id]["wallet_age"] += 1
 
+
+    def get_wallet_age(self, robot_id):
+        return self.database[robot_id]["wallet_age"]
+
     
     def pay_reward(self, robot_id, reward=1):
         self.database[robot_id]["reward"] += reward
+        self.update_aggregates(robot_id)
 
 
     def transfer(self, from_id, to_id, amount):
@@ -165,7 +244,8 @@ class PaymentDB:
             self.database[transaction.buyer_id]["payment_system"].new_transaction(transaction, PaymentAPI(self),
                                                                     # variable_stake=variable_stake,reputation_method=reputation_method
                                                                                   )
-            if CONFIG_FILE.LOG_COMPLETED_TRANSATIONS: self.log_completed_transaction(transaction)
+            if CONFIG_FILE.LOG_COMPLETED_TRANSATIONS or self.transaction_log_sink is not None:
+                self.log_completed_transaction(transaction)
         elif type=="attempted" or type=="A" or type=="a":
             self.database[buyer_id]["n_attempted_transactions"][seller_id] += 1
         elif type=="validated" or type=="V" or type=="v":
@@ -182,19 +262,33 @@ class PaymentDB:
 
 
     def get_total_reward(self):
+        if self.reward_statistics is not None:
+            return self.reward_statistics.sum()
         return sum([self.database[robot_id]["reward"] for robot_id in self.database])
         
 
     def get_reward(self, robot_id):
         return self.database[robot_id]["reward"]
+
+
+    def get_rewards(self, robot_ids):
+        """
+        rewards of robot_ids, as an array
+        """
+        return np.array([self.database[robot_id]["reward"] for robot_id in robot_ids], dtype=float)
     
 
+    def get_stake(self, robot_id):
+        return sum(self.database[robot_id]["stake"].values())
+
+
     def get_wealth(self, robot_id):
-        return self.database[robot_id]["reward"]+\
-                            sum(self.database[robot_id]["stake"].values())
+        return self.database[robot_id]["reward"]+self.get_stake(robot_id)
     
 
     def get_total_wealth(self):
+        if self.wealth_statistics is not None:
+            return self.wealth_statistics.sum()
         return sum([self.get_wealth(robot_id) for robot_id in self.database])
 
 
@@ -213,7 +307,7 @@ class PaymentDB:
                     # else:
                     #     bias_sign=-1
                     bias_sign=-1
-                    reputation=reward+bias_sign*0.25*7500/self.database[robot_id]["wallet_age"]
+                    reputation=reward+bias_sign*0.25*7500/self.get_wallet_age(robot_id)
                     return 1+10*np.tanh(reputation)
                     #'''
                 return reward
@@ -296,12 +390,18 @@ class PaymentDB:
             return np.min([r for r in valid_reputations]) if len(valid_reputations)>0 else None
 
     def get_highest_reward(self):
+        if self.reward_statistics is not None:
+            return self.reward_statistics.max()
         return np.max([self.database[robot_id]["reward"] for robot_id in self.database])
 
     def get_lowest_reward(self):
+        if self.reward_statistics is not None:
+            return self.reward_statistics.min()
         return np.min([self.database[robot_id]["reward"] for robot_id in self.database])
     
     def get_mean_reward(self):
+        if self.reward_statistics is not None:
+            return self.reward_statistics.mean()
         return np.average([self.database[robot_id]["reward"] for robot_id in self.database])
 
 
@@ -322,18 +422,26 @@ class PaymentDB:
         return sorted_database
         
     
-    def get_reward_ranking(self,robot_id=None,reputation_method='reward'):
-        sorted_database = self.get_sorted_database(reputation_method)
-        #TODO forgot what was this for
-        if robot_id is None:pass
-        return list(sorted_database.keys()).index(robot_id)
+    def get_reward_ranking(self,robot_id=None,reputation_method='reward',ties="ordinal"):
+        """
+        0-based position of the robot in the ranking by reward (or total wealth), highest first
+        :param ties: "ordinal": equal values are ranked by robot_id (same order of get_sorted_database)
+                     "min": robots with equal values share the same (best) rank
+        """
+        return self.get_rank_index(reputation_method).rank(robot_id,ties)
+
+
+    def get_top_fraction(self,fraction,reputation_method='reward'):
+        """
+        ids of the robots whose ranking is lower than fraction*number of wallets, best first
+        """
+        return self.get_rank_index(reputation_method).top(fraction)
 
     
-    def get_reputation_ranking(self,robot_id,method="reward"):
-        #TODO new method for giving same ranking for same reputation
+    def get_reputation_ranking(self,robot_id,method="reward",ties="ordinal"):
         if method=="reward" or method=="r" or method=="R" or method=="w" or \
             method=="total" or method=="t" or method=="T":
-            return self.get_reward_ranking(robot_id,method)
+            return self.get_reward_ranking(robot_id,method,ties)
         elif method=="history" or method=="h" or method=="H":
                 reputations=[self.get_reputation(robot_id,method="history") for robot_id in self.database]
                 valid_reputations=[r for r in reputations if r is not None]
@@ -354,6 +462,7 @@ class PaymentDB:
             raise InsufficientFundsException#(robot_id)
         else:
             self.database[robot_id]["reward"] -= cost
+            self.update_aggregates(robot_id)
         '''#[ ] NO DEFAULT MARKET
         self.database[robot_id]["reward"] -= cost
         #'''
@@ -363,9 +472,21 @@ class PaymentDB:
         if gains < 0:
             raise ValueError("Gains must be positive")
         self.database[robot_id]["reward"] += gains
+        self.update_aggregates(robot_id)
+
+
+    def set_transaction_log_sink(self, sink):
+        """
+        :param sink: helpers.transaction_log.TransactionLogSink, completed transactions are
+            written there instead of completed_transactions_log
+        """
+        self.transaction_log_sink=sink
 
 
     def log_completed_transaction(self,transaction:Transaction):
+        if self.transaction_log_sink is not None:
+            self.transaction_log_sink.append(transaction)
+            return
         self.completed_transactions_log.append([transaction.timestep,transaction.buyer_id,transaction.seller_id])
 
 
@@ -385,6 +506,13 @@ class PaymentDB:
 
     def get_stake_pot(self,robot_id:int):
         return self.database[robot_id]["payment_system"].pot_amount
+
+
+    def get_stake_pots(self, robot_ids):
+        """
+        stake pots of robot_ids, as an array
+        """
+        return np.array([self.database[robot_id]["payment_system"].pot_amount for robot_id in robot_ids], dtype=float)
     
 
     #[x] WEALTH STATUS CHECKS
@@ -500,7 +628,7 @@ class PaymentDB:
         self.apply_cost(robot_id,amount)
 
         if method=="stake":
-            self.database[robot_id]["charity_stake"]+=amount
+            self.add_charity(robot_id,amount)
         elif "direct" in method:
             if "P" in method:
                 pass
@@ -560,6 +688,10 @@ class PaymentDB:
             pass
 
 
+    def add_charity(self,robot_id:int,amount:float):
+        self.database[robot_id]["charity_stake"]+=amount
+
+
     #[ ] POOR BEFEFITS
     def demand_charity(self,robot_id:int,amount:float):
         '''
@@ -580,6 +712,177 @@ class PaymentDB:
 
         
 
+class ArrayPaymentDB(PaymentDB):
+    """
+    same data and interface of PaymentDB, stored in arrays indexed by robot_id:
+    - reward, charity (float), wallet_age (int): vectors;
+    - n_{type}_transactions: (buyer_id, seller_id) int32 matrices, one for each type;
+    - stake: sparse rows, stakes[staker_id] is a {buyer_id: amount} dict of the non null stakes;
+    database only holds payment_system and history of each robot.
+
+    NOTE: results are the same of PaymentDB (sums over rewards and stakes are made in the same order)
+    """
+    TRANSACTION_TYPES = {"attempted": "attempted", "A": "attempted", "a": "attempted",
+                         "validated": "validated", "V": "validated", "v": "validated",
+                         "completed": "completed", "C": "completed", "c": "completed",
+                         "combined": "combined", "X": "combined", "x": "combined"}
+
+    def __init__(self, population_ids, payment_system_params):
+        self.history_span=10
+        self.database = {}
+        self.rewards = np.zeros(0)
+        self.charity = np.zeros(0)
+        self.wallet_ages = np.zeros(0, dtype=int)
+        self.transactions = {type: np.zeros((0, 0), dtype=np.int32)
+                                for type in set(self.TRANSACTION_TYPES.values())}
+        self.stakes = []
+        self.init_aggregates([], payment_system_params)
+        self.add_newcomers(population_ids, payment_system_params)
+        self.completed_transactions_log=[]
+        self.transaction_log_sink=None
+
+    #[ ] NEWCOMERS
+    def add_newcomers(self, newcomers_ids,payment_system_params):
+        n_new=len(newcomers_ids)
+        self.rewards = np.append(self.rewards, [payment_system_params["initial_reward"]]*n_new)
+        self.charity = np.append(self.charity, np.zeros(n_new))
+        self.wallet_ages = np.append(self.wallet_ages, np.zeros(n_new, dtype=int))
+        for type, counters in self.transactions.items():
+            self.transactions[type] = np.pad(counters, ((0, n_new), (0, n_new)))
+        for robot_id in newcomers_ids:
+            self.stakes.append({})
+            self.database[robot_id] = {"payment_system": eval(payment_system_params['class'])(
+                                                                **payment_system_params['parameters']),
+                                       "history": [None]*self.history_span,
+                                    }
+            self.update_aggregates(robot_id)
+
+
+    def increment_stake(self,staker_id,buyer_id,amount):
+        self.stakes[staker_id][buyer_id]=self.stakes[staker_id].get(buyer_id,0)+amount
+        self.update_aggregates(staker_id, stake_changed=True)
+
+
+    def reset_stake(self,staker_id,buyer_id):
+        self.stakes[staker_id].pop(buyer_id,None)
+        self.update_aggregates(staker_id, stake_changed=True)
+
+
+    def get_stake(self,staker_id):
+        """
+        total amount staked by the robot (summed in buyer_id order, as PaymentDB)
+        """
+        stake=self.stakes[staker_id]
+        return sum(stake[buyer_id] for buyer_id in sorted(stake))
+
+
+    def increment_wallet_age(self, robot_id):
+        self.wallet_ages[robot_id] += 1
+
+
+    def get_wallet_age(self, robot_id):
+        return int(self.wallet_ages[robot_id])
+
+
+    def pay_reward(self, robot_id, reward=1):
+        self.rewards[robot_id] += reward
+        self.update_aggregates(robot_id)
+
+
+    def record_transaction(self,type:str,buyer_id:int,seller_id:int,transaction:Transaction=None):
+        if type not in self.TRANSACTION_TYPES:
+            raise ValueError("Transaction type not recognized")
+        type=self.TRANSACTION_TYPES[type]
+        if type=="completed":
+            self.transactions[type][transaction.buyer_id,seller_id] += 1
+            self.database[transaction.buyer_id]["payment_system"].new_transaction(transaction, PaymentAPI(self))
+            if CONFIG_FILE.LOG_COMPLETED_TRANSATIONS or self.transaction_log_sink is not None:
+                self.log_completed_transaction(transaction)
+        else:
+            self.transactions[type][buyer_id,seller_id] += 1
+
+
+    def get_total_reward(self):
+        if self.reward_statistics is not None:
+            return self.reward_statistics.sum()
+        return sum(self.rewards.tolist())
+
+
+    def get_reward(self, robot_id):
+        return float(self.rewards[robot_id])
+
+
+    def get_rewards(self, robot_ids):
+        return self.rewards[robot_ids]
+
+
+    def get_wealth(self, robot_id):
+        return self.get_reward(robot_id)+self.get_stake(robot_id)
+
+
+    def get_highest_reward(self):
+        if self.reward_statistics is not None:
+            return self.reward_statistics.max()
+        return np.max(self.rewards)
+
+    def get_lowest_reward(self):
+        if self.reward_statistics is not None:
+            return self.reward_statistics.min()
+        return np.min(self.rewards)
+
+    def get_mean_reward(self):
+        if self.reward_statistics is not None:
+            return self.reward_statistics.mean()
+        return np.average(self.rewards)
+
+
+    def get_sorted_database(self,method="reward"):
+        """
+        returns {robot_id: reward} (or total wealth), sorted by highest value first
+        """
+        if method=="reward" or method=="r" or method=="R" or method=="w":
+            values=self.rewards
+        elif method=="total" or method=="t" or method=="T":
+            values=np.array([self.get_wealth(robot_id) for robot_id in self.database])
+        # NOTE stable sort: ties keep robot_id order, as sorted(..., reverse=True)
+        order=np.argsort(-values, kind="stable")
+        return {int(robot_id): values[robot_id] for robot_id in order}
+
+
+    def apply_cost(self, robot_id, cost):
+        if cost < 0:
+            raise ValueError("Cost must be positive")
+        if self.rewards[robot_id] < cost:
+            raise InsufficientFundsException
+        self.rewards[robot_id] -= cost
+        self.update_aggregates(robot_id)
+
+
+    def apply_gains(self, robot_id, gains):
+        if gains < 0:
+            raise ValueError("Gains must be positive")
+        self.rewards[robot_id] += gains
+        self.update_aggregates(robot_id)
+
+
+    def get_transactions(self,type:str,robot_id:int):
+        if type not in self.TRANSACTION_TYPES:
+            raise ValueError("Transaction type not recognized")
+        return self.transactions[self.TRANSACTION_TYPES[type]][robot_id].tolist()
+
+
+    def add_charity(self,robot_id:int,amount:float):
+        self.charity[robot_id]+=amount
+
+
+    def demand_charity(self,robot_id:int,amount:float):
+        if self.charity[robot_id]>=amount:
+            self.charity[robot_id]-=amount
+            return True
+        else:
+            raise InsufficientFundsException
+
+
 ############################################################################################################
 ############################################################################################################
 ############################################################################################################
@@ -593,15 +896,62 @@ class PaymentSystem(ABC):
         pass
 
 
+def angle_window_counts(angles, angle_window):
+    """
+    for each angle a_i (degrees): #{j: (a_j-a_i)%360 < angle_window} + #{j: (a_i-a_j)%360 < angle_window} - 1
+
+    on the sorted angles, the j satisfying each condition are a run of the circle starting from a_i
+    (forward and backward respectively), whose end only moves forward with i: runs are found with
+    two pointers, testing the same condition of the definition. O(k log k) for k angles.
+    NOTE angles are normalised in [0, 360) first (e.g. get_orientation_from_vector can give 360.0,
+        which is the same of 0.0 for the definition but would be sorted last). Counts are the ones of
+        calculate_shares_mapping_reference on the normalised angles; on raw 360.0 the reference subtracts
+        with a rounding error (15-1e-14-360.0 gives -345.0), hence can differ right at the window edge
+    """
+    k = len(angles)
+    angles = np.asarray(angles, dtype=float) % 360
+    angles[angles >= 360] = 0
+    order = np.argsort(angles, kind="stable")
+    sorted_angles = angles[order].tolist()
+    counts = [-1]*k
+    # forward runs: [start, end) on the unwrapped circle, start is the first angle equal to a_i
+    start = end = 0
+    for i in range(k):
+        if sorted_angles[i] != sorted_angles[start]:
+            start = i
+        end = max(end, start)
+        while end - start < k and (sorted_angles[end % k] - sorted_angles[i]) % 360 < angle_window:
+            end += 1
+        counts[i] += end - start
+    # backward runs: (begin, stop], stop is the last angle equal to a_i
+    stop = begin = k - 1
+    for i in reversed(range(k)):
+        if sorted_angles[i] != sorted_angles[stop]:
+            stop = i
+        begin = min(begin, stop)
+        while stop - begin < k and (sorted_angles[i] - sorted_angles[begin % k]) % 360 < angle_window:
+            begin -= 1
+        counts[i] += stop - begin
+    result = [0]*k
+    for sorted_index, index in enumerate(order.tolist()):
+        result[index] = counts[sorted_index]
+    return result
+
+
 class OutlierPenalisationPaymentSystem(PaymentSystem):
-    def __init__(self, information_share:float,reputation_stake:bool,reputation_metric:str):
+    def __init__(self, information_share:float,reputation_stake:bool,reputation_metric:str,angle_window:float=30):
+        """
+        :param angle_window: (degrees) transactions for the same location whose relative angles are
+            closer than angle_window agree with each other, see calculate_shares_mapping
+        """
         super().__init__()
-        self.transactions = set()
+        self.transactions = []
         self.information_share = information_share
         self.pot_amount = 0
         self.stake_amount=1/25
         self.reputation_stake = reputation_stake
         self.reputation_metric = reputation_metric
+        self.angle_window = angle_window
 
 
     def get_stake_amount(self,payment_api:PaymentAPI,robot_id):
@@ -623,7 +973,7 @@ class OutlierPenalisationPaymentSystem(PaymentSystem):
                 pass
         #'''
         self.pot_amount += stake_amount
-        self.transactions.add(transaction)
+        self.transactions.append(transaction)
         payment_api.increment_stake(transaction.seller_id,transaction.buyer_id,stake_amount)
 
 
@@ -676,10 +1026,38 @@ class OutlierPenalisationPaymentSystem(PaymentSystem):
 
     
     def calculate_shares_mapping(self,amount_to_distribute=1):
+        """
+        each transaction gives to its seller as many shares as the transactions for the same location
+        agreeing with it (relative angles closer than angle_window, itself included), see angle_window_counts.
+        NOTE same result (and order of sellers) of calculate_shares_mapping_reference
+        """
+        if len(self.transactions) == 0:
+            return {}
+        transactions = list(self.transactions)
+        final_mapping = {}
+        for location in Location:
+            located_transactions = [t for t in transactions if t.location == location]
+            if len(located_transactions) == 0:
+                continue
+            counts = angle_window_counts(np.array([t.relative_angle for t in located_transactions], dtype='float64'),
+                                         self.angle_window)
+            for transaction, count in zip(located_transactions, counts):
+                final_mapping[transaction.seller_id] = final_mapping.get(transaction.seller_id, 0) + count
+
+        total_shares = sum(final_mapping.values())
+        for seller in final_mapping:
+            final_mapping[seller] = final_mapping[seller] * amount_to_distribute / total_shares
+        return final_mapping
+
+
+    def calculate_shares_mapping_reference(self,amount_to_distribute=1):
+        """
+        reference implementation of calculate_shares_mapping: O(k^2)
+        """
         if len(self.transactions) == 0:
             return {}
         df_all = np.array([[t.seller_id, t.relative_angle, t.location, 0] for t in self.transactions])
-        angle_window = 30
+        angle_window = self.angle_window
         final_mapping = {}
         for location in Location:
             df = df_all[df_all[:, 2] == location]
@@ -714,11 +1092,11 @@ class DelayedPaymentPaymentSystem(PaymentSystem):
     def __init__(self, information_share,reputation_stake,reputation_metric):
         super().__init__()
         self.information_share = information_share
-        self.transactions = set()
+        self.transactions = []
 
 
     def new_transaction(self, transaction: Transaction, payment_api: PaymentAPI):
-        self.transactions.add(transaction)
+        self.transactions.append(transaction)
 
 
     def new_reward(self, reward: float, payment_api, rewarded_id):
@@ -0,0 +1,380 @@
+import random
+import numpy as np
+
+from helpers import random_walk
+from helpers.running_statistics import RunningStatistics
+from helpers.utils import CommunicationState
+from model.behavior import State
+from model.navigation import Location, Target
+from model.payment import ArrayPaymentDB, Transaction
+from model.strategy import PurchasedTarget
+
+
+# snapshot of the state of an Environment, as a flat dict of numpy arrays (see Environment.snapshot):
+# robots are rows of the agent_*, behavior_* and navigation_* arrays (in population order),
+# variable length data (pending information, spawns, stakes, transactions,...) are tables of rows.
+# Everything which is rebuilt from the config (parameters, noise, neighbor grid,...) is not saved.
+SNAPSHOT_VERSION = 1
+LOCATIONS = list(Location)
+SENSORS = [Location.FOOD, Location.NEST, "FRONT", "RIGHT", "BACK", "LEFT"]
+TRACE_LENGTH = 100
+TRANSACTION_TYPES = ["attempted", "validated", "completed", "combined"]
+
+
+def age_arrays(ages):
+    """
+    ages of targets as float (NaN for None), with a flag for the integer ones (restored as int)
+    """
+    return np.array([np.nan if age is None else age for age in ages], dtype=float), \
+           np.array([isinstance(age, (int, np.integer)) for age in ages], dtype=bool)
+
+
+def age_value(age, is_int):
+    if np.isnan(age):
+        return None
+    return int(age) if is_int else float(age)
+
+
+def targets_state(prefix, targets):
+    """
+    :param targets: Target (or PurchasedTarget) objects
+    """
+    ages, ages_int = age_arrays([target.age for target in targets])
+    return {f"{prefix}_distance": np.array([np.full(2, np.nan) if target.relative_distance is None
+                                            else target.relative_distance for target in targets],
+                                           dtype=float).reshape(len(targets), 2),
+            f"{prefix}_age": ages,
+            f"{prefix}_age_int": ages_int,
+            f"{prefix}_valid": np.array([getattr(target, "valid", False) for target in targets], dtype=bool)}
+
+
+def restore_target(target, state, prefix, i):
+    distance = state[f"{prefix}_distance"][i]
+    target.relative_distance = None if np.isnan(distance).any() else distance.copy()
+    target.age = age_value(state[f"{prefix}_age"][i], state[f"{prefix}_age_int"][i])
+    if isinstance(target, Target):
+        target.valid = bool(state[f"{prefix}_valid"][i])
+    return target
+
+
+def rng_state():
+    """
+    states of the random module, of the numpy global generator (BenchmarkBehavior)
+    and of the random walk sampler
+    """
+    version, internal_state, gauss_next = random.getstate()
+    _, keys, position, has_gauss, cached_gaussian = np.random.get_state()
+    return {"random_version": np.array(version),
+            "random_state": np.array(internal_state, dtype=np.int64),
+            "random_gauss_next": np.array(np.nan if gauss_next is None else gauss_next),
+            "numpy_random_keys": keys,
+            "numpy_random_position": np.array([position, has_gauss]),
+            "numpy_random_cached_gaussian": np.array(cached_gaussian),
+            **random_walk.get_state()}
+
+
+def restore_rng_state(state):
+    gauss_next = float(state["random_gauss_next"])
+    random.setstate((int(state["random_version"]), tuple(state["random_state"].tolist()),
+                     None if np.isnan(gauss_next) else gauss_next))
+    position, has_gauss = state["numpy_random_position"].tolist()
+    np.random.set_state(("MT19937", state["numpy_random_keys"], position, has_gauss,
+                         float(state["numpy_random_cached_gaussian"])))
+    random_walk.set_state(state)
+
+
+def streams_state(environment):
+    """
+    rng streams (see helpers.rng): the one of the environment, then the ones of the robots,
+    prefetched draws as padded rows
+    """
+    if environment.random_streams is None:
+        return {}
+    streams = [environment.random_streams.environment] + [bot.random_stream for bot in environment.population]
+    states = [stream.get_state() for stream in streams]
+    block_size = environment.random_streams.block_size
+    draws = {}
+    for k, kind in ((1, "uniform"), (2, "normal")):
+        draws[f"stream_{kind}"] = np.zeros((len(states), block_size))
+        for i, state in enumerate(states):
+            draws[f"stream_{kind}"][i, :len(state[k])] = state[k]
+        draws[f"stream_{kind}_length"] = np.array([len(state[k]) for state in states], dtype=int)
+    return {"stream_generator": np.array([state[0] for state in states]), **draws}
+
+
+def restore_streams(environment, state):
+    if environment.random_streams is None:
+        return
+    streams = [environment.random_streams.environment] + [bot.random_stream for bot in environment.population]
+    for i, stream in enumerate(streams):
+        stream.set_state(str(state["stream_generator"][i]),
+                         state["stream_uniform"][i, :state["stream_uniform_length"][i]].tolist(),
+                         state["stream_normal"][i, :state["stream_normal_length"][i]].tolist())
+
+
+def agents_state(population):
+    n = len(population)
+    traces = np.zeros((n, TRACE_LENGTH))
+    for i, bot in enumerate(population):
+        traces[i, :len(bot.trace)] = list(bot.trace)
+    return {"agent_pos": np.array([bot.pos for bot in population], dtype=float).reshape(n, 2),
+            "agent_orientation": np.array([bot.orientation for bot in population], dtype=float),
+            "agent_noise_mu": np.array([bot.noise_mu for bot in population], dtype=float),
+            "agent_noise_sd": np.array([getattr(bot, "noise_sd", np.nan) for bot in population], dtype=float),
+            "agent_dr": np.array([bot.dr for bot in population], dtype=float).reshape(n, 2),
+            "agent_items_collected": np.array([bot.items_collected for bot in population], dtype=int),
+            "agent_carries_food": np.array([bot.carries_food() for bot in population], dtype=bool),
+            "agent_time_since_last_comm": np.array([bot._time_since_last_comm for bot in population], dtype=int),
+            "agent_comm_state": np.array([bot.comm_state.value for bot in population], dtype=int),
+            "agent_levi_counter": np.array([bot.levi_counter for bot in population], dtype=int),
+            "agent_trace": traces,
+            "agent_trace_length": np.array([len(bot.trace) for bot in population], dtype=int),
+            "agent_sensors": np.array([[bool(bot.sensors.get(sensor, False)) for sensor in SENSORS]
+                                       for bot in population], dtype=bool).reshape(n, len(SENSORS)),
+            "agent_has_sensors": np.array([bool(bot.sensors) for bot in population], dtype=bool)}
+
+
+def restore_agents(population, state):
+    for i, bot in enumerate(population):
+        bot.pos = state["agent_pos"][i].copy()
+        bot.orientation = float(state["agent_orientation"][i])
+        bot.noise_mu = float(state["agent_noise_mu"][i])
+        if not np.isnan(state["agent_noise_sd"][i]):
+            bot.noise_sd = float(state["agent_noise_sd"][i])
+        bot.dr = state["agent_dr"][i].copy()
+        bot.items_collected = int(state["agent_items_collected"][i])
+        bot._carries_food = bool(state["agent_carries_food"][i])
+        bot._time_since_last_comm = int(state["agent_time_since_last_comm"][i])
+        bot.comm_state = CommunicationState(int(state["agent_comm_state"][i]))
+        bot.levi_counter = int(state["agent_levi_counter"][i])
+        bot.trace.clear()
+        bot.trace.extend(state["agent_trace"][i, :state["agent_trace_length"][i]].tolist())
+        bot.sensors = {sensor: bool(sensed) for sensor, sensed in zip(SENSORS, state["agent_sensors"][i])} \
+                        if state["agent_has_sensors"][i] else {}
+
+
+def behaviors_state(population):
+    """
+    state, movement and navigation table of the behaviors, with the pending information
+    of the sceptical ones and the purchases of the strategies which keep them
+    """
+    n = len(population)
+    behaviors = [bot.behavior for bot in population]
+    state = {"behavior_state": np.array([behavior.state.value for behavior in behaviors], dtype=int),
+             "behavior_dr": np.array([behavior.dr for behavior in behaviors], dtype=float).reshape(n, 2),
+             "behavior_id": np.array([behavior.id for behavior in behaviors], dtype=int),
+             **targets_state("navigation", [behavior.navigation_table.entries[location]
+                                            for behavior in behaviors for location in LOCATIONS])}
+    pending, pending_targets = [], []
+    purchased, purchased_targets = [], []
+    for i, behavior in enumerate(behaviors):
+        for location in LOCATIONS:
+            for seller_id, target in getattr(behavior, "pending_information", {}).get(location, {}).items():
+                pending.append([i, location.value, seller_id])
+                pending_targets.append(target)
+        if getattr(behavior.strategy, "initialized", False):
+            for location, targets in behavior.strategy.purchased_targets.items():
+                for seller_id, target in targets.items():
+                    purchased.append([i, location.value, seller_id])
+                    purchased_targets.append(target)
+    state["pending_information"] = np.array(pending, dtype=int).reshape(len(pending), 3)
+    state.update(targets_state("pending", pending_targets))
+    state["purchased_targets"] = np.array(purchased, dtype=int).reshape(len(purchased), 3)
+    state.update(targets_state("purchased", purchased_targets))
+    return state
+
+
+def restore_behaviors(population, state):
+    behaviors = [bot.behavior for bot in population]
+    for i, behavior in enumerate(behaviors):
+        behavior.state = State(int(state["behavior_state"][i]))
+        behavior.dr = state["behavior_dr"][i].copy()
+        behavior.id = int(state["behavior_id"][i])
+        for j, location in enumerate(LOCATIONS):
+            behavior.navigation_table.entries[location] = restore_target(Target(location), state, "navigation",
+                                                                         i * len(LOCATIONS) + j)
+        if hasattr(behavior, "pending_information"):
+            behavior.pending_information = {location: {} for location in Location}
+    for k, (i, location, seller_id) in enumerate(state["pending_information"].tolist()):
+        behaviors[i].pending_information[Location(location)][seller_id] = \
+            restore_target(Target(Location(location)), state, "pending", k)
+    for k, (i, location, seller_id) in enumerate(state["purchased_targets"].tolist()):
+        strategy = behaviors[i].strategy
+        if not strategy.initialized:
+            strategy.purchased_targets = {Location.NEST: {}, Location.FOOD: {}}
+            strategy.initialized = True
+        strategy.purchased_targets[Location(location)][seller_id] = \
+            restore_target(PurchasedTarget(), state, "purchased", k)
+
+
+def running_statistics_state(prefix, statistics: RunningStatistics):
+    if statistics is None:
+        return {}
+    return {f"{prefix}_values": np.array([list(statistics.values.keys()), list(statistics.values.values())],
+                                         dtype=float).reshape(2, len(statistics.values)),
+            f"{prefix}_sum": np.array([statistics._sum, statistics._compensation]),
+            f"{prefix}_min_heap": np.array(statistics._min_heap, dtype=float).reshape(len(statistics._min_heap), 2),
+            f"{prefix}_max_heap": np.array(statistics._max_heap, dtype=float).reshape(len(statistics._max_heap), 2)}
+
+
+def restore_running_statistics(prefix, statistics: RunningStatistics, state):
+    if statistics is None:
+        return
+    keys, values = state[f"{prefix}_values"]
+    statistics.values = dict(zip(keys.astype(int).tolist(), values.tolist()))
+    statistics._sum, statistics._compensation = state[f"{prefix}_sum"].tolist()
+    statistics._min_heap = [(value, int(key)) for value, key in state[f"{prefix}_min_heap"].tolist()]
+    statistics._max_heap = [(value, int(key)) for value, key in state[f"{prefix}_max_heap"].tolist()]
+
+
+def payment_database_state(payment_database):
+    """
+    wallets (rewards, charity, ages, transactions counters, stakes, history), running aggregates
+    and the pending transactions and pots of the payment systems
+    """
+    robot_ids = list(payment_database.database)
+    n = len(robot_ids)
+    array_ledger = isinstance(payment_database, ArrayPaymentDB)
+    if array_ledger:
+        stakes = [(staker_id, buyer_id, amount) for staker_id, stake in enumerate(payment_database.stakes)
+                  for buyer_id, amount in stake.items()]
+        charity, wallet_ages = payment_database.charity, payment_database.wallet_ages
+    else:
+        stakes = [(staker_id, buyer_id, amount) for staker_id in robot_ids
+                  for buyer_id, amount in payment_database.database[staker_id]["stake"].items()]
+        charity = [payment_database.database[robot_id]["charity"] for robot_id in robot_ids]
+        wallet_ages = [payment_database.database[robot_id]["wallet_age"] for robot_id in robot_ids]
+    systems = [payment_database.database[robot_id]["payment_system"] for robot_id in robot_ids]
+    transactions = [(owner, t) for owner, system in enumerate(systems) for t in system.transactions]
+    state = {"payment_reward": payment_database.get_rewards(robot_ids),
+             "payment_charity": np.array(charity, dtype=float),
+             "payment_wallet_age": np.array(wallet_ages, dtype=int),
+             "payment_transactions": np.array([[payment_database.get_transactions(type, robot_id)
+                                                for robot_id in robot_ids] for type in TRANSACTION_TYPES],
+                                              dtype=np.int64).reshape(len(TRANSACTION_TYPES), n, n),
+             "payment_stakes": np.array([[staker_id, buyer_id] for staker_id, buyer_id, _ in stakes],
+                                        dtype=int).reshape(len(stakes), 2),
+             "payment_stake_amounts": np.array([amount for _, _, amount in stakes], dtype=float),
+             "payment_history": np.array([[np.nan if value is None else value
+                                           for value in payment_database.get_history(robot_id)]
+                                          for robot_id in robot_ids], dtype=float).reshape(n, payment_database.history_span),
+             "payment_completed_log": np.array(payment_database.completed_transactions_log,
+                                               dtype=int).reshape(len(payment_database.completed_transactions_log), 3),
+             "payment_pot": np.array([getattr(system, "pot_amount", np.nan) for system in systems], dtype=float),
+             "payment_system_transactions": np.array([[owner, t.buyer_id, t.seller_id, t.location.value, t.timestep]
+                                                      for owner, t in transactions],
+                                                     dtype=int).reshape(len(transactions), 5),
+             "payment_system_angles": np.array([t.relative_angle for _, t in transactions], dtype=float),
+             "payment_rank_indexes": np.array(list(payment_database.rank_indexes), dtype=str),
+             "payment_stake_totals": np.array(list(payment_database.stake_totals), dtype=int),
+             **running_statistics_state("payment_reward_statistics", payment_database.reward_statistics),
+             **running_statistics_state("payment_wealth_statistics", payment_database.wealth_statistics)}
+    return state
+
+
+def restore_payment_database(payment_database, state):
+    robot_ids = list(payment_database.database)
+    if isinstance(payment_database, ArrayPaymentDB):
+        payment_database.rewards = state["payment_reward"].copy()
+        payment_database.charity = state["payment_charity"].copy()
+        payment_database.wallet_ages = state["payment_wallet_age"].copy()
+        for type, counters in zip(TRANSACTION_TYPES, state["payment_transactions"]):
+            payment_database.transactions[type] = counters.astype(np.int32)
+        payment_database.stakes = [{} for _ in robot_ids]
+        for (staker_id, buyer_id), amount in zip(state["payment_stakes"].tolist(),
+                                                 state["payment_stake_amounts"].tolist()):
+            payment_database.stakes[staker_id][buyer_id] = amount
+    else:
+        for i, robot_id in enumerate(robot_ids):
+            wallet = payment_database.database[robot_id]
+            wallet["reward"] = float(state["payment_reward"][i])
+            wallet["charity"] = float(state["payment_charity"][i])
+            wallet["wallet_age"] = int(state["payment_wallet_age"][i])
+            for type, counters in zip(TRANSACTION_TYPES, state["payment_transactions"]):
+                wallet[f"n_{type}_transactions"] = counters[i].tolist()
+        for (staker_id, buyer_id), amount in zip(state["payment_stakes"].tolist(),
+                                                 state["payment_stake_amounts"].tolist()):
+            payment_database.database[staker_id]["stake"][buyer_id] = amount
+    for i, robot_id in enumerate(robot_ids):
+        payment_database.database[robot_id]["history"] = [None if np.isnan(value) else value
+                                                           for value in state["payment_history"][i].tolist()]
+        system = payment_database.database[robot_id]["payment_system"]
+        system.transactions.clear()
+        if hasattr(system, "pot_amount"):
+            system.pot_amount = float(state["payment_pot"][i])
+    payment_database.completed_transactions_log = state["payment_completed_log"].tolist()
+    # NOTE pending transactions are lists, restored in the order they were added
+    for (owner, buyer_id, seller_id, location, timestep), angle in zip(state["payment_system_transactions"].tolist(),
+                                                                       state["payment_system_angles"].tolist()):
+        payment_database.database[robot_ids[owner]]["payment_system"].transactions.append(
+            Transaction(buyer_id, seller_id, Location(location), angle, timestep))
+    restore_running_statistics("payment_reward_statistics", payment_database.reward_statistics, state)
+    restore_running_statistics("payment_wealth_statistics", payment_database.wealth_statistics, state)
+    payment_database.stake_totals = {robot_id: payment_database.get_stake(robot_id)
+                                     for robot_id in state["payment_stake_totals"].tolist()}
+    payment_database.rank_indexes = {}
+    for index_name in state["payment_rank_indexes"].tolist():
+        payment_database.get_rank_index(index_name)
+
+
+def market_state(market):
+    state = {}
+    if hasattr(market, "supply_history"):
+        state.update(market_supply_history=market.supply_history,
+                     market_supply=np.array([market.history_index, market.supply_during_current_step]))
+    if hasattr(market, "robot_times"):
+        state["market_robot_times"] = np.array(list(market.robot_times.items()),
+                                               dtype=int).reshape(len(market.robot_times), 2)
+    return state
+
+
+def restore_market(market, state):
+    if hasattr(market, "supply_history"):
+        market.supply_history = state["market_supply_history"].copy()
+        market.history_index, market.supply_during_current_step = state["market_supply"].tolist()
+        market._price = market.compute_price()
+    if hasattr(market, "robot_times"):
+        market.robot_times.clear()
+        market.robot_times.update(dict(state["market_robot_times"].tolist()))
+
+
+def environment_state(environment):
+    """
+    :return: snapshot of the environment (see SNAPSHOT_VERSION), RNG states included
+    """
+    spawns = [(location, robot_id, pos) for location in LOCATIONS
+              for robot_id, pos in environment.foraging_spawns[location].items()]
+    return {"snapshot_version": np.array(SNAPSHOT_VERSION),
+            "environment_timestep": np.array(environment.timestep),
+            "foraging_spawns": np.array([[location.value, robot_id] for location, robot_id, _ in spawns],
+                                        dtype=int).reshape(len(spawns), 2),
+            "foraging_spawns_pos": np.array([pos for _, _, pos in spawns], dtype=float).reshape(len(spawns), 2),
+            **agents_state(environment.population),
+            **behaviors_state(environment.population),
+            **payment_database_state(environment.payment_database),
+            **market_state(environment.market),
+            **rng_state(),
+            **streams_state(environment)}
+
+
+def restore_environment(environment, state):
+    """
+    restores a snapshot of environment_state on an environment built from the same config
+    (newcomers included): the neighbor grid is rebuilt from the restored positions
+    """
+    if int(state["snapshot_version"]) != SNAPSHOT_VERSION:
+        raise ValueError(f"snapshot version {int(state['snapshot_version'])} not supported")
+    if len(environment.population) != len(state["agent_pos"]):
+        raise ValueError(f"snapshot of {len(state['agent_pos'])} robots, the environment has "
+                         f"{len(environment.population)}")
+    environment.timestep = int(state["environment_timestep"])
+    environment.foraging_spawns = environment.create_spawn_dicts()
+    for (location, robot_id), pos in zip(state["foraging_spawns"].tolist(), state["foraging_spawns_pos"]):
+        environment.foraging_spawns[Location(location)][robot_id] = pos.copy()
+    restore_agents(environment.population, state)
+    restore_behaviors(environment.population, state)
+    restore_payment_database(environment.payment_database, state)
+    restore_market(environment.market, state)
+    restore_rng_state(state)
+    restore_streams(environment, state)
+    environment.neighbor_grid.rebuild(environment.population)
@@ -0,0 +1,85 @@
+from math import atan2
+import numpy as np
+
+from helpers.utils import rotation_matrices
+
+
+class SwarmState:
+    """
+    struct-of-arrays storage of the physical state of the robots, used by the
+    vectorized engine: row i of each array belongs to the robot with index i.
+
+    robots (VectorizedAgent) read and write their own row through properties, while
+    the movement of the whole swarm is computed once per tick by move().
+    Arrays grow when robots are added (e.g. newcomers), robots[i] is the robot of row i.
+    The swarm can be shared by the environments of an ensemble (see EnsembleController):
+    their robots are moved together.
+
+    NOTE: move() gives the same results of Agent.move, robot by robot:
+        rotations use the same matrices of helpers.utils.rotate and
+        orientations are computed with math.atan2 (np.arctan2 differs in the last bits)
+    """
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.size = 0
+        self.pos = np.zeros((0, 2))
+        self.orientation = np.zeros(0)
+        self.dr = np.zeros((0, 2))
+        self.noise_mu = np.zeros(0)
+        self.noise_sd = np.zeros(0)
+        self.noise_angle = np.zeros(0)
+        self.radius = np.zeros(0)
+        self.carries_food = np.zeros(0, dtype=bool)
+        self.moving = np.zeros(0, dtype=bool)
+        self.robots = []
+
+
+    def add_robot(self, radius, robot=None):
+        """
+        appends an (empty) row for a new robot, returns its index
+        """
+        index = self.size
+        self.robots.append(robot)
+        self.size += 1
+        self.pos = np.vstack((self.pos, np.zeros((1, 2))))
+        self.orientation = np.append(self.orientation, 0.)
+        self.dr = np.vstack((self.dr, np.zeros((1, 2))))
+        self.noise_mu = np.append(self.noise_mu, 0.)
+        self.noise_sd = np.append(self.noise_sd, 0.)
+        self.noise_angle = np.append(self.noise_angle, 0.)
+        self.radius = np.append(self.radius, radius)
+        self.carries_food = np.append(self.carries_food, False)
+        self.moving = np.append(self.moving, False)
+        return index
+
+
+    def request_move(self, index, dr, noise_angle):
+        """
+        schedules the movement of a robot for the next call of move()
+        """
+        self.dr[index] = dr
+        self.noise_angle[index] = noise_angle
+        self.moving[index] = True
+
+
+    def move(self):
+        """
+        applies the requested movements: rotation of dr by orientation and noise angle,
+        new orientation from the resulting vector and clamping to the map.
+
+        :return: indexes of the robots which moved
+        """
+        moving = np.flatnonzero(self.moving)
+        if moving.size == 0:
+            return moving
+        wanted_movement = np.matmul(rotation_matrices(self.orientation[moving]), self.dr[moving, :, None])
+        noisy_movement = np.matmul(rotation_matrices(self.noise_angle[moving]), wanted_movement)[:, :, 0]
+        angles = np.array(list(map(atan2, noisy_movement[:, 1].tolist(), noisy_movement[:, 0].tolist())))
+        self.orientation[moving] = (360 * angles / (2 * np.pi)) % 360
+        radius = self.radius[moving, None]
+        self.pos[moving] = np.clip(self.pos[moving] + noisy_movement,
+                                   radius,
+                                   np.array([self.width, self.height]) - radius)
+        self.moving[moving] = False
+        return moving
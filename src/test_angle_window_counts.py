@@ -0,0 +1,83 @@
+import random
+import numpy as np
+
+from model.navigation import Location
+from model.payment import angle_window_counts, OutlierPenalisationPaymentSystem, Transaction
+
+'''
+compares angle_window_counts and calculate_shares_mapping with the O(k^2) reference
+on random pools of angles: duplicates, 0/360, negative zeros and angles around the window edge
+
+usage: python3 test_angle_window_counts.py [N_POOLS]
+'''
+EDGE_ANGLES = [0.0, -0.0, 360.0, 359.99, 1e-9, 360 - 1e-9, 360 - 1e-12, (-5.7e-16) % 360, 180.0]
+
+
+def normalised(angles):
+    """
+    angles in [0, 360), as angle_window_counts
+    """
+    angles = np.asarray(angles, dtype=float) % 360
+    angles[angles >= 360] = 0
+    return angles.tolist()
+
+
+def reference_counts(angles, angle_window):
+    angles = np.asarray(angles, dtype=float)
+    return [int((((angles - a) % 360) < angle_window).sum() + (((a - angles) % 360) < angle_window).sum() - 1)
+            for a in angles]
+
+
+def random_pool(rng, angle_window):
+    k = rng.randint(1, 40)
+    pool = []
+    for _ in range(k):
+        kind = rng.random()
+        if kind < 0.3 and pool:
+            pool.append(rng.choice(pool))
+        elif kind < 0.5:
+            pool.append(rng.choice(EDGE_ANGLES))
+        elif kind < 0.7 and pool:
+            # window edge from another angle of the pool
+            pool.append((rng.choice(pool) + rng.choice([-1, 1]) * angle_window
+                         + rng.choice([0.0, 1e-9, -1e-9])) % 360)
+        else:
+            pool.append(rng.random() * 360)
+    return pool
+
+
+def test_known_pool():
+    angles = [359.99, 0.0, 15.0, 15.0, 45.0, 360.0]
+    assert angle_window_counts(angles, 15) == reference_counts(angles, 15) == [3, 4, 3, 3, 1, 4]
+
+
+def test_random_pools(n_pools=3000, seed=0):
+    rng = random.Random(seed)
+    for _ in range(n_pools):
+        angle_window = rng.choice([1, 15, 30, 45, 90, 180, 360, 12.5])
+        pool = random_pool(rng, angle_window)
+        # NOTE the reference is not circular on raw 360.0 (rounding of a-360.0) nor across 0/360 for angles
+        #   closer than ulp(360): it is compared on the angles normalised in [0, 360)
+        assert angle_window_counts(pool, angle_window) == reference_counts(normalised(pool), angle_window), \
+            (pool, angle_window)
+
+
+def test_shares_mapping(n_pools=300, seed=1):
+    rng = random.Random(seed)
+    for _ in range(n_pools):
+        payment_system = OutlierPenalisationPaymentSystem(information_share=0.5, reputation_stake=False,
+                                                          reputation_metric="reward",
+                                                          angle_window=rng.choice([15, 30, 45]))
+        for angle in normalised(random_pool(rng, payment_system.angle_window)):
+            payment_system.transactions.append(Transaction(rng.randint(0, 5), rng.randint(0, 9),
+                                                           rng.choice(list(Location)), angle, 0))
+        assert payment_system.calculate_shares_mapping() == payment_system.calculate_shares_mapping_reference()
+
+
+if __name__ == "__main__":
+    import sys
+    n_pools = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    test_known_pool()
+    test_random_pools(n_pools)
+    test_shares_mapping(n_pools // 10)
+    print("angle_window_counts: same counts of the reference")
@@ -0,0 +1,123 @@
+import random
+
+from helpers.utils import InsufficientFundsException
+from model.navigation import Location
+from model.payment import PaymentDB, ArrayPaymentDB, Transaction
+
+'''
+applies the same random operations (rewards, costs, transfers, stakes, transactions, payments, newcomers)
+to a PaymentDB and an ArrayPaymentDB: every query must give the same results
+
+usage: python3 test_array_payment_db.py [N_SEQUENCES]
+'''
+PAYMENT_SYSTEMS = [{"class": "OutlierPenalisationPaymentSystem",
+                    "parameters": {"information_share": 0.5, "reputation_stake": False, "reputation_metric": "h"}},
+                   {"class": "DelayedPaymentPaymentSystem",
+                    "parameters": {"information_share": 0.5, "reputation_stake": False, "reputation_metric": "h"}}]
+TRANSACTION_TYPES = ["attempted", "validated", "completed", "combined", "A", "v", "X"]
+
+
+def amount(rng):
+    """
+    multiples of 0.25 (exact sums, ties of rewards) or any float
+    """
+    return rng.randint(0, 8) * 0.25 if rng.random() < 0.5 else rng.random() * 2
+
+
+def apply(payment_db, operation):
+    """
+    :return: name of the exception raised by the operation, None if it succeeded
+    """
+    name, args = operation
+    try:
+        if name == "record_transaction" and args[0] in ("completed", "C", "c"):
+            buyer_id, seller_id, location, angle, timestep = args[1:]
+            payment_db.record_transaction(args[0], buyer_id, seller_id,
+                                          Transaction(buyer_id, seller_id, location, angle, timestep))
+        elif name == "add_newcomers":
+            payment_db.add_newcomers(*args)
+        else:
+            getattr(payment_db, name)(*args)
+    except InsufficientFundsException:
+        return "InsufficientFundsException"
+    return None
+
+
+def random_operation(rng, n_robots, payment_system_params, timestep):
+    robot_id, other_id = rng.randrange(n_robots), rng.randrange(n_robots)
+    kind = rng.random()
+    if kind < 0.1:
+        return "pay_reward", (robot_id, amount(rng))
+    elif kind < 0.2:
+        return "apply_cost", (robot_id, amount(rng))
+    elif kind < 0.3:
+        return "apply_gains", (robot_id, amount(rng))
+    elif kind < 0.35:
+        return "transfer", (robot_id, other_id, amount(rng))
+    elif kind < 0.45:
+        return "increment_stake", (robot_id, other_id, amount(rng) / 25)
+    elif kind < 0.5:
+        return "reset_stake", (robot_id, other_id)
+    elif kind < 0.55:
+        return "increment_wallet_age", (robot_id,)
+    elif kind < 0.75:
+        transaction_type = rng.choice(TRANSACTION_TYPES)
+        if transaction_type == "completed":
+            return "record_transaction", (transaction_type, robot_id, other_id, rng.choice(list(Location)),
+                                          rng.choice([0., 15., 45., 359.5, rng.random() * 360]), timestep)
+        return "record_transaction", (transaction_type, robot_id, other_id)
+    elif kind < 0.85:
+        return "pay_creditors", (robot_id, rng.choice([0.5, 1, amount(rng)]))
+    elif kind < 0.86:
+        return "add_newcomers", (list(range(n_robots, n_robots + rng.randint(1, 3))), payment_system_params)
+    return "update_history", (robot_id, amount(rng) - 1)
+
+
+def queries(payment_db):
+    robot_ids = list(payment_db.database)
+    return {"rewards": payment_db.get_rewards(robot_ids).tolist(),
+            "reward": [payment_db.get_reward(robot_id) for robot_id in robot_ids],
+            "stake": [payment_db.get_stake(robot_id) for robot_id in robot_ids],
+            "wealth": [payment_db.get_wealth(robot_id) for robot_id in robot_ids],
+            "wallet_age": [payment_db.get_wallet_age(robot_id) for robot_id in robot_ids],
+            "history": [payment_db.get_history(robot_id) for robot_id in robot_ids],
+            "transactions": [[payment_db.get_transactions(transaction_type, robot_id) for robot_id in robot_ids]
+                             for transaction_type in ("attempted", "validated", "completed", "combined")],
+            "total_reward": payment_db.get_total_reward(),
+            "total_wealth": payment_db.get_total_wealth(),
+            "highest_reward": float(payment_db.get_highest_reward()),
+            "lowest_reward": float(payment_db.get_lowest_reward()),
+            "mean_reward": float(payment_db.get_mean_reward()),
+            "sorted_reward": list(payment_db.get_sorted_database("reward")),
+            "sorted_total": list(payment_db.get_sorted_database("total").items()),
+            "ranking": [[payment_db.get_reward_ranking(robot_id, method, ties) for robot_id in robot_ids]
+                        for method in ("reward", "total") for ties in ("ordinal", "min")],
+            "top": [payment_db.get_top_fraction(fraction, method)
+                    for method in ("reward", "total") for fraction in (0.1, 0.5, 1)],
+            "n_wallets": payment_db.get_number_of_wallets()}
+
+
+def test_random_operations(n_sequences=40, n_operations=400, seed=0):
+    rng = random.Random(seed)
+    for sequence in range(n_sequences):
+        payment_system_params = {"initial_reward": rng.choice([0, 1]),
+                                 "running_aggregates": sequence % 2 == 1,
+                                 **rng.choice(PAYMENT_SYSTEMS)}
+        n_robots = rng.randint(1, 12)
+        payment_dbs = [PaymentDB(list(range(n_robots)), payment_system_params),
+                       ArrayPaymentDB(list(range(n_robots)), payment_system_params)]
+        for timestep in range(n_operations):
+            operation = random_operation(rng, n_robots, payment_system_params, timestep)
+            outcomes = [apply(payment_db, operation) for payment_db in payment_dbs]
+            assert outcomes[0] == outcomes[1], (sequence, timestep, operation)
+            if operation[0] == "add_newcomers":
+                n_robots += len(operation[1][0])
+            if timestep % 20 == 0 or operation[0] == "add_newcomers":
+                assert queries(payment_dbs[0]) == queries(payment_dbs[1]), (sequence, timestep, operation)
+        assert queries(payment_dbs[0]) == queries(payment_dbs[1]), sequence
+
+
+if __name__ == "__main__":
+    import sys
+    test_random_operations(int(sys.argv[1]) if len(sys.argv) > 1 else 40)
+    print("ArrayPaymentDB: same results of PaymentDB")
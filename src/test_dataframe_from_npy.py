@@ -0,0 +1,40 @@
+import tempfile
+from os.path import join
+from pathlib import Path
+import numpy as np
+
+from data_analysis import dataframe_from_csv
+
+'''
+loads a .npy evolution output (see ResultWriter) with dataframe_from_csv, selecting the robots of a noise group
+
+usage: python3 test_dataframe_from_npy.py
+'''
+# 4 honest robots (2 good, 2 bad, average saboteurs) and 2 saboteurs, parameters values keep their dots
+FILENAME = "4n_waaCS_NP_NRS_90LIA_0.051NMU_0.1NRANG_avgSAB.npy"
+NOISE_GROUPS = {"all": [0, 1, 2, 3, 4, 5], "good": [0, 1], "bad": [2, 3], "saboteur": [4, 5]}
+
+
+def write_evolution(data_folder, n_runs=2, n_ticks=3, n_robots=6):
+    """
+    value of robot r at tick t of run i: 100*i + 10*t + r
+    """
+    Path(join(data_folder, "rewards_evolution")).mkdir(parents=True)
+    runs, ticks, robots = np.meshgrid(np.arange(n_runs), np.arange(n_ticks), np.arange(n_robots), indexing="ij")
+    np.save(join(data_folder, "rewards_evolution", FILENAME), (100*runs + 10*ticks + robots).astype(float))
+    np.save(join(data_folder, "rewards_evolution", FILENAME.replace(".npy", "_ticks.npy")), np.arange(n_ticks) * 100)
+
+
+def test_noise_groups():
+    with tempfile.TemporaryDirectory() as data_folder:
+        write_evolution(data_folder)
+        for noise_group, robots in NOISE_GROUPS.items():
+            df = dataframe_from_csv(FILENAME, data_folder, "rewards", noise_group=noise_group)
+            assert df.values.tolist() == [[20.0 + r for r in robots], [120.0 + r for r in robots]], noise_group
+            df = dataframe_from_csv(join(data_folder, "rewards_evolution", FILENAME), noise_group=noise_group)
+            assert df.shape == (2, len(robots)), noise_group
+
+
+if __name__ == "__main__":
+    test_noise_groups()
+    print("dataframe_from_csv: noise groups of .npy outputs selected")
@@ -0,0 +1,83 @@
+import random
+from math import ceil
+
+from helpers.running_statistics import RankIndex
+from model.payment import PaymentDB
+from test_array_payment_db import PAYMENT_SYSTEMS, apply, random_operation
+
+'''
+random updates of a RankIndex (ties, new keys) against a ranking by sort;
+rankings of a PaymentDB against the order of get_sorted_database, with newcomers
+
+usage: python3 test_rank_index.py
+'''
+
+
+def sorted_ranking(values):
+    """
+    keys by highest value first, equal values by key
+    """
+    return sorted(values, key=lambda key: (-values[key], key))
+
+
+def test_random_updates(n_sequences=20, n_updates=1000, seed=0):
+    rng = random.Random(seed)
+    for sequence in range(n_sequences):
+        index = RankIndex()
+        values = {}
+        n_keys = rng.randint(1, 20)
+        for update in range(n_updates):
+            key = rng.randrange(n_keys)
+            # few distinct values: many ties
+            values[key] = rng.randint(-3, 3) * 0.5 if rng.random() < 0.7 else rng.random()
+            index.update(key, values[key])
+            if rng.random() < 0.02:
+                # newcomers
+                n_keys += rng.randint(1, 3)
+            ranking = sorted_ranking(values)
+            assert len(index) == len(values)
+            for key in values:
+                assert index.rank(key) == ranking.index(key), (sequence, update, key)
+                assert index.rank(key, "min") == sum(value > values[key] for value in values.values()), \
+                    (sequence, update, key)
+            for fraction in (0, 0.1, 0.25, 0.5, 1):
+                assert index.top(fraction) == ranking[:ceil(fraction * len(ranking))], (sequence, update, fraction)
+
+
+def test_unknown_ties():
+    index = RankIndex()
+    index.update(0, 1.)
+    try:
+        index.rank(0, "max")
+    except ValueError:
+        return
+    assert False, "unknown ties method accepted"
+
+
+def test_payment_db_rankings(n_sequences=20, n_operations=400, seed=1):
+    rng = random.Random(seed)
+    for sequence in range(n_sequences):
+        payment_system_params = {"initial_reward": rng.choice([0, 1]),
+                                 "running_aggregates": sequence % 2 == 1,
+                                 **rng.choice(PAYMENT_SYSTEMS)}
+        n_robots = rng.randint(1, 12)
+        payment_db = PaymentDB(list(range(n_robots)), payment_system_params)
+        for timestep in range(n_operations):
+            operation = random_operation(rng, n_robots, payment_system_params, timestep)
+            apply(payment_db, operation)
+            if operation[0] == "add_newcomers":
+                n_robots += len(operation[1][0])
+            for method in ("reward", "total"):
+                ranking = list(payment_db.get_sorted_database(method))
+                for robot_id in payment_db.database:
+                    assert payment_db.get_reward_ranking(robot_id, method) == ranking.index(robot_id), \
+                        (sequence, timestep, method, robot_id)
+                assert payment_db.get_top_fraction(0.5, method) == ranking[:ceil(0.5 * len(ranking))], \
+                    (sequence, timestep, method)
+
+
+if __name__ == "__main__":
+    test_random_updates()
+    test_unknown_ties()
+    test_payment_db_rankings()
+    print("RankIndex: same rankings of a sort")
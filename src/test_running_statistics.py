@@ -0,0 +1,94 @@
+import random
+import sys
+from math import fsum
+
+from helpers.running_statistics import RunningStatistics
+from model.payment import PaymentDB
+from test_array_payment_db import PAYMENT_SYSTEMS, apply, random_operation
+
+'''
+random updates of a RunningStatistics (repeated keys, mixed magnitudes, compactions) against
+the exact min, max and sum of its values; random operations of a PaymentDB with running aggregates
+against the same operations of a PaymentDB that scans the database
+
+usage: python3 test_running_statistics.py
+'''
+EPSILON = sys.float_info.epsilon
+
+
+def sum_error_bound(exact_sum, largest_sum, added, n_terms):
+    """
+    error bound of a compensated (Neumaier) sum: an ulp of the sum + n*eps^2*(sum of |terms|),
+    plus half an ulp of the sum rounded at each compaction (at most largest_sum).
+    a plain sum is off by up to n*eps*(sum of |terms|)
+    """
+    return 2 * EPSILON * (abs(exact_sum) + abs(largest_sum)) + 4 * n_terms * EPSILON ** 2 * added
+
+
+def random_value(rng):
+    magnitude = rng.choice([1e-6, 1, 1e3, 1e9])
+    return rng.choice([rng.randint(-4, 4) * 0.25, (rng.random() * 2 - 1) * magnitude])
+
+
+def test_random_updates(n_sequences=20, n_updates=2000, seed=0):
+    rng = random.Random(seed)
+    for sequence in range(n_sequences):
+        statistics = RunningStatistics()
+        values = {}
+        # every value added and removed by the updates (sum of |terms| and number of terms)
+        added = 0.
+        n_terms = 0
+        largest_sum = 0.
+        n_keys = rng.randint(1, 30)
+        for update in range(n_updates):
+            key = rng.randrange(n_keys)
+            if key in values:
+                added += abs(values[key])
+                n_terms += 1
+            values[key] = random_value(rng)
+            added += abs(values[key])
+            n_terms += 1
+            statistics.update(key, values[key])
+            exact_sum = fsum(values.values())
+            largest_sum = max(largest_sum, abs(exact_sum))
+            assert len(statistics) == len(values)
+            assert statistics.min() == min(values.values()), (sequence, update)
+            assert statistics.max() == max(values.values()), (sequence, update)
+            assert abs(statistics.sum() - exact_sum) <= sum_error_bound(exact_sum, largest_sum, added, n_terms), \
+                (sequence, update)
+            if rng.random() < 0.01:
+                n_keys += 1
+        # the heaps grow with every update: they must have been compacted
+        assert len(statistics._min_heap) <= RunningStatistics.COMPACTION_FACTOR * len(values) + 16
+        statistics.compact()
+        assert statistics.sum() == fsum(values.values()), sequence
+
+
+def test_payment_db_aggregates(n_sequences=20, n_operations=400, seed=1):
+    """
+    extremes must be the same, sums and means can differ in the last digits
+    """
+    rng = random.Random(seed)
+    for sequence in range(n_sequences):
+        payment_system_params = {"initial_reward": rng.choice([0, 1]), **rng.choice(PAYMENT_SYSTEMS)}
+        n_robots = rng.randint(1, 12)
+        payment_dbs = [PaymentDB(list(range(n_robots)), payment_system_params),
+                       PaymentDB(list(range(n_robots)), {**payment_system_params, "running_aggregates": True})]
+        for timestep in range(n_operations):
+            operation = random_operation(rng, n_robots, payment_system_params, timestep)
+            outcomes = [apply(payment_db, operation) for payment_db in payment_dbs]
+            assert outcomes[0] == outcomes[1], (sequence, timestep, operation)
+            if operation[0] == "add_newcomers":
+                n_robots += len(operation[1][0])
+            scan, running = payment_dbs
+            assert running.get_highest_reward() == scan.get_highest_reward(), (sequence, timestep)
+            assert running.get_lowest_reward() == scan.get_lowest_reward(), (sequence, timestep)
+            assert abs(running.get_total_reward() - scan.get_total_reward()) <= 1e-9, (sequence, timestep)
+            assert abs(running.get_mean_reward() - scan.get_mean_reward()) <= 1e-9, (sequence, timestep)
+            assert abs(running.get_total_wealth() - scan.get_total_wealth()) <= 1e-9, (sequence, timestep)
+
+
+if __name__ == "__main__":
+    test_random_updates()
+    test_payment_db_aggregates()
+    print("RunningStatistics: same extremes and sums of the values")
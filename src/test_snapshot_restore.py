@@ -0,0 +1,72 @@
+import os
+import tempfile
+from os.path import join
+
+from controllers.main_controller import MainController, Configuration
+
+'''
+saves a snapshot of a run at tick T, restores it on a new controller and finishes the run:
+rewards and items collected must be the same of the uninterrupted run, in both rng modes
+
+usage: python3 test_snapshot_restore.py
+'''
+CONFIG_FILE = join(os.path.dirname(os.path.abspath(__file__)), "..", "assets", "test.json")
+SIMULATION_STEPS = 1200
+NEWCOMERS = {"type": "byzantine", "amount": 2, "duration": 400}
+# snapshot ticks: before and during the newcomers phase
+SNAPSHOT_TICKS = (600, 1400)
+
+
+def snapshot_config(rng_mode):
+    config = Configuration(config_file=CONFIG_FILE)
+    config.set("simulation_steps", SIMULATION_STEPS)
+    config.set("number_runs", 1)
+    config.set("newcomers", NEWCOMERS)
+    config.set("rng", {"mode": rng_mode})
+    return config
+
+
+def run_results(controller):
+    return list(controller.get_rewards()), list(controller.get_items_collected())
+
+
+def snapshot_continuation(rng_mode, snapshot_tick):
+    """
+    :return: results of the uninterrupted run, of the run continued after the snapshot and of the restored one
+    """
+    uninterrupted = MainController(snapshot_config(rng_mode))
+    uninterrupted.start_simulation()
+
+    interrupted = MainController(snapshot_config(rng_mode))
+    interrupted.run_until(min(snapshot_tick, SIMULATION_STEPS))
+    if snapshot_tick > SIMULATION_STEPS:
+        interrupted.environment.create_newcomers(NEWCOMERS["type"], NEWCOMERS["amount"])
+        interrupted.run_until(snapshot_tick)
+    with tempfile.TemporaryDirectory() as directory:
+        interrupted.save_snapshot(join(directory, "snapshot.npz"))
+        interrupted.start_simulation()
+        restored = MainController(snapshot_config(rng_mode))
+        restored.restore_snapshot(join(directory, "snapshot.npz"))
+    restored.start_simulation()
+    return run_results(uninterrupted), run_results(interrupted), run_results(restored)
+
+
+def check_snapshot_continuation(rng_mode):
+    for snapshot_tick in SNAPSHOT_TICKS:
+        uninterrupted, interrupted, restored = snapshot_continuation(rng_mode, snapshot_tick)
+        assert interrupted == uninterrupted, (rng_mode, snapshot_tick)
+        assert restored == uninterrupted, (rng_mode, snapshot_tick)
+
+
+def test_legacy_rng():
+    check_snapshot_continuation("legacy")
+
+
+def test_streams_rng():
+    check_snapshot_continuation("streams")
+
+
+if __name__ == "__main__":
+    test_legacy_rng()
+    test_streams_rng()
+    print("snapshots: restored runs end as the uninterrupted ones")